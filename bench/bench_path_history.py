@@ -0,0 +1,114 @@
+"""Benchmark ancestor-path retrieval latency against conversation depth.
+
+Compares the old one-query-per-hop walk and the recursive CTE that
+replaced it with ``get_path_history`` over the in-memory graph, both cold
+(the graph is loaded first) and warm. Run from the repository root:
+
+    python -m bench.bench_path_history
+"""
+import asyncio
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+DEPTHS = [10, 50, 100, 200, 500, 1000]
+REPEAT = 20
+
+
+def build_chain(path: str, depth: int) -> int:
+    """Create a linear conversation of ``depth`` turns and return the leaf id."""
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM chatrecord")
+    parent_id = None
+    for i in range(depth):
+        cursor = conn.execute(
+            "INSERT INTO chatrecord (prompt, response, parent_id, isBranch) VALUES (?, ?, ?, 0)",
+            (f"prompt {i}", f"response {i} " * 20, parent_id),
+        )
+        parent_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return parent_id
+
+
+async def per_hop_walk(db_path: str, node_id: int):
+    """The pre-CTE implementation: one SELECT per ancestor."""
+    import aiosqlite
+
+    history = []
+    async with aiosqlite.connect(db_path) as db:
+        current = node_id
+        while current is not None:
+            cursor = await db.execute(
+                "SELECT prompt, response, parent_id FROM chatrecord WHERE id = ?",
+                (current,),
+            )
+            row = await cursor.fetchone()
+            if row is None:
+                break
+            prompt, response, parent_id = row
+            history.append((prompt, response))
+            current = parent_id
+    history.reverse()
+    return history
+
+
+async def cte_walk(db_path: str, node_id: int):
+    """The pre-graph-store implementation: one recursive query."""
+    import aiosqlite
+
+    async with aiosqlite.connect(db_path) as db:
+        cursor = await db.execute(
+            """
+            WITH RECURSIVE ancestors(id, prompt, response, parent_id, depth) AS (
+                SELECT id, prompt, response, parent_id, 0 FROM chatrecord WHERE id = ?
+                UNION ALL
+                SELECT c.id, c.prompt, c.response, c.parent_id, a.depth + 1
+                FROM chatrecord c JOIN ancestors a ON c.id = a.parent_id
+            )
+            SELECT prompt, response FROM ancestors ORDER BY depth DESC
+            """,
+            (node_id,),
+        )
+        return [tuple(row) for row in await cursor.fetchall()]
+
+
+async def timed(fn, *args) -> float:
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        await fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def main() -> None:
+    tmpdir = tempfile.mkdtemp(prefix="vizthink-bench-")
+    os.environ["VIZTHINK_DB"] = os.path.join(tmpdir, "bench.db")
+    from server.dao import sqlite as dao
+
+    await dao.init_db()
+
+    async def graph_cold(node_id):
+        dao.graph_store.clear()
+        return await dao.get_path_history(node_id)
+
+    print(f"{'depth':>6} {'per-hop ms':>12} {'CTE ms':>10} {'cold ms':>10} {'memory ms':>10}")
+    for depth in DEPTHS:
+        leaf = build_chain(dao.DB_PATH, depth)
+        dao.graph_store.clear()
+        assert await per_hop_walk(dao.DB_PATH, leaf) == await cte_walk(dao.DB_PATH, leaf) == await dao.get_path_history(leaf)
+        walk = await timed(per_hop_walk, dao.DB_PATH, leaf)
+        cte = await timed(cte_walk, dao.DB_PATH, leaf)
+        cold = await timed(graph_cold, leaf)
+        await dao.get_path_history(leaf)
+        warm = await timed(dao.get_path_history, leaf)
+        print(f"{depth:>6} {walk:>12.2f} {cte:>10.2f} {cold:>10.2f} {warm:>10.3f}")
+
+    await dao.pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
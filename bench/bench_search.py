@@ -0,0 +1,64 @@
+"""Benchmark full-text search latency against graph size.
+
+Fills the database with synthetic prompt/response pairs (the FTS triggers
+index them as they are inserted) and times ``search_chatrecords`` for a
+few query shapes. Run from the repository root:
+
+    python -m bench.bench_search
+"""
+import asyncio
+import itertools
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+SIZES = [1_000, 10_000, 100_000]
+REPEAT = 20
+
+# Zipf-distributed synthetic vocabulary, so that query terms range from
+# common to rare the way words in real conversations do.
+VOCABULARY = [f"w{i}" for i in range(20_000)]
+CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+QUERIES = ["w3", "w50 w120", "w700", "w2000 w15"]
+
+
+def fill(path: str, count: int, start: int) -> None:
+    rng = random.Random(start)
+    conn = sqlite3.connect(path)
+    rows = []
+    for i in range(start, start + count):
+        prompt = " ".join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=8))
+        response = " ".join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=60))
+        rows.append((prompt, response, i if i > 1 else None))
+    conn.executemany("INSERT INTO chatrecord (prompt, response, parent_id) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+async def main() -> None:
+    tmpdir = tempfile.mkdtemp(prefix="vizthink-bench-")
+    os.environ["VIZTHINK_DB"] = os.path.join(tmpdir, "bench.db")
+    from server.dao import sqlite as dao
+
+    await dao.init_db()
+
+    print(f"{'nodes':>8} {'query':<30} {'ms/search':>10}")
+    total = 0
+    for size in SIZES:
+        fill(dao.DB_PATH, size - total, total + 1)
+        total = size
+        for query in QUERIES:
+            await dao.search_chatrecords(query)  # warm the page cache
+            start = time.perf_counter()
+            for _ in range(REPEAT):
+                await dao.search_chatrecords(query)
+            elapsed = (time.perf_counter() - start) * 1000 / REPEAT
+            print(f"{size:>8} {query:<30} {elapsed:>10.2f}")
+
+    await dao.pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
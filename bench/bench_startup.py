@@ -0,0 +1,79 @@
+"""Benchmark backend startup: cold import time and time to first /health.
+
+Each measurement runs in a fresh interpreter so nothing is cached in
+``sys.modules``. Provider SDK import costs are listed separately since
+the app only pays them lazily. Run from the repository root:
+
+    python -m bench.bench_startup
+"""
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+REPEAT = 5
+SDK_MODULES = ["google.generativeai", "ollama", "openai", "anthropic"]
+
+
+def cold_import(module: str) -> float:
+    """Seconds to import ``module`` in a fresh interpreter."""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_health(env: dict) -> float:
+    """Seconds from spawning uvicorn until /health answers 200."""
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(proc.stderr.read().decode() or "uvicorn exited")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=0.5).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.01)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def median_ms(fn, *args) -> float:
+    return statistics.median(fn(*args) for _ in range(REPEAT)) * 1000
+
+
+def main() -> None:
+    print(f"{'cold import':<28} {'ms':>8}")
+    for module in ["server.main", *SDK_MODULES]:
+        try:
+            print(f"{module:<28} {median_ms(cold_import, module):>8.1f}")
+        except subprocess.CalledProcessError:
+            print(f"{module:<28} {'n/a':>8}")
+
+    env = dict(os.environ, VIZTHINK_DB=os.path.join(tempfile.mkdtemp(prefix="vizthink-bench-"), "bench.db"))
+    print(f"\n{'time to first /health':<28} {'ms':>8}")
+    print(f"{'uvicorn server.main:app':<28} {median_ms(time_to_health, env):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
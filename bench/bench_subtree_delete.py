@@ -0,0 +1,63 @@
+"""Benchmark subtree deletion latency against branch size.
+
+Builds a branch of N nodes (fan-out 3) under a single root and times
+``delete_single_chatrecord`` pruning it. Run from the repository root:
+
+    python -m bench.bench_subtree_delete
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+SIZES = [100, 1_000, 10_000, 50_000]
+FANOUT = 3
+
+
+def build_branch(path: str, size: int) -> int:
+    """Insert a root plus ``size`` descendants breadth-first; return the root id."""
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM chatrecord")
+    root = conn.execute(
+        "INSERT INTO chatrecord (prompt, response, parent_id, isBranch) VALUES ('root', 'root', NULL, 0)"
+    ).lastrowid
+    frontier = [root]
+    created = 0
+    while created < size:
+        next_frontier = []
+        for parent_id in frontier:
+            for i in range(FANOUT):
+                if created >= size:
+                    break
+                next_frontier.append(conn.execute(
+                    "INSERT INTO chatrecord (prompt, response, parent_id, isBranch) VALUES (?, ?, ?, ?)",
+                    (f"prompt {created}", f"response {created}", parent_id, i > 0),
+                ).lastrowid)
+                created += 1
+        frontier = next_frontier
+    conn.commit()
+    conn.close()
+    return root
+
+
+async def main() -> None:
+    tmpdir = tempfile.mkdtemp(prefix="vizthink-bench-")
+    os.environ["VIZTHINK_DB"] = os.path.join(tmpdir, "bench.db")
+    from server.dao import sqlite as dao
+
+    await dao.init_db()
+
+    print(f"{'nodes':>8} {'delete ms':>10}")
+    for size in SIZES:
+        root = build_branch(dao.DB_PATH, size)
+        start = time.perf_counter()
+        await dao.delete_single_chatrecord(root)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{size + 1:>8} {elapsed:>10.2f}")
+
+    await dao.pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
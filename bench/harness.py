@@ -0,0 +1,379 @@
+"""Load-test the backend against the mock LLM provider at growing graph sizes.
+
+Starts ``bench.mock_llm`` and the app (uvicorn, like production) as
+subprocesses on free ports, with the OpenAI or Ollama adapter pointed at
+the mock, so everything runs offline and without keys. For each size a
+synthetic graph of the given depth and fan-out is written straight into
+the database, then the harness measures:
+
+* ``/chat`` latency (p50/p99) and throughput at each concurrency level
+* ``/chat/records`` load time, whole graph (cold and warm) and paged
+* position saves: request latency and the debounced database write
+* subtree deletes
+
+Results are printed and saved as JSON; ``--compare`` diffs two result
+files to spot regressions. Run from the repository root:
+
+    python -m bench.harness --sizes 1000,10000 --concurrency 1,8
+    python -m bench.harness --compare bench/results/old.json bench/results/new.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import deque
+from typing import Dict, List, Optional
+
+import httpx
+
+from bench.bench_startup import free_port
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# Relative change beyond which --compare flags a metric
+REGRESSION_THRESHOLD = 0.10
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile, ``q`` in [0, 100]."""
+    ordered = sorted(samples)
+    return ordered[max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Milliseconds: median, p99 and mean of samples given in seconds."""
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+    }
+
+
+def tree_shape(size: int, depth: int, fanout: int) -> List[Optional[int]]:
+    """Parent index of each of ``size`` nodes (None for roots).
+
+    Nodes are laid out breadth first, ``fanout`` children each, in trees
+    ``depth`` levels deep; a new tree starts whenever one is full.
+    """
+    parents: List[Optional[int]] = []
+    frontier: deque = deque()
+    while len(parents) < size:
+        if not frontier:
+            frontier.append((len(parents), 1))
+            parents.append(None)
+            continue
+        parent, level = frontier.popleft()
+        for _ in range(fanout):
+            if len(parents) >= size:
+                break
+            if level + 1 < depth:
+                frontier.append((len(parents), level + 1))
+            parents.append(parent)
+    return parents
+
+
+def populate(db_path: str, graph_id: str, size: int, depth: int, fanout: int) -> List[int]:
+    """Write a synthetic graph directly into the database; returns its ids in order."""
+    rng = random.Random(size)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA busy_timeout=5000")
+    (base,) = conn.execute("SELECT COALESCE(MAX(id), 0) FROM chatrecord").fetchone()
+    now = time.time()
+    conn.execute("INSERT OR IGNORE INTO graphs (id, name, created_at) VALUES (?, ?, ?)", (graph_id, graph_id, now))
+    rows = []
+    for index, parent in enumerate(tree_shape(size, depth, fanout)):
+        prompt = f"synthetic question {index} " + " ".join(f"w{rng.randrange(5000)}" for _ in range(12))
+        response = " ".join(f"w{rng.randrange(5000)}" for _ in range(120))
+        rows.append((
+            base + 1 + index, graph_id, None if parent is None else base + 1 + parent, prompt, response,
+            rng.random() < 0.2, rng.uniform(-5000, 5000), rng.uniform(-5000, 5000), now, now,
+        ))
+    conn.executemany(
+        """
+        INSERT INTO chatrecord (id, graph_id, parent_id, prompt, response, isBranch, pos_x, pos_y, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        rows,
+    )
+    conn.commit()
+    conn.close()
+    return [row[0] for row in rows]
+
+
+def start(args: List[str], env: dict, health_url: str) -> subprocess.Popen:
+    """Spawn a server and wait until ``health_url`` answers."""
+    proc = subprocess.Popen(args, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(proc.stderr.read().decode() or f"{args} exited")
+        try:
+            if httpx.get(health_url, timeout=0.5).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    proc.terminate()
+    raise RuntimeError(f"{health_url} did not come up")
+
+
+async def timed(request) -> float:
+    start = time.perf_counter()
+    response = await request
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def db_seconds(client: httpx.AsyncClient, function: str) -> tuple:
+    """(total seconds, calls) of one DAO function, from the app's /metrics."""
+    text = (await client.get("/metrics")).text
+    values = []
+    for suffix in ("sum", "count"):
+        match = re.search(rf'^vizthink_db_query_duration_seconds_{suffix}{{function="{function}"}} (\S+)$', text, re.M)
+        values.append(float(match.group(1)) if match else 0.0)
+    return tuple(values)
+
+
+async def bench_chat(client: httpx.AsyncClient, graph_id: str, ids: List[int], provider: str, requests: int, concurrency: int) -> dict:
+    rng = random.Random(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one() -> None:
+        nonlocal errors
+        body = {"prompt": f"bench {uuid.uuid4().hex}", "provider": provider, "parent_id": rng.choice(ids), "graph_id": graph_id}
+        async with semaphore:
+            try:
+                latencies.append(await timed(client.post("/chat", json=body)))
+            except httpx.HTTPError:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    wall = time.perf_counter() - start
+    return {**summarize(latencies or [0.0]), "throughput_rps": round(len(latencies) / wall, 2), "errors": errors}
+
+
+async def bench_records(client: httpx.AsyncClient, graph_id: str, repeat: int) -> dict:
+    cold = await timed(client.get("/chat/records", params={"graph_id": graph_id}))
+    warm = [await timed(client.get("/chat/records", params={"graph_id": graph_id})) for _ in range(repeat)]
+
+    async def paged() -> None:
+        after_id = None
+        while True:
+            params = {"graph_id": graph_id, "limit": 1000}
+            if after_id is not None:
+                params["after_id"] = after_id
+            response = await client.get("/chat/records", params=params)
+            response.raise_for_status()
+            after_id = response.json()["next_after_id"]
+            if after_id is None:
+                return
+
+    paged_samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await paged()
+        paged_samples.append(time.perf_counter() - start)
+    return {
+        "full_cold_ms": round(cold * 1000, 3),
+        "full_warm": summarize(warm),
+        "paged": summarize(paged_samples),
+    }
+
+
+async def bench_positions(client: httpx.AsyncClient, graph_id: str, ids: List[int], repeat: int, moved: int = 200) -> dict:
+    rng = random.Random(len(ids))
+    before = await db_seconds(client, "store_positions")
+    samples = []
+    for _ in range(repeat):
+        positions = {str(i): {"x": rng.uniform(-5000, 5000), "y": rng.uniform(-5000, 5000)} for i in rng.sample(ids, min(moved, len(ids)))}
+        samples.append(await timed(client.post("/chat/positions", json={"positions": positions, "graph_id": graph_id})))
+        await asyncio.sleep(0.5)  # let the debounced write land before the next batch
+    total, calls = (after - previous for after, previous in zip(await db_seconds(client, "store_positions"), before))
+    return {
+        "moved_nodes": moved,
+        "request": summarize(samples),
+        "db_write_mean_ms": round(total / calls * 1000, 3) if calls else None,
+    }
+
+
+async def bench_delete(client: httpx.AsyncClient, graph_id: str, ids: List[int], count: int = 3) -> dict:
+    """Delete the first few subtrees one level below the first root."""
+    tree = (await client.get(f"/chat/records/{ids[0]}/tree", params={"graph_id": graph_id})).json()
+    samples, sizes = [], []
+    for child in tree["children"][:count]:
+        subtree = (await client.get(f"/chat/records/{child}/tree", params={"graph_id": graph_id})).json()
+        sizes.append(subtree["descendants"] + 1)
+        samples.append(await timed(client.delete(f"/chat/records/{child}", params={"graph_id": graph_id})))
+    if not samples:
+        return {}
+    return {"subtree_nodes": round(statistics.fmean(sizes)), **summarize(samples)}
+
+
+async def run(args) -> dict:
+    tmpdir = tempfile.mkdtemp(prefix="vizthink-bench-")
+    db_path = os.path.join(tmpdir, "bench.db")
+    mock_port, app_port = free_port(), free_port()
+    mock = start(
+        [sys.executable, "-m", "bench.mock_llm", "--port", str(mock_port), "--latency", str(args.latency),
+         "--tokens-per-second", str(args.tokens_per_second), "--tokens", str(args.tokens)],
+        dict(os.environ), f"http://127.0.0.1:{mock_port}/mock/stats",
+    )
+    env = dict(
+        os.environ,
+        VIZTHINK_DB=db_path,
+        VIZTHINK_PREWARM="0",
+        VIZTHINK_RESPONSE_CACHE="0",  # every request takes the full path
+        OPENAI_API_KEY="bench",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{mock_port}/v1",
+        OLLAMA_HOST=f"http://127.0.0.1:{mock_port}",
+    )
+    # The mock has no rate limits; keep the scheduler's client-side ones out
+    # of the numbers unless explicitly set
+    for setting in ("RPM", "TPM"):
+        env.setdefault(f"VIZTHINK_{args.provider.upper()}_{setting}", "0")
+    try:
+        app = start(
+            [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(app_port), "--log-level", "warning"],
+            env, f"http://127.0.0.1:{app_port}/health",
+        )
+    except BaseException:
+        mock.terminate()
+        raise
+
+    results = []
+    try:
+        limits = httpx.Limits(max_connections=max(args.concurrency) + 4)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", timeout=120, limits=limits) as client:
+            for size in args.sizes:
+                graph_id = f"bench-{size}"
+                start_fill = time.perf_counter()
+                ids = populate(db_path, graph_id, size, args.depth, args.fanout)
+                print(f"graph of {size} nodes written in {time.perf_counter() - start_fill:.1f}s", file=sys.stderr)
+                result = {"size": size, "records": await bench_records(client, graph_id, args.repeat)}
+                result["chat"] = {
+                    str(concurrency): await bench_chat(client, graph_id, ids, args.provider, args.requests, concurrency)
+                    for concurrency in args.concurrency
+                }
+                result["positions"] = await bench_positions(client, graph_id, ids, args.repeat)
+                result["subtree_delete"] = await bench_delete(client, graph_id, ids)
+                results.append(result)
+                print_result(result)
+    finally:
+        app.terminate()
+        mock.terminate()
+        app.wait()
+        mock.wait()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "config": {
+            "sizes": args.sizes, "depth": args.depth, "fanout": args.fanout, "provider": args.provider,
+            "requests": args.requests, "concurrency": args.concurrency, "repeat": args.repeat,
+            "latency": args.latency, "tokens_per_second": args.tokens_per_second, "tokens": args.tokens,
+        },
+        "results": results,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(result: dict) -> None:
+    records = result["records"]
+    print(f"\n== {result['size']} nodes")
+    print(f"  /chat/records   cold {records['full_cold_ms']:.1f} ms, warm p50 {records['full_warm']['p50_ms']:.1f} ms, paged p50 {records['paged']['p50_ms']:.1f} ms")
+    for concurrency, chat in result["chat"].items():
+        print(f"  /chat c={concurrency:<4} p50 {chat['p50_ms']:.1f} ms, p99 {chat['p99_ms']:.1f} ms, {chat['throughput_rps']:.1f} req/s, {chat['errors']} errors")
+    positions = result["positions"]
+    print(f"  positions       request p50 {positions['request']['p50_ms']:.2f} ms, db write {positions['db_write_mean_ms']} ms")
+    delete = result["subtree_delete"]
+    if delete:
+        print(f"  subtree delete  {delete['subtree_nodes']} nodes, p50 {delete['p50_ms']:.1f} ms")
+
+
+def flatten(value, prefix: str = "") -> Dict[str, float]:
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(flatten(item, f"{prefix}.{key}" if prefix else key))
+        return flat
+    return {prefix: value} if isinstance(value, (int, float)) and not isinstance(value, bool) else {}
+
+
+def compare(old_path: str, new_path: str) -> int:
+    """Print every metric of two result files side by side; returns the number of regressions."""
+    with open(old_path) as f:
+        old = {r["size"]: flatten(r) for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = {r["size"]: flatten(r) for r in json.load(f)["results"]}
+    regressions = 0
+    print(f"{'metric':<44} {'old':>12} {'new':>12} {'change':>9}")
+    for size in sorted(old.keys() & new.keys()):
+        for key in sorted(old[size].keys() & new[size].keys()):
+            if key == "size" or key.endswith(("errors", "subtree_nodes", "moved_nodes")):
+                continue
+            before, after = old[size][key], new[size][key]
+            change = (after - before) / before if before else 0.0
+            # Throughput should go up; everything else is a time
+            worse = -change if "throughput" in key else change
+            flag = "  <- regression" if worse > REGRESSION_THRESHOLD else ""
+            regressions += bool(flag)
+            print(f"{f'{size}.{key}':<44} {before:>12.3f} {after:>12.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def _ints(text: str) -> List[int]:
+    return [int(part) for part in text.split(",") if part]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=_ints, default=[1_000, 10_000, 50_000], help="graph sizes, comma-separated")
+    parser.add_argument("--depth", type=int, default=12, help="levels per synthetic tree")
+    parser.add_argument("--fanout", type=int, default=3, help="children per synthetic node")
+    parser.add_argument("--provider", choices=["openai", "ollama"], default="openai")
+    parser.add_argument("--requests", type=int, default=100, help="/chat requests per concurrency level")
+    parser.add_argument("--concurrency", type=_ints, default=[1, 8, 32], help="/chat concurrency levels, comma-separated")
+    parser.add_argument("--repeat", type=int, default=5, help="samples for records, positions")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="mock generation rate")
+    parser.add_argument("--tokens", type=int, default=64, help="mock tokens per answer")
+    parser.add_argument("--out", help="result file (default: bench/results/<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="diff two result files instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare) else 0)
+
+    report = asyncio.run(run(args))
+    out = args.out or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""A local stand-in for the OpenAI and Ollama chat APIs, for benchmarks.
+
+Answers ``POST /v1/chat/completions`` (OpenAI, JSON or SSE streaming) and
+``POST /api/chat`` (Ollama, JSON or NDJSON streaming) with filler text,
+after ``latency`` seconds and at ``tokens_per_second``, so the real
+provider adapters can be load-tested without network or keys. Point the
+backend at it with ``OPENAI_BASE_URL=http://127.0.0.1:PORT/v1`` and
+``OLLAMA_HOST=http://127.0.0.1:PORT``. Run from the repository root:
+
+    python -m bench.mock_llm --port 11500 --latency 0.2 --tokens-per-second 50
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+
+class MockSettings:
+    def __init__(self, latency: float = 0.05, tokens_per_second: float = 200, tokens: int = 64):
+        self.latency = latency                      # seconds before the first token
+        self.tokens_per_second = tokens_per_second  # 0 = all at once
+        self.tokens = tokens                        # response length
+        self.requests = 0
+
+
+def _words(count: int):
+    return [f"token{i} " for i in range(count)]
+
+
+def _prompt_tokens(body: dict) -> int:
+    return sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+
+
+def create_app(settings: MockSettings) -> Starlette:
+    async def tokens():
+        """Yield the response word by word at the configured pace."""
+        await asyncio.sleep(settings.latency)
+        delay = 1 / settings.tokens_per_second if settings.tokens_per_second else 0
+        for word in _words(settings.tokens):
+            if delay:
+                await asyncio.sleep(delay)
+            yield word
+
+    async def complete() -> str:
+        return "".join([word async for word in tokens()])
+
+    async def openai_chat(request: Request):
+        body = await request.json()
+        settings.requests += 1
+        model = body.get("model", "mock")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        if not body.get("stream"):
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": await complete()}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": _prompt_tokens(body), "completion_tokens": settings.tokens, "total_tokens": _prompt_tokens(body) + settings.tokens},
+            })
+
+        def chunk(delta: dict, finish_reason=None) -> str:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(data)}\n\n"
+
+        async def events():
+            yield chunk({"role": "assistant", "content": ""})
+            async for word in tokens():
+                yield chunk({"content": word})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def ollama_chat(request: Request):
+        body = await request.json()
+        settings.requests += 1
+        model = body.get("model", "mock")
+
+        def message(content: str, done: bool) -> dict:
+            data = {
+                "model": model,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "message": {"role": "assistant", "content": content},
+                "done": done,
+            }
+            if done:
+                data.update(done_reason="stop", prompt_eval_count=_prompt_tokens(body), eval_count=settings.tokens)
+            return data
+
+        if body.get("stream") is False:
+            return JSONResponse(message(await complete(), True))
+
+        async def lines():
+            async for word in tokens():
+                yield json.dumps(message(word, False)) + "\n"
+            yield json.dumps(message("", True)) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    async def openai_models(request: Request):
+        return JSONResponse({"object": "list", "data": [{"id": "mock", "object": "model", "created": 0, "owned_by": "bench"}]})
+
+    async def ollama_tags(request: Request):
+        return JSONResponse({"models": [{"name": "mock", "model": "mock"}]})
+
+    async def stats(request: Request):
+        return JSONResponse({"requests": settings.requests})
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", openai_chat, methods=["POST"]),
+        Route("/v1/models", openai_models),
+        Route("/api/chat", ollama_chat, methods=["POST"]),
+        Route("/api/tags", ollama_tags),
+        Route("/mock/stats", stats),
+    ])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="0 sends the whole answer at once")
+    parser.add_argument("--tokens", type=int, default=64, help="tokens per answer")
+    args = parser.parse_args()
+    settings = MockSettings(args.latency, args.tokens_per_second, args.tokens)
+    uvicorn.run(create_app(settings), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+from server.logger import logger
+from server.metrics import counter_lines, registry
+from server.dao.sqlite import (
+    clear_cached_responses,
+    get_cached_response,
+    prune_cached_responses,
+    put_cached_response,
+)
+
+if TYPE_CHECKING:
+    from server.context import LLMContext
+
+class ResponseCache:
+    """Two-tier cache of LLM responses: an in-memory LRU over a SQLite table.
+
+    Keys hash everything that determines the answer (provider, model, the
+    assembled context, the prompt and generation parameters), so re-asking
+    the same question on a sibling branch with the same history is a hit.
+    Entries expire after ``ttl`` seconds; each tier is bounded in size.
+    """
+
+    def __init__(self, enabled: bool, ttl: float, memory_entries: int, disk_entries: int):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._puts_since_prune = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(provider: str, model: str, context: "LLMContext", prompt: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps(
+            {
+                "provider": provider,
+                "model": model,
+                "system": " ".join(context.system.split()),
+                "history": [[turn["role"], " ".join(turn["content"].split())] for turn in context.history],
+                "prompt": " ".join(prompt.split()),
+                "params": params,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            created_at, response = entry
+            if now - created_at <= self.ttl:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return response
+            del self._memory[key]
+        response = await get_cached_response(key, now - self.ttl)
+        if response is None:
+            self.counters["misses"] += 1
+            return None
+        self.counters["disk_hits"] += 1
+        self._remember(key, now, response)
+        return response
+
+    async def put(self, key: str, response: str) -> None:
+        if not self.enabled or not response:
+            return
+        now = time.time()
+        self._remember(key, now, response)
+        self.counters["stores"] += 1
+        try:
+            await put_cached_response(key, response, now)
+            self._puts_since_prune += 1
+            # Pruning the disk tier is a table scan; amortise it over writes
+            if self._puts_since_prune >= 100:
+                self._puts_since_prune = 0
+                self.counters["evictions"] += await prune_cached_responses(self.disk_entries, now - self.ttl)
+        except Exception as e:
+            logger.warning(f"Could not persist cached response: {e}")
+
+    def _remember(self, key: str, created_at: float, response: str) -> None:
+        self._memory[key] = (created_at, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    async def clear(self) -> None:
+        self._memory.clear()
+        await clear_cached_responses()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+        hits = lookups - self.counters["misses"]
+        return {
+            "enabled": self.enabled,
+            **self.counters,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_size": len(self._memory),
+        }
+
+response_cache = ResponseCache(
+    enabled=os.getenv("VIZTHINK_RESPONSE_CACHE", "1") != "0",
+    ttl=float(os.getenv("VIZTHINK_RESPONSE_CACHE_TTL", str(7 * 24 * 3600))),
+    memory_entries=int(os.getenv("VIZTHINK_RESPONSE_CACHE_MEMORY", "512")),
+    disk_entries=int(os.getenv("VIZTHINK_RESPONSE_CACHE_DISK", "10000")),
+)
+registry.collector(lambda: counter_lines(
+    "vizthink_response_cache_events_total", "LLM response cache hits, misses, stores and evictions.",
+    "event", response_cache.counters,
+))
@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from server.logger import logger
+from server.metrics import counter_lines, registry
+
+class SingleFlight:
+    """Share one in-flight computation between concurrent callers with the same key.
+
+    The first caller for a key leads: it does the work and settles the
+    key's future. Callers arriving while it runs await that same future.
+    With ``remember`` the result of a successful flight is kept for ``ttl``
+    seconds, so a client retrying with the same idempotency key gets the
+    original result instead of repeating the work. Failures are never
+    remembered.
+    """
+
+    def __init__(self, ttl: float = 300, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._done: "OrderedDict[str, Tuple[float, asyncio.Future]]" = OrderedDict()
+        self.counters = {"leaders": 0, "joined": 0, "replayed": 0}
+
+    def join(self, key: str) -> Optional[asyncio.Future]:
+        """The in-flight or remembered future for ``key``, if any."""
+        future = self._inflight.get(key)
+        # A flight that just failed is only dropped by its done callback,
+        # which may not have run yet; failures are not shared with later callers
+        if future is not None and not (future.done() and (future.cancelled() or future.exception() is not None)):
+            self.counters["joined"] += 1
+            return future
+        entry = self._done.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._done[key]
+            return None
+        self.counters["replayed"] += 1
+        return entry[1]
+
+    def lead(self, key: str, remember: bool = False) -> asyncio.Future:
+        """Register a new flight for ``key``; the caller must settle the returned future."""
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.counters["leaders"] += 1
+        future.add_done_callback(lambda f: self._land(key, f, remember))
+        return future
+
+    def _land(self, key: str, future: asyncio.Future, remember: bool) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if future.cancelled():
+            return
+        if future.exception() is not None:  # also marks the exception as retrieved
+            return
+        if remember and self.ttl > 0:
+            self._done[key] = (time.monotonic() + self.ttl, future)
+            self._done.move_to_end(key)
+            while len(self._done) > self.max_entries:
+                self._done.popitem(last=False)
+
+    async def run(self, key: str, work: Callable[[], Awaitable[Any]], remember: bool = False) -> Any:
+        """Return ``work()``'s result, sharing it with concurrent callers of ``key``.
+
+        The work runs in its own task, so a caller that disconnects does not
+        cancel it for the others (or for its own retry).
+        """
+        while True:
+            future = self.join(key)
+            if future is None:
+                future = self.lead(key, remember)
+                task = asyncio.create_task(work())
+                task.add_done_callback(lambda t, f=future: settle(f, t))
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # this caller was cancelled
+                # The flight we joined was abandoned; start over
+                logger.info(f"Coalesced flight {key[:12]} was cancelled; retrying")
+
+    def stats(self) -> dict:
+        return {**self.counters, "in_flight": len(self._inflight), "remembered": len(self._done)}
+
+def settle(future: asyncio.Future, task: "asyncio.Future") -> None:
+    """Copy the outcome of ``task`` into ``future`` unless it is already settled."""
+    if future.done():
+        return
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+def flight_key(idempotency_key: Optional[str], **request: Any) -> Tuple[str, bool]:
+    """Key a chat request for coalescing; returns ``(key, remember)``.
+
+    A client-supplied idempotency key is remembered after the request
+    completes; otherwise the request content is the key and only
+    concurrent duplicates are merged, so asking the same question again
+    later still creates a new node.
+    """
+    if idempotency_key:
+        return "idem:" + idempotency_key, True
+    payload = json.dumps(request, sort_keys=True, default=str)
+    return "body:" + hashlib.sha256(payload.encode("utf-8")).hexdigest(), False
+
+chat_flights = SingleFlight(ttl=float(os.getenv("VIZTHINK_IDEMPOTENCY_TTL", "300")))
+registry.collector(lambda: counter_lines(
+    "vizthink_chat_flights_total", "Chat requests that led, joined or replayed a coalesced flight.",
+    "outcome", chat_flights.counters,
+))
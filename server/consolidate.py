@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from server.logger import logger
+from server.context import context_budget, estimate_tokens
+from server.dao.sqlite import DEFAULT_GRAPH, get_subtree_summaries, get_tree_nodes, put_subtree_summary
+from server.llm import call_llm
+from server.providers import get_provider
+
+# LLM calls in flight at once; independent subtrees are summarized in parallel
+CONSOLIDATE_CONCURRENCY = int(os.getenv("VIZTHINK_CONSOLIDATE_CONCURRENCY", "4"))
+# Summaries merged per LLM call; wider forks are merged in several rounds
+REDUCE_FAN_IN = 8
+# Bump when the prompts change so cached summaries are not reused
+PROMPT_VERSION = 1
+
+Progress = Callable[[float, Optional[str]], Awaitable[None]]
+
+UNIT_PROMPT = (
+    "Summarize this part of a branching conversation: its key ideas, questions and "
+    "conclusions, including those of the branches that follow from it. Answer in one "
+    "short paragraph.\n\nConversation:\n{turns}"
+)
+CHILDREN_SECTION = "\n\nBranches that follow:\n{children}"
+MERGE_PROMPT = (
+    "Merge these summaries of related conversation branches into one coherent report. "
+    "Keep distinct ideas distinct and note how they connect.\n\n{text}"
+)
+
+@dataclass
+class Unit:
+    """An unbranched chain of turns plus the units that fork off its last node."""
+    turns: List[Tuple[int, str, str]]
+    children: List["Unit"] = field(default_factory=list)
+    hash: str = ""
+
+def build_units(nodes: List[Tuple[int, Optional[int], str, str]]) -> Tuple[List[Unit], List[Unit]]:
+    """Cut the forest into chain units; returns ``(roots, all units parents-first)``.
+
+    A unit starts at a root or at a child of a node with several children
+    and runs down while each node has exactly one child. Nodes whose parent
+    no longer exists are treated as roots.
+    """
+    by_id = {node_id: (node_id, prompt or "", response or "") for node_id, _, prompt, response in nodes}
+    children: Dict[Optional[int], List[int]] = {}
+    for node_id, parent_id, _, _ in nodes:
+        children.setdefault(parent_id if parent_id in by_id else None, []).append(node_id)
+
+    def chain_from(node_id: int) -> Unit:
+        turns = [by_id[node_id]]
+        while len(children.get(node_id, ())) == 1:
+            node_id = children[node_id][0]
+            turns.append(by_id[node_id])
+        return Unit(turns)
+
+    roots = [chain_from(node_id) for node_id in children.get(None, [])]
+    units = list(roots)
+    i = 0
+    while i < len(units):
+        unit = units[i]
+        unit.children = [chain_from(child) for child in children.get(unit.turns[-1][0], [])]
+        units.extend(unit.children)
+        i += 1
+    return roots, units
+
+def _digest(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def _clip_tokens(text: str, budget: int) -> str:
+    return text if estimate_tokens(text) <= budget else text[: budget * 4].rstrip() + "…"
+
+def _turns_text(turns: List[Tuple[int, str, str]], budget: int) -> str:
+    lines = [f"User: {prompt}\nAssistant: {response}" for _, prompt, response in turns]
+    # A long chain keeps its first turn (the topic) and the most recent ones
+    while len(lines) > 2 and estimate_tokens("\n\n".join(lines)) > budget:
+        lines.pop(1)
+    return _clip_tokens("\n\n".join(lines), budget)
+
+class _Consolidation:
+    """One consolidation run; summaries are memoized by content hash."""
+
+    def __init__(self, provider: str, model: str, known: Dict[str, str], dirty: int, progress: Optional[Progress], graph_id: str):
+        self.provider = provider
+        self.model = model
+        self.graph_id = graph_id
+        self.budget = context_budget(provider)
+        self.known = known
+        self.dirty = max(dirty, 1)
+        self.progress = progress
+        self.semaphore = asyncio.Semaphore(CONSOLIDATE_CONCURRENCY)
+        self.tasks: Dict[str, asyncio.Future] = {}
+        self.computed = 0
+
+    async def summary(self, unit: Unit) -> str:
+        # Identical subtrees share one task (and one summary)
+        task = self.tasks.get(unit.hash)
+        if task is None:
+            task = self.tasks[unit.hash] = asyncio.ensure_future(self._summarize(unit))
+        return await task
+
+    async def _summarize(self, unit: Unit) -> str:
+        if unit.hash in self.known:
+            return self.known[unit.hash]  # the whole subtree is unchanged
+        summaries = await asyncio.gather(*(self.summary(child) for child in unit.children))
+        summaries = await self.reduce(list(summaries), [child.hash for child in unit.children])
+        child_budget = self.budget // 2
+        prompt = UNIT_PROMPT.format(turns=_turns_text(unit.turns, self.budget - child_budget))
+        if summaries:
+            share = child_budget // len(summaries)
+            prompt += CHILDREN_SECTION.format(children="\n\n".join(f"- {_clip_tokens(s, share)}" for s in summaries))
+        return await self.generate(unit.hash, prompt)
+
+    async def reduce(self, summaries: List[str], hashes: List[str]) -> List[str]:
+        """Merge ``REDUCE_FAN_IN`` summaries at a time until few enough remain."""
+        while len(summaries) > REDUCE_FAN_IN:
+            groups = range(0, len(summaries), REDUCE_FAN_IN)
+            hashes = [_digest("merge", *hashes[i:i + REDUCE_FAN_IN]) for i in groups]
+            summaries = list(await asyncio.gather(*(
+                self.merge(hash_, summaries[i:i + REDUCE_FAN_IN]) for hash_, i in zip(hashes, groups)
+            )))
+        return summaries
+
+    async def merge(self, hash_: str, summaries: List[str]) -> str:
+        if len(summaries) == 1:
+            return summaries[0]
+        share = self.budget // len(summaries)
+        text = "\n\n".join(f"- {_clip_tokens(s, share)}" for s in summaries)
+        return await self.generate(hash_, MERGE_PROMPT.format(text=text))
+
+    async def generate(self, hash_: str, prompt: str) -> str:
+        if hash_ not in self.known:
+            stored = await get_subtree_summaries([hash_])
+            if hash_ in stored:
+                self.known[hash_] = stored[hash_]
+                return stored[hash_]
+            async with self.semaphore:
+                # No retrieved notes: the prompt must be exactly what the hash covers
+                summary = await call_llm(prompt, self.provider, None, self.model, use_cache=False, retrieve=0, graph_id=self.graph_id)
+            self.known[hash_] = summary
+            await put_subtree_summary(hash_, summary, time.time())
+            self.computed += 1
+            if self.progress is not None:
+                await self.progress(min(self.computed / self.dirty, 0.99), f"{self.computed} summaries written")
+        return self.known[hash_]
+
+async def consolidate_graph(
+    provider: str,
+    model: Optional[str] = None,
+    progress: Optional[Progress] = None,
+    graph_id: str = DEFAULT_GRAPH,
+) -> Dict:
+    """Hierarchical report over one whole graph.
+
+    Every chain unit is summarized from its own turns plus its children's
+    summaries, so independent subtrees run in parallel (bounded by
+    ``CONSOLIDATE_CONCURRENCY``) and the wall time grows with the depth of
+    the graph, not its size. Each summary is stored under a hash of the
+    subtree's content (a Merkle hash), so after adding a node only the
+    units on its path to the root are summarized again.
+    """
+    roots, units = build_units(await get_tree_nodes(graph_id))
+    if not roots:
+        return {"report": "", "branches": 0, "computed": 0}
+    model = model or get_provider(provider).default_model
+    for unit in reversed(units):  # children before parents
+        texts = [[prompt, response] for _, prompt, response in unit.turns]
+        unit.hash = _digest(PROMPT_VERSION, provider, model, texts, [child.hash for child in unit.children])
+
+    known = await get_subtree_summaries([unit.hash for unit in units])
+    dirty = len({unit.hash for unit in units} - set(known))
+    logger.info(f"Consolidating {len(units)} branches of graph {graph_id} with {provider} ({dirty} changed)")
+
+    run = _Consolidation(provider, model, known, dirty + 1, progress, graph_id)
+    try:
+        summaries = await asyncio.gather(*(run.summary(root) for root in roots))
+        hashes = [root.hash for root in roots]
+        summaries = await run.reduce(list(summaries), hashes)
+        report = await run.merge(_digest("report", *hashes), summaries)
+    finally:
+        # On failure or cancellation, stop the other subtrees too
+        for task in run.tasks.values():
+            task.cancel()
+    return {"report": report, "branches": len(units), "computed": run.computed}
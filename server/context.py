@@ -0,0 +1,162 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from server.logger import logger
+from server.dao.sqlite import DEFAULT_GRAPH, get_path_nodes, get_summaries, get_turns, store_summaries
+
+SYSTEM_PROMPT = "You are a LLM chat box. Give response within 300 tokens."
+
+# Input-token budget for history + prompt, per provider. Kept well below the
+# models' context windows: past this point extra history mostly adds latency
+# and cost. Override with VIZTHINK_CONTEXT_BUDGET_<PROVIDER>.
+CONTEXT_BUDGETS = {
+    "google": 16000,
+    "openai": 12000,
+    "anthropic": 16000,
+    "x": 12000,
+    "ollama": 3000,
+}
+DEFAULT_BUDGET = 8000
+
+# A rolling summary never grows past this many tokens; the oldest entries
+# are dropped first.
+SUMMARY_BUDGET = 800
+
+# Retrieval of related nodes from other branches (server/embeddings.py):
+# how many by default (0 = off), the similarity they need and the tokens
+# they may use.
+RETRIEVAL_K = int(os.getenv("VIZTHINK_RETRIEVAL_K", "0"))
+RETRIEVAL_MIN_SCORE = float(os.getenv("VIZTHINK_RETRIEVAL_MIN_SCORE", "0.1"))
+RETRIEVAL_BUDGET = 600
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (~4 characters per token for English)."""
+    return (len(text) + 3) // 4
+
+def context_budget(provider: str) -> int:
+    env = os.getenv(f"VIZTHINK_CONTEXT_BUDGET_{provider.upper()}")
+    if env:
+        return int(env)
+    return CONTEXT_BUDGETS.get(provider, DEFAULT_BUDGET)
+
+@dataclass
+class LLMContext:
+    """Everything a provider needs besides the new user prompt."""
+    system: str
+    # Role-tagged turns, oldest first: {"role": "user" | "assistant", "content": str}
+    history: List[Dict[str, str]] = field(default_factory=list)
+
+    def messages(self, user_prompt: str) -> List[Dict[str, str]]:
+        """OpenAI/Ollama style message list including the system prompt."""
+        return [{"role": "system", "content": self.system}, *self.history, {"role": "user", "content": user_prompt}]
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    # Prefer ending on a sentence boundary when one is reasonably close
+    boundaries = [m.start() for m in _SENTENCE_END.finditer(cut)]
+    if boundaries and boundaries[-1] > limit // 2:
+        return cut[:boundaries[-1]]
+    return cut.rstrip() + "…"
+
+def condense_turn(prompt: str, response: str) -> str:
+    """One-line extractive digest of a prompt/response pair."""
+    return f"- User: {_clip(prompt or '', 160)} | Assistant: {_clip(response or '', 240)}"
+
+def roll_summary(previous: Optional[str], prompt: str, response: str) -> str:
+    """Extend a rolling summary with one more turn, trimming the oldest lines."""
+    lines = previous.split("\n") if previous else []
+    lines.append(condense_turn(prompt, response))
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > SUMMARY_BUDGET:
+        lines.pop(0)
+    return "\n".join(lines)
+
+async def _summary_through(path: List[Tuple[int, str, str]], end: int) -> str:
+    """Rolling summary of ``path[:end]``, reusing and back-filling stored ones."""
+    ids = [node_id for node_id, _, _ in path[:end]]
+    stored = await get_summaries(ids)
+    # Start from the deepest node that already has a summary
+    start, summary = 0, None
+    for i in range(end - 1, -1, -1):
+        if ids[i] in stored:
+            start, summary = i + 1, stored[ids[i]]
+            break
+    computed = {}
+    for node_id, prompt, response in path[start:end]:
+        summary = roll_summary(summary, prompt, response)
+        computed[node_id] = summary
+    if computed:
+        await store_summaries(computed)
+    return summary or ""
+
+async def related_notes(user_prompt: str, k: int, exclude: List[int], graph_id: str = DEFAULT_GRAPH) -> str:
+    """Digest of the ``k`` nodes of the graph most similar to the prompt, outside ``exclude``."""
+    from server.embeddings import embedding_index
+    try:
+        matches = await embedding_index(graph_id).search(user_prompt, k, exclude=exclude, min_score=RETRIEVAL_MIN_SCORE)
+    except Exception as e:
+        # Retrieval is an enhancement; never fail the chat because of it
+        logger.warning(f"Related-node retrieval failed: {e}")
+        return ""
+    turns = await get_turns([node_id for node_id, _ in matches])
+    lines = []
+    for node_id, _ in matches:
+        if node_id in turns:
+            lines.append(condense_turn(*turns[node_id]))
+            if estimate_tokens("\n".join(lines)) > RETRIEVAL_BUDGET:
+                lines.pop()
+                break
+    return "\n".join(lines)
+
+async def build_context(
+    parent_id: Optional[int],
+    provider: str,
+    user_prompt: str = "",
+    retrieve: Optional[int] = None,
+    graph_id: str = DEFAULT_GRAPH,
+) -> LLMContext:
+    """Assemble the system prompt and role-tagged history for a new turn.
+
+    The most recent turns on the ancestor path are kept verbatim while they
+    fit the provider's token budget; everything older is replaced by the
+    cached rolling summary of that prefix. With ``retrieve`` (default
+    ``RETRIEVAL_K``) the most similar nodes from elsewhere in graph
+    ``graph_id`` are added to the system prompt as related notes.
+    """
+    k = RETRIEVAL_K if retrieve is None else retrieve
+    path = await get_path_nodes(parent_id) if parent_id is not None else []
+    system = SYSTEM_PROMPT
+    if k > 0 and user_prompt:
+        notes = await related_notes(user_prompt, k, [node_id for node_id, _, _ in path], graph_id)
+        if notes:
+            system += "\n\nRelated notes from other branches of this conversation:\n" + notes
+    if not path:
+        return LLMContext(system=system)
+
+    budget = context_budget(provider) - estimate_tokens(system) - estimate_tokens(user_prompt) - SUMMARY_BUDGET
+    used = 0
+    keep_from = len(path)
+    for i in range(len(path) - 1, -1, -1):
+        _, prompt, response = path[i]
+        cost = estimate_tokens(prompt or "") + estimate_tokens(response or "")
+        if used + cost > budget:
+            break
+        used += cost
+        keep_from = i
+
+    if keep_from > 0:
+        summary = await _summary_through(path, keep_from)
+        system += "\n\nSummary of the earlier conversation:\n" + summary
+        logger.info(f"Context for {provider}: summarised {keep_from} turns, kept {len(path) - keep_from} verbatim (~{used} tokens)")
+
+    history = []
+    for _, prompt, response in path[keep_from:]:
+        if prompt and response:  # providers reject empty turns
+            history.append({"role": "user", "content": prompt})
+            history.append({"role": "assistant", "content": response})
+    return LLMContext(system=system, history=history)
@@ -0,0 +1,277 @@
+import time
+from typing import Awaitable, Callable, List
+from server.logger import logger
+
+# Schema migrations, applied in order; the database's ``PRAGMA user_version``
+# is the number of migrations it has already been through. Append new
+# migrations, never edit old ones: they must keep producing the schema that
+# later migrations expect. That is also why literals (like the default graph
+# id) are spelled out rather than imported.
+
+Migration = Callable[..., Awaitable[None]]
+
+async def _columns(db, table: str) -> List[str]:
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    return [col[1] for col in await cursor.fetchall()]
+
+# Unix time in SQL (unixepoch() needs SQLite 3.38)
+_EPOCH_NOW = "(julianday('now') - 2440587.5) * 86400.0"
+
+async def _v1_unversioned(db) -> None:
+    """Bring a database from before versioning (any age) to its last unversioned layout."""
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chatrecord (
+            id INTEGER PRIMARY KEY,
+            prompt TEXT,
+            response TEXT,
+            parent_id INTEGER,
+            positions TEXT,
+            isBranch BOOLEAN
+        )
+        """
+    )
+    # Columns older versions added one at a time
+    columns = await _columns(db, "chatrecord")
+    for name, definition in (
+        ("parent_id", "INTEGER"),
+        ("isBranch", "BOOLEAN"),
+        ("rev", "INTEGER NOT NULL DEFAULT 0"),
+        ("summary", "TEXT"),
+        ("graph_id", "TEXT NOT NULL DEFAULT 'default'"),
+    ):
+        if name not in columns:
+            await db.execute(f"ALTER TABLE chatrecord ADD COLUMN {name} {definition}")
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sync_state (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            rev INTEGER NOT NULL,
+            cleared_rev INTEGER NOT NULL
+        )
+        """
+    )
+    await db.execute("INSERT OR IGNORE INTO sync_state (id, rev, cleared_rev) VALUES (0, 0, 0)")
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chatrecord_tombstone (
+            id INTEGER PRIMARY KEY,
+            rev INTEGER NOT NULL
+        )
+        """
+    )
+    if "graph_id" not in await _columns(db, "chatrecord_tombstone"):
+        await db.execute("ALTER TABLE chatrecord_tombstone ADD COLUMN graph_id TEXT NOT NULL DEFAULT 'default'")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_chatrecord_tombstone_graph ON chatrecord_tombstone(graph_id, rev)")
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS graphs (
+            id TEXT PRIMARY KEY,
+            name TEXT,
+            created_at REAL NOT NULL,
+            cleared_rev INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    await db.execute(
+        "INSERT OR IGNORE INTO graphs (id, name, created_at) VALUES ('default', 'Default', ?)", (time.time(),)
+    )
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """
+    )
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache(created_at)")
+    # External-content full-text index; its triggers are (re)made in v2
+    cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE name = 'chatrecord_fts'")
+    fts_exists = await cursor.fetchone() is not None
+    await db.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS chatrecord_fts USING fts5(
+            prompt, response, content='chatrecord', content_rowid='id', tokenize='porter unicode61'
+        )
+        """
+    )
+    if not fts_exists:
+        await db.execute("INSERT INTO chatrecord_fts (chatrecord_fts) VALUES ('rebuild')")
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chatrecord_embedding (
+            id INTEGER PRIMARY KEY,
+            model TEXT NOT NULL,
+            vector BLOB NOT NULL
+        )
+        """
+    )
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS subtree_summary (
+            hash TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """
+    )
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            payload TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            progress REAL NOT NULL DEFAULT 0,
+            message TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """
+    )
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, priority DESC, id)")
+
+async def _v2_typed_chatrecord(db) -> None:
+    """Rebuild ``chatrecord`` with typed columns, timestamps and cascading foreign keys.
+
+    ``positions`` JSON becomes ``pos_x``/``pos_y`` REAL, ``isBranch`` a 0/1
+    INTEGER, and ``parent_id``/``graph_id`` reference their rows with ON
+    DELETE CASCADE. Parent ids that point at no record (the frontend's
+    unsaved welcome node was sent as parent 0) become NULL.
+    """
+    now = time.time()
+    await db.execute(
+        """
+        INSERT OR IGNORE INTO graphs (id, created_at)
+        SELECT DISTINCT graph_id, ? FROM chatrecord
+        """,
+        (now,),
+    )
+    await db.execute(
+        """
+        CREATE TABLE chatrecord_v2 (
+            id INTEGER PRIMARY KEY,
+            graph_id TEXT NOT NULL DEFAULT 'default' REFERENCES graphs(id) ON DELETE CASCADE,
+            parent_id INTEGER REFERENCES chatrecord(id) ON DELETE CASCADE,
+            prompt TEXT,
+            response TEXT,
+            isBranch INTEGER NOT NULL DEFAULT 0 CHECK (isBranch IN (0, 1)),
+            pos_x REAL,
+            pos_y REAL,
+            summary TEXT,
+            rev INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL DEFAULT (EPOCH_NOW),
+            updated_at REAL NOT NULL DEFAULT (EPOCH_NOW)
+        )
+        """.replace("EPOCH_NOW", _EPOCH_NOW)
+    )
+    await db.execute(
+        """
+        INSERT INTO chatrecord_v2
+            (id, graph_id, parent_id, prompt, response, isBranch, pos_x, pos_y, summary, rev, created_at, updated_at)
+        SELECT c.id, c.graph_id,
+               (SELECT p.id FROM chatrecord p WHERE p.id = c.parent_id),
+               c.prompt, c.response,
+               CASE WHEN c.isBranch IN (1, '1', 'true', 'True') THEN 1 ELSE 0 END,
+               CASE WHEN json_valid(c.positions) THEN json_extract(c.positions, '$.x') END,
+               CASE WHEN json_valid(c.positions) THEN json_extract(c.positions, '$.y') END,
+               c.summary, c.rev, ?, ?
+        FROM chatrecord c
+        """,
+        (now, now),
+    )
+    await db.execute("DROP TABLE chatrecord")  # also drops its indexes and triggers
+    await db.execute("ALTER TABLE chatrecord_v2 RENAME TO chatrecord")
+    # Children lookups (path walks, subtree deletes) go through parent_id;
+    # every read, delta sync and clear is scoped to one graph
+    await db.execute("CREATE INDEX idx_chatrecord_parent_id ON chatrecord(parent_id)")
+    await db.execute("CREATE INDEX idx_chatrecord_graph_id ON chatrecord(graph_id, id)")
+    await db.execute("CREATE INDEX idx_chatrecord_graph_rev ON chatrecord(graph_id, rev)")
+    # Keep the full-text index in sync (the ids were kept, so it stays valid)
+    await db.execute(
+        """
+        CREATE TRIGGER chatrecord_fts_insert AFTER INSERT ON chatrecord BEGIN
+            INSERT INTO chatrecord_fts (rowid, prompt, response) VALUES (new.id, new.prompt, new.response);
+        END
+        """
+    )
+    await db.execute(
+        """
+        CREATE TRIGGER chatrecord_fts_delete AFTER DELETE ON chatrecord BEGIN
+            INSERT INTO chatrecord_fts (chatrecord_fts, rowid, prompt, response) VALUES ('delete', old.id, old.prompt, old.response);
+        END
+        """
+    )
+    await db.execute(
+        """
+        CREATE TRIGGER chatrecord_fts_update AFTER UPDATE OF prompt, response ON chatrecord BEGIN
+            INSERT INTO chatrecord_fts (chatrecord_fts, rowid, prompt, response) VALUES ('delete', old.id, old.prompt, old.response);
+            INSERT INTO chatrecord_fts (rowid, prompt, response) VALUES (new.id, new.prompt, new.response);
+        END
+        """
+    )
+    # Vectors go with their record through the foreign key instead of a trigger
+    await db.execute(
+        """
+        CREATE TABLE chatrecord_embedding_v2 (
+            id INTEGER PRIMARY KEY REFERENCES chatrecord(id) ON DELETE CASCADE,
+            model TEXT NOT NULL,
+            vector BLOB NOT NULL
+        )
+        """
+    )
+    await db.execute(
+        """
+        INSERT INTO chatrecord_embedding_v2 (id, model, vector)
+        SELECT e.id, e.model, e.vector FROM chatrecord_embedding e JOIN chatrecord c ON c.id = e.id
+        """
+    )
+    await db.execute("DROP TABLE chatrecord_embedding")
+    await db.execute("ALTER TABLE chatrecord_embedding_v2 RENAME TO chatrecord_embedding")
+
+MIGRATIONS: List[Migration] = [
+    _v1_unversioned,
+    _v2_typed_chatrecord,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+async def migrate(db) -> int:
+    """Apply the pending migrations, each in its own transaction; returns the schema version.
+
+    Foreign keys are off while a migration runs (tables are rebuilt by
+    copy and rename) and checked before it commits, so a migration that
+    would leave dangling references rolls back and the database stays at
+    the previous version.
+    """
+    cursor = await db.execute("PRAGMA user_version")
+    (version,) = await cursor.fetchone()
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {version} is newer than this app ({SCHEMA_VERSION})")
+    if version == SCHEMA_VERSION:
+        return version
+    await db.commit()
+    await db.execute("PRAGMA foreign_keys=OFF")
+    try:
+        for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            logger.info(f"Migrating database to version {target}: {migration.__doc__.splitlines()[0]}")
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                await migration(db)
+                cursor = await db.execute("PRAGMA foreign_key_check")
+                violations = await cursor.fetchall()
+                if violations:
+                    raise RuntimeError(f"Migration {target} leaves {len(violations)} broken references, e.g. {violations[0]}")
+                await db.execute(f"PRAGMA user_version = {target}")
+                await db.commit()
+            except BaseException:
+                await db.rollback()
+                raise
+            version = target
+    finally:
+        await db.execute("PRAGMA foreign_keys=ON")
+    return version
@@ -0,0 +1,110 @@
+import asyncio
+import aiosqlite
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+from server.logger import logger
+
+# Applied to every connection when it is opened. WAL lets readers run
+# alongside the single writer; NORMAL sync is durable across app crashes
+# under WAL and avoids an fsync per commit.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",     # 16 MiB page cache per connection
+    "PRAGMA mmap_size=268435456",   # 256 MiB memory-mapped I/O
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",       # parent/graph deletes cascade to records
+)
+
+class ConnectionPool:
+    """Long-lived aiosqlite connections: one writer and ``readers`` readers.
+
+    Writes are serialised on the writer connection, so SQLite never has to
+    arbitrate between writers (no ``database is locked``); reads are spread
+    over the reader connections and, thanks to WAL, never wait on a write.
+    The pool opens lazily on first use if ``open`` was not called.
+    """
+
+    def __init__(self, path: str, readers: int = 4):
+        self.path = path
+        self.readers = max(1, readers)
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._reader_queue: Optional[asyncio.Queue] = None
+        self._reader_conns: List[aiosqlite.Connection] = []
+        self._open_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(self.path)
+        for pragma in PRAGMAS:
+            await db.execute(pragma)
+        return db
+
+    async def open(self) -> None:
+        async with self._open_lock:
+            if self.is_open:
+                return
+            self._writer = await self._connect()
+            self._reader_queue = asyncio.Queue()
+            for _ in range(self.readers):
+                db = await self._connect()
+                self._reader_conns.append(db)
+                self._reader_queue.put_nowait(db)
+            logger.info(f"Opened SQLite pool at {self.path} (1 writer, {self.readers} readers)")
+
+    async def close(self) -> None:
+        async with self._open_lock:
+            if not self.is_open:
+                return
+            async with self._write_lock:
+                await self._writer.close()
+                self._writer = None
+            for db in self._reader_conns:
+                await db.close()
+            self._reader_conns = []
+            self._reader_queue = None
+            logger.info("Closed SQLite pool")
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Exclusive access to the writer connection; rolls back on error."""
+        if not self.is_open:
+            await self.open()
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+
+    @asynccontextmanager
+    async def snapshot(self) -> AsyncIterator[aiosqlite.Connection]:
+        """A connection of its own inside one read transaction, for long scans.
+
+        Exports stream from it at the client's pace: it is not one of the
+        pooled readers, so a slow download never holds up other reads, and
+        every row comes from the same snapshot of the database.
+        """
+        db = await self._connect()
+        try:
+            await db.execute("BEGIN")
+            yield db
+        finally:
+            await db.close()
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a reader connection for the duration of the block."""
+        if not self.is_open:
+            await self.open()
+        queue = self._reader_queue
+        db = await queue.get()
+        try:
+            yield db
+        finally:
+            queue.put_nowait(db)
@@ -1,142 +1,846 @@
 import os
 import json
-import aiosqlite
-from typing import Optional, List, Tuple
+import time
+import asyncio
+from typing import Any, AsyncIterator, Dict, Optional, List, Sequence, Tuple
 from dotenv import load_dotenv
 load_dotenv()
 from server.logger import logger
+from server.dao.pool import ConnectionPool
+from server.dao.migrations import migrate
+from server.metrics import registry, timed_query
+from server.events import event_hub
+from server.scheme.graph import Graph, GraphStore
 DB_PATH = os.getenv("VIZTHINK_DB", "vizthink.db")
 
+# Graph that requests without a graph id (and records from before graphs
+# existed) belong to
+DEFAULT_GRAPH = "default"
+
+# Shared connections for every DAO call; opened/closed by the app lifespan.
+pool = ConnectionPool(DB_PATH, readers=int(os.getenv("VIZTHINK_DB_READERS", "4")))
+
+# In-memory copies of recently used graphs (server/scheme/graph.py). The
+# write paths below update them while holding the writer connection, and a
+# graph is loaded under that same lock, so a loaded graph never misses a write.
+graph_store = GraphStore(
+    max_graphs=int(os.getenv("VIZTHINK_GRAPH_CACHE_SIZE", "8")),
+    idle_seconds=float(os.getenv("VIZTHINK_GRAPH_IDLE_SECONDS", "600")),
+)
+registry.collector(lambda: [
+    "# HELP vizthink_graph_store_loaded Graphs and nodes held in memory by the graph store.",
+    "# TYPE vizthink_graph_store_loaded gauge",
+    *(f'vizthink_graph_store_loaded{{kind="{kind}"}} {count}' for kind, count in graph_store.stats().items()),
+])
+
+async def _loaded_graph(graph_id: str) -> Graph:
+    """The graph from the store, loading it whole (O(size of the graph)) if needed."""
+    graph = graph_store.get(graph_id)
+    if graph is not None:
+        return graph
+    async with pool.writer() as db:
+        graph = graph_store.get(graph_id)  # loaded while we waited
+        if graph is None:
+            cursor = await db.execute(
+                "SELECT id, parent_id, prompt, response, isBranch, pos_x, pos_y FROM chatrecord WHERE graph_id = ? ORDER BY id",
+                (graph_id,),
+            )
+            graph = graph_store.load(graph_id, await cursor.fetchall())
+            logger.info(f"Loaded graph {graph_id} ({len(graph)} nodes)")
+    return graph
+
 async def init_db() -> None:
     logger.info(f"Initializing database at {DB_PATH}")
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.writer() as db:
+        version = await migrate(db)
+    logger.info(f"Database schema at version {version}")
+
+async def _next_rev(db) -> int:
+    """Bump and return the global revision inside the caller's transaction."""
+    cursor = await db.execute("UPDATE sync_state SET rev = rev + 1 WHERE id = 0 RETURNING rev")
+    (rev,) = await cursor.fetchone()
+    return rev
+
+@timed_query
+async def store_one_chatrecord(
+    prompt: str,
+    response: str,
+    parent_id: Optional[int] = None,
+    isBranch: bool = False,
+    graph_id: str = DEFAULT_GRAPH,
+) -> int:
+    """Store a single prompt/response pair along with the parent_id
+
+    A root starts ``graph_id`` (creating the graph if it is new). A parent
+    that does not exist (such as the frontend's unsaved welcome node) is
+    dropped: the record becomes a root. A parent in another graph raises
+    ``ValueError``.
+    """
+    now = time.time()
+    async with pool.writer() as db:
+        rev = await _next_rev(db)
+        if parent_id is not None:
+            cursor = await db.execute("SELECT graph_id FROM chatrecord WHERE id = ?", (parent_id,))
+            parent = await cursor.fetchone()
+            if parent is None:
+                parent_id = None
+            elif parent[0] != graph_id:
+                raise ValueError(f"Parent {parent_id} belongs to graph {parent[0]}, not {graph_id}")
+        # A new graph starts "cleared" at this revision: stale cursors for a
+        # deleted graph of the same id reset instead of keeping old nodes
         await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS chatrecord (
-                id INTEGER PRIMARY KEY,
-                prompt TEXT,
-                response TEXT,
-                parent_id INTEGER,
-                positions TEXT,
-                isBranch BOOLEAN
-            )
-            """
+            "INSERT OR IGNORE INTO graphs (id, created_at, cleared_rev) VALUES (?, ?, ?)",
+            (graph_id, now, rev),
         )
-        # Check and add parent_id column if missing
-        cursor = await db.execute("PRAGMA table_info(chatrecord)")
-        columns = await cursor.fetchall()
-        column_names = [col[1] for col in columns]
-        if 'parent_id' not in column_names:
-            await db.execute("ALTER TABLE chatrecord ADD COLUMN parent_id INTEGER")
-        if 'isBranch' not in column_names:
-            await db.execute("ALTER TABLE chatrecord ADD COLUMN isBranch BOOLEAN")
-        await db.commit()
-        # Note: Removed automatic deletion of chat records on startup
-        # This was causing issues with duplicate welcome nodes
-
-async def store_one_chatrecord(prompt: str, response: str, parent_id: Optional[int] = None, isBranch: bool = False) -> int:
-    """Store a single prompt/response pair along with the parent_id"""
-    async with aiosqlite.connect(DB_PATH) as db:
         cursor = await db.execute(
-            "INSERT INTO chatrecord (prompt, response, parent_id, isBranch) VALUES (?, ?, ?, ?)",
-            (prompt, response, parent_id, isBranch),
+            """
+            INSERT INTO chatrecord (prompt, response, parent_id, isBranch, rev, graph_id, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (prompt, response, parent_id, bool(isBranch), rev, graph_id, now, now),
         )
         new_id = cursor.lastrowid
+        # Row ids can be reused after a delete; the row is live again
+        await db.execute("DELETE FROM chatrecord_tombstone WHERE id = ?", (new_id,))
         await db.commit()
+        graph_store.add(graph_id, new_id, prompt, response, parent_id, bool(isBranch))
+        event_hub.publish(graph_id, {"type": "nodes_added", "rev": rev, "records": [{
+            "id": new_id, "prompt": prompt, "response": response, "positions": None,
+            "parent_id": parent_id, "isBranch": bool(isBranch),
+        }]})
         logger.info("Chat record saved with id %d.", new_id)
         return new_id
 
-async def store_all_positions(positions: list[dict]):
-    """Update each chatrecord row with its current node position.
+@timed_query
+async def store_positions(positions: Dict[int, dict], graph_id: str = DEFAULT_GRAPH) -> int:
+    """Write node positions keyed by node id in a single batched transaction.
 
-    Assumes the order of ``positions`` matches the chronological order
-    (and therefore the primary key) of chatrecord rows, i.e. the first
-    prompt/response pair corresponds to node index 0, the second to 1, ….
+    Only nodes of ``graph_id`` are moved; ids from other graphs (or deleted
+    ones) are skipped. Returns the number of nodes moved.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        for idx, pos in enumerate(positions, start=1):
-            await db.execute(
-                "UPDATE chatrecord SET positions = ? WHERE id = ?",
-                (json.dumps(pos), idx),
-            )
-        logger.info("Updated positions for %d nodes.", len(positions))
+    if not positions:
+        return 0
+    now = time.time()
+    coordinates = {int(node_id): (float(pos["x"]), float(pos["y"])) for node_id, pos in positions.items()}
+    async with pool.writer() as db:
+        cursor = await db.execute(
+            "SELECT id FROM chatrecord WHERE graph_id = ? AND id IN (SELECT value FROM json_each(?))",
+            (graph_id, json.dumps(list(coordinates))),
+        )
+        moved = {node_id: coordinates[node_id] for (node_id,) in await cursor.fetchall()}
+        if not moved:
+            return 0
+        rev = await _next_rev(db)
+        await db.executemany(
+            "UPDATE chatrecord SET pos_x = ?, pos_y = ?, rev = ?, updated_at = ? WHERE id = ? AND graph_id = ?",
+            [(x, y, rev, now, node_id, graph_id) for node_id, (x, y) in moved.items()],
+        )
         await db.commit()
+        graph_store.move(moved)
+        # Echoed to the mover too: one flush merges several clients' drags
+        event_hub.publish(graph_id, {
+            "type": "positions", "rev": rev, "positions": {node_id: {"x": x, "y": y} for node_id, (x, y) in moved.items()},
+        }, echo=True)
+    logger.info("Updated positions for %d nodes of graph %s.", len(moved), graph_id)
+    return len(moved)
 
+class PositionBuffer:
+    """Coalesce bursts of position updates into one write per debounce window.
+
+    Dragging a node posts many small diffs in quick succession; ``submit``
+    merges them per graph (last position per node wins) and one
+    ``store_positions`` per graph runs once the window elapses. ``close``
+    writes immediately and is called on shutdown so no accepted update is lost.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._pending: Dict[str, Dict[int, dict]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def submit(self, positions: Dict[int, dict], graph_id: str = DEFAULT_GRAPH) -> int:
+        """Queue a diff for ``graph_id``; returns how many of its nodes are pending."""
+        pending = self._pending.setdefault(graph_id, {})
+        pending.update(positions)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_later())
+        return len(pending)
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.delay)
+        self._task = None  # updates arriving mid-write start a new window
+        await self.flush()
+
+    async def flush(self) -> None:
+        batches, self._pending = self._pending, {}
+        for graph_id, batch in batches.items():
+            try:
+                await store_positions(batch, graph_id)
+            except Exception as e:
+                logger.error(f"Error writing buffered positions of graph {graph_id}: {e}", exc_info=True)
+
+    async def close(self) -> None:
+        """Cancel the pending timer and write whatever is buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+position_buffer = PositionBuffer(delay=float(os.getenv("VIZTHINK_POSITION_DEBOUNCE_MS", "250")) / 1000)
+
+@timed_query
+async def get_path_nodes(node_id: int) -> List[Tuple[int, str, str]]:
+    """Return the (id, prompt, response) triples from the root down to ``node_id``.
+
+    The path is walked in memory over the node's loaded graph, in time
+    proportional to its length; only the first use of a graph reads it.
+    """
+    node_id = int(node_id)  # route bodies may carry ids as strings
+    found = graph_store.find(node_id)
+    if found is None:
+        async with pool.reader() as db:
+            cursor = await db.execute("SELECT graph_id FROM chatrecord WHERE id = ?", (node_id,))
+            row = await cursor.fetchone()
+        if row is None:
+            return []
+        graph = await _loaded_graph(row[0])
+        node = graph.nodes.get(node_id)
+        if node is None:
+            return []  # deleted meanwhile
+    else:
+        node = found[1]
+    return [(n.id, n.prompt, n.response) for n in node.path()]
+
+@timed_query
 async def get_path_history(node_id: int) -> List[Tuple[str, str]]:
-    history = []
-    async with aiosqlite.connect(DB_PATH) as db:
-        current = node_id
-        while current is not None:
-            cursor = await db.execute(
-                "SELECT prompt, response, parent_id FROM chatrecord WHERE id = ?",
-                (current,),
-            )
+    """Return the (prompt, response) pairs from the root down to ``node_id``."""
+    return [(prompt, response) for _, prompt, response in await get_path_nodes(node_id)]
+
+@timed_query
+async def get_summaries(node_ids: Sequence[int]) -> Dict[int, str]:
+    """Return the stored rolling summaries for ``node_ids`` that have one."""
+    if not node_ids:
+        return {}
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            "SELECT id, summary FROM chatrecord WHERE summary IS NOT NULL AND id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(node_ids)),),
+        )
+        return {node_id: summary for node_id, summary in await cursor.fetchall()}
+
+@timed_query
+async def store_summaries(summaries: Dict[int, str]) -> None:
+    """Persist rolling summaries next to their chatrecord rows."""
+    if not summaries:
+        return
+    async with pool.writer() as db:
+        await db.executemany(
+            "UPDATE chatrecord SET summary = ? WHERE id = ?",
+            [(summary, node_id) for node_id, summary in summaries.items()],
+        )
+        await db.commit()
+
+@timed_query
+async def get_all_chatrecord(graph_id: str = DEFAULT_GRAPH):
+    """Return list of tuples: (id, prompt, response, positions, parent_id, isBranch) of one graph"""
+    graph = await _loaded_graph(graph_id)
+    parsed = [node.record() for node in graph.nodes.values()]
+    logger.info("Retrieved %d chat records.", len(parsed))
+    return parsed
+
+@timed_query
+async def get_tree_nodes(graph_id: str = DEFAULT_GRAPH) -> List[Tuple[int, Optional[int], str, str]]:
+    """Every node of a graph as (id, parent_id, prompt, response), oldest first."""
+    graph = await _loaded_graph(graph_id)
+    return [(node.id, node.parent_id, node.prompt, node.response) for node in graph.nodes.values()]
+
+@timed_query
+async def get_node_neighbourhood(node_id: int, graph_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Where a node sits in its tree: depth, ancestor, sibling and child ids, subtree size.
+
+    ``None`` if the node does not exist (or is not in ``graph_id``).
+    """
+    node_id = int(node_id)
+    found = graph_store.find(node_id)
+    if found is None:
+        async with pool.reader() as db:
+            cursor = await db.execute("SELECT graph_id FROM chatrecord WHERE id = ?", (node_id,))
             row = await cursor.fetchone()
-            if row is None:
-                break
-            prompt, response, parent_id = row
-            history.append((prompt, response))
-            current = parent_id
-    history.reverse()
-    return history
-
-async def get_all_chatrecord():
-    """Return list of tuples: (id, prompt, response, positions, parent_id)"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT id, prompt, response, positions, parent_id, isBranch FROM chatrecord")
+        if row is None:
+            return None
+        found = (await _loaded_graph(row[0]), None)
+    graph = found[0]
+    node = graph.nodes.get(node_id)
+    if node is None or (graph_id is not None and graph.id != graph_id):
+        return None
+    return {
+        "id": node.id,
+        "graph_id": graph.id,
+        "depth": node.depth(),
+        "path": [n.id for n in node.path()],
+        "siblings": [n.id for n in node.siblings()],
+        "children": [n.id for n in node.children],
+        "descendants": sum(1 for _ in node.subtree()) - 1,
+    }
+
+# Columns a client may project; ``id`` is always included.
+RECORD_FIELDS = ("id", "prompt", "response", "positions", "parent_id", "isBranch", "rev", "created_at", "updated_at")
+
+def _record_columns(fields: Sequence[str]) -> str:
+    """SQL select list for ``fields``; ``positions`` is stored as ``pos_x, pos_y``."""
+    return ", ".join("pos_x, pos_y" if f == "positions" else f for f in fields)
+
+def _record(fields: Sequence[str], row: Sequence[Any]) -> Dict[str, Any]:
+    record, values = {}, iter(row)
+    for f in fields:
+        if f == "positions":
+            x, y = next(values), next(values)
+            record[f] = {"x": x, "y": y} if x is not None else None
+        else:
+            record[f] = next(values)
+    if "isBranch" in record:
+        record["isBranch"] = bool(record["isBranch"])
+    return record
+
+@timed_query
+async def get_chatrecord_page(
+    after_id: Optional[int] = None,
+    limit: int = 500,
+    since_rev: Optional[int] = None,
+    fields: Optional[Sequence[str]] = None,
+    graph_id: str = DEFAULT_GRAPH,
+) -> Dict[str, Any]:
+    """Return one keyset page of a graph's records, optionally only those changed since a revision.
+
+    Args:
+        after_id: Only return records with ``id`` greater than this (keyset cursor).
+        limit: Maximum number of records in the page.
+        since_rev: Only return records written after this revision, plus the ids
+            deleted since then. If the graph was cleared after ``since_rev``,
+            ``reset`` is True and the client should drop its copy.
+        fields: Columns to include (subset of ``RECORD_FIELDS``); all if None.
+        graph_id: The graph to read.
+
+    Returns:
+        dict with ``records`` (list of dicts), ``next_after_id`` (None on the
+        last page), ``rev`` (revision to use as the next ``since_rev``),
+        ``deleted`` and ``reset``.
+    """
+    columns = ["id"] + [f for f in (fields or RECORD_FIELDS) if f in RECORD_FIELDS and f != "id"]
+    where, params = ["graph_id = ?"], [graph_id]
+    if after_id is not None:
+        where.append("id > ?")
+        params.append(after_id)
+    async with pool.reader() as db:
+        # Read the revision first: anything written after this point carries
+        # a higher rev and will be picked up by the next delta request.
+        rev, cleared_rev = await _sync_revision(db, graph_id)
+        reset = since_rev is not None and since_rev < cleared_rev
+        deleted: List[int] = []
+        if since_rev is not None and not reset:
+            where.append("rev > ?")
+            params.append(since_rev)
+            if after_id is None:
+                cursor = await db.execute(
+                    "SELECT id FROM chatrecord_tombstone WHERE graph_id = ? AND rev > ?", (graph_id, since_rev)
+                )
+                deleted = [row[0] for row in await cursor.fetchall()]
+        sql = f"SELECT {_record_columns(columns)} FROM chatrecord WHERE " + " AND ".join(where)
+        sql += " ORDER BY id LIMIT ?"
+        cursor = await db.execute(sql, (*params, limit + 1))
         rows = await cursor.fetchall()
-        parsed = []
-        for row in rows:
-            id_, prompt, response, pos_json, parent_id, isBranch = row
-            positions = json.loads(pos_json) if pos_json else None
-            parsed.append((id_, prompt, response, positions, parent_id, isBranch))
-        logger.info(f"Retrieved chatrecord: {parsed}")
-        return parsed
-async def delete_all_chatrecord():
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("DELETE FROM chatrecord")
-        await db.commit()
-        logger.info("Chat history cleared successfully.")
-
-async def delete_single_chatrecord(node_id: int) -> bool:
+
+    has_more = len(rows) > limit
+    records = [_record(columns, row) for row in rows[:limit]]
+    return {
+        "records": records,
+        "next_after_id": records[-1]["id"] if has_more else None,
+        "rev": rev,
+        "deleted": deleted,
+        "reset": reset,
+    }
+
+@timed_query
+async def get_one_chatrecord(node_id: int, graph_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Return a single record as a dict, or None if it does not exist (in ``graph_id``, if given)."""
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            f"SELECT {_record_columns(RECORD_FIELDS)} FROM chatrecord WHERE id = ? AND graph_id = COALESCE(?, graph_id)",
+            (node_id, graph_id),
+        )
+        row = await cursor.fetchone()
+    return _record(RECORD_FIELDS, row) if row is not None else None
+
+# Columns written by exports and read back by imports
+EXPORT_FIELDS = ("id", "parent_id", "prompt", "response", "positions", "isBranch", "created_at", "updated_at")
+
+async def iter_chatrecords(
+    graph_id: str = DEFAULT_GRAPH, root_id: Optional[int] = None, batch_size: int = 500
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yield the records of a graph (or of the subtree under ``root_id``) in batches, oldest first.
+
+    Rows are fetched from one snapshot as they are consumed, so memory stays
+    at one batch whatever the graph size. Ids grow, so a parent always comes
+    before its children.
+    """
+    columns = _record_columns(EXPORT_FIELDS)
+    if root_id is None:
+        sql = f"SELECT {columns} FROM chatrecord WHERE graph_id = ? ORDER BY id"
+        params: Tuple[Any, ...] = (graph_id,)
+    else:
+        sql = f"""
+            WITH RECURSIVE subtree(id) AS (
+                SELECT id FROM chatrecord WHERE id = ? AND graph_id = ?
+                UNION ALL
+                SELECT c.id FROM chatrecord c JOIN subtree s ON c.parent_id = s.id
+            )
+            SELECT {columns} FROM chatrecord WHERE id IN (SELECT id FROM subtree) ORDER BY id
+        """
+        params = (root_id, graph_id)
+    async with pool.snapshot() as db:
+        cursor = await db.execute(sql, params)
+        while True:
+            rows = await cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [_record(EXPORT_FIELDS, row) for row in rows]
+
+@timed_query
+async def store_imported_chatrecords(
+    records: Sequence[Dict[str, Any]], graph_id: str, id_map: Dict[int, int], parent_id: Optional[int] = None
+) -> int:
+    """Insert one batch of exported records into ``graph_id`` in a single transaction.
+
+    Records get fresh ids; ``id_map`` (exported id -> new id) is extended so
+    that later batches find their parents. A record whose parent was not
+    imported is attached under ``parent_id`` (a root if None). Returns the
+    number of records inserted.
+    """
+    now = time.time()
+    async with pool.writer() as db:
+        rev = await _next_rev(db)
+        cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM chatrecord")
+        (last_id,) = await cursor.fetchone()
+        first_id = last_id + 1
+        new_ids: Dict[int, int] = {}
+        rows = []
+        for record in records:
+            last_id += 1
+            new_ids[record["id"]] = last_id
+            parent = record.get("parent_id")
+            parent = new_ids.get(parent) or id_map.get(parent) or parent_id
+            positions = record.get("positions") or {}
+            rows.append((
+                last_id, graph_id, parent, record.get("prompt"), record.get("response"),
+                int(bool(record.get("isBranch"))), positions.get("x"), positions.get("y"), rev,
+                record.get("created_at") or now, record.get("updated_at") or now,
+            ))
+        await db.execute(
+            "INSERT OR IGNORE INTO graphs (id, created_at, cleared_rev) VALUES (?, ?, ?)", (graph_id, now, rev)
+        )
+        await db.executemany(
+            """
+            INSERT INTO chatrecord
+                (id, graph_id, parent_id, prompt, response, isBranch, pos_x, pos_y, rev, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+        # Row ids can be reused after a delete; these rows are live again
+        await db.execute("DELETE FROM chatrecord_tombstone WHERE id BETWEEN ? AND ?", (first_id, last_id))
+        await db.commit()
+        graph_store.evict(graph_id)  # reloaded on next use rather than patched row by row
+        event_hub.publish(graph_id, {"type": "nodes_added", "rev": rev, "records": [
+            {
+                "id": new_id, "prompt": prompt, "response": response, "parent_id": parent, "isBranch": bool(isBranch),
+                "positions": {"x": x, "y": y} if x is not None else None,
+            }
+            for new_id, _, parent, prompt, response, isBranch, x, y, *_ in rows
+        ]})
+    id_map.update(new_ids)
+    return len(rows)
+
+@timed_query
+async def delete_all_chatrecord(graph_id: str = DEFAULT_GRAPH) -> int:
+    """Clear one graph; other graphs are untouched. Returns the number of records deleted."""
+    async with pool.writer() as db:
+        rev = await _next_rev(db)
+        cursor = await db.execute("SELECT id FROM chatrecord WHERE graph_id = ?", (graph_id,))
+        deleted = [row[0] for row in await cursor.fetchall()]
+        # Unlink first: deleting a linked chain would run the parent_id
+        # cascade as nested triggers, which SQLite caps at 1000 levels
+        await db.execute("UPDATE chatrecord SET parent_id = NULL WHERE graph_id = ?", (graph_id,))
+        await db.execute("DELETE FROM chatrecord WHERE graph_id = ?", (graph_id,))
+        await db.execute("DELETE FROM chatrecord_tombstone WHERE graph_id = ?", (graph_id,))
+        await db.execute("UPDATE graphs SET cleared_rev = ? WHERE id = ?", (rev, graph_id))
+        await db.commit()
+        graph_store.evict(graph_id)
+        event_hub.publish(graph_id, {"type": "graph_cleared", "rev": rev})
+    logger.info(f"Chat history of graph {graph_id} cleared ({len(deleted)} records).")
+    return len(deleted)
+
+@timed_query
+async def delete_single_chatrecord(node_id: int, graph_id: Optional[str] = None) -> bool:
     """Delete a single chat record by its ID and all its descendants
-    
+
+    The subtree's ids (which become tombstones) come from the loaded graph
+    when there is one, otherwise from one recursive query. The rows are
+    unlinked and then deleted by two set-based statements in a single
+    transaction, so the ``parent_id`` ON DELETE CASCADE never fires: SQLite
+    runs it as nested triggers and fails on chains deeper than 1000 nodes.
+
     Args:
         node_id: The ID of the node to delete
-        
+        graph_id: If given, only delete the node if it belongs to this graph
+
     Returns:
         bool: True if any records were deleted, False otherwise
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        # First, find all descendants recursively
-        descendants = await _get_all_descendants(db, node_id)
-        all_to_delete = [node_id] + descendants
-        
-        if not all_to_delete:
-            logger.warning(f"No records found to delete for node_id: {node_id}")
-            return False
-        
-        # Delete all nodes (parent and descendants)
-        placeholders = ','.join('?' * len(all_to_delete))
-        await db.execute(f"DELETE FROM chatrecord WHERE id IN ({placeholders})", all_to_delete)
-        await db.commit()
-        
-        logger.info(f"Deleted {len(all_to_delete)} chat records: {all_to_delete}")
-        return True
-
-async def _get_all_descendants(db, parent_id: int) -> List[int]:
-    """Recursively get all descendant IDs of a given parent node"""
-    descendants = []
-    
-    # Get direct children
-    cursor = await db.execute("SELECT id FROM chatrecord WHERE parent_id = ?", (parent_id,))
-    children = await cursor.fetchall()
-    
-    for (child_id,) in children:
-        descendants.append(child_id)
-        # Recursively get descendants of this child
-        child_descendants = await _get_all_descendants(db, child_id)
-        descendants.extend(child_descendants)
-    
-    return descendants
+    node_id = int(node_id)
+    async with pool.writer() as db:
+        found = graph_store.find(node_id)
+        if found is not None:
+            graph, node = found
+            rows = [(n.id, graph.id) for n in node.subtree()] if graph_id in (None, graph.id) else []
+        else:
+            cursor = await db.execute(
+                """
+                WITH RECURSIVE subtree(id, graph_id) AS (
+                    SELECT id, graph_id FROM chatrecord WHERE id = ? AND graph_id = COALESCE(?, graph_id)
+                    UNION ALL
+                    SELECT c.id, c.graph_id FROM chatrecord c JOIN subtree s ON c.parent_id = s.id
+                )
+                SELECT id, graph_id FROM subtree
+                """,
+                (node_id, graph_id),
+            )
+            rows = await cursor.fetchall()
+        deleted = [row[0] for row in rows]
+        if deleted:
+            ids = json.dumps(deleted)
+            await db.execute("UPDATE chatrecord SET parent_id = NULL WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+            await db.execute("DELETE FROM chatrecord WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+            rev = await _next_rev(db)
+            await db.execute(
+                """
+                INSERT OR REPLACE INTO chatrecord_tombstone (id, rev, graph_id)
+                SELECT json_extract(value, '$[0]'), ?, json_extract(value, '$[1]') FROM json_each(?)
+                """,
+                (rev, json.dumps([list(row) for row in rows])),
+            )
+        await db.commit()
+        if deleted:
+            # Only once the rows are gone: a graph_id mismatch deletes nothing
+            graph_store.remove_subtree(node_id)
+            event_hub.publish(rows[0][1], {"type": "nodes_deleted", "rev": rev, "ids": deleted})
+
+    if not deleted:
+        logger.warning(f"No records found to delete for node_id: {node_id}")
+        return False
+
+    logger.info(f"Deleted {len(deleted)} chat records under node {node_id}")
+    return True
+
+@timed_query
+async def list_graphs() -> List[Dict[str, Any]]:
+    """Every graph with its record count, oldest first."""
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            """
+            SELECT g.id, g.name, g.created_at, (SELECT COUNT(*) FROM chatrecord c WHERE c.graph_id = g.id)
+            FROM graphs g ORDER BY g.created_at, g.id
+            """
+        )
+        rows = await cursor.fetchall()
+    return [{"id": id_, "name": name, "created_at": created_at, "records": count} for id_, name, created_at, count in rows]
+
+@timed_query
+async def create_graph(graph_id: str, name: Optional[str] = None) -> bool:
+    """Create an empty graph (or rename an existing one); True if it was new."""
+    async with pool.writer() as db:
+        rev = await _next_rev(db)
+        cursor = await db.execute(
+            "INSERT OR IGNORE INTO graphs (id, name, created_at, cleared_rev) VALUES (?, ?, ?, ?)",
+            (graph_id, name, time.time(), rev),
+        )
+        created = cursor.rowcount > 0
+        if not created and name is not None:
+            await db.execute("UPDATE graphs SET name = ? WHERE id = ?", (name, graph_id))
+        await db.commit()
+    return created
+
+@timed_query
+async def delete_graph(graph_id: str) -> bool:
+    """Delete a graph and all of its records; False if it did not exist."""
+    await delete_all_chatrecord(graph_id)
+    async with pool.writer() as db:
+        cursor = await db.execute("DELETE FROM graphs WHERE id = ?", (graph_id,))
+        await db.commit()
+    return cursor.rowcount > 0
+
+@timed_query
+async def get_cached_response(key: str, min_created_at: float) -> Optional[str]:
+    """Return a cached LLM response newer than ``min_created_at``, if any."""
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            "SELECT response FROM llm_cache WHERE key = ? AND created_at >= ?",
+            (key, min_created_at),
+        )
+        row = await cursor.fetchone()
+    return row[0] if row else None
+
+@timed_query
+async def put_cached_response(key: str, response: str, created_at: float) -> None:
+    async with pool.writer() as db:
+        await db.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, response, created_at) VALUES (?, ?, ?)",
+            (key, response, created_at),
+        )
+        await db.commit()
+
+@timed_query
+async def prune_cached_responses(max_entries: int, min_created_at: float) -> int:
+    """Drop expired entries and the oldest ones beyond ``max_entries``."""
+    async with pool.writer() as db:
+        cursor = await db.execute("DELETE FROM llm_cache WHERE created_at < ?", (min_created_at,))
+        removed = cursor.rowcount
+        cursor = await db.execute(
+            """
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (max_entries,),
+        )
+        removed += cursor.rowcount
+        await db.commit()
+    return removed
+
+@timed_query
+async def clear_cached_responses() -> None:
+    async with pool.writer() as db:
+        await db.execute("DELETE FROM llm_cache")
+        await db.commit()
+
+def _fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, the last as a prefix."""
+    terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+@timed_query
+async def search_chatrecords(
+    text: str,
+    limit: int = 20,
+    offset: int = 0,
+    root_id: Optional[int] = None,
+    graph_id: str = DEFAULT_GRAPH,
+) -> Dict[str, Any]:
+    """Ranked full-text search over the prompts and responses of one graph.
+
+    Returns ``{results, next_offset}``; each result carries highlighted
+    ``prompt``/``response`` snippets (matches wrapped in ``<mark>``) and its
+    bm25 ``rank`` (lower is better). ``root_id`` limits the search to that
+    node's subtree.
+    """
+    query = _fts_query(text)
+    if not query:
+        return {"results": [], "next_offset": None}
+    params: List[Any] = [query, graph_id]
+    subtree = ""
+    if root_id is not None:
+        subtree = """
+            AND c.id IN (
+                WITH RECURSIVE subtree(id) AS (
+                    SELECT ?
+                    UNION ALL
+                    SELECT child.id FROM chatrecord child JOIN subtree ON child.parent_id = subtree.id
+                )
+                SELECT id FROM subtree
+            )
+        """
+        params.append(root_id)
+    params += [limit + 1, offset]
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            f"""
+            SELECT c.id, c.parent_id,
+                   snippet(chatrecord_fts, 0, '<mark>', '</mark>', '…', 12),
+                   snippet(chatrecord_fts, 1, '<mark>', '</mark>', '…', 24),
+                   bm25(chatrecord_fts) AS rank
+            FROM chatrecord_fts JOIN chatrecord c ON c.id = chatrecord_fts.rowid
+            WHERE chatrecord_fts MATCH ? AND c.graph_id = ? {subtree}
+            ORDER BY rank
+            LIMIT ? OFFSET ?
+            """,
+            params,
+        )
+        rows = await cursor.fetchall()
+    results = [
+        {"id": row[0], "parent_id": row[1], "prompt": row[2], "response": row[3], "rank": row[4]}
+        for row in rows[:limit]
+    ]
+    return {"results": results, "next_offset": offset + limit if len(rows) > limit else None}
+
+@timed_query
+async def get_turns(node_ids: Sequence[int]) -> Dict[int, Tuple[str, str]]:
+    """``id -> (prompt, response)`` for the given nodes that exist."""
+    if not node_ids:
+        return {}
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            "SELECT id, prompt, response FROM chatrecord WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(node_ids)),),
+        )
+        return {node_id: (prompt, response) for node_id, prompt, response in await cursor.fetchall()}
 
+async def _sync_revision(db, graph_id: str) -> Tuple[int, int]:
+    cursor = await db.execute(
+        "SELECT s.rev, COALESCE(g.cleared_rev, s.rev) FROM sync_state s LEFT JOIN graphs g ON g.id = ? WHERE s.id = 0",
+        (graph_id,),
+    )
+    return tuple(await cursor.fetchone())
+
+@timed_query
+async def get_sync_revision(graph_id: str = DEFAULT_GRAPH) -> Tuple[int, int]:
+    """Current global ``rev`` and the ``cleared_rev`` of one graph (``rev`` if it does not exist)."""
+    async with pool.reader() as db:
+        return await _sync_revision(db, graph_id)
+
+@timed_query
+async def get_deleted_ids_since(rev: int, graph_id: str = DEFAULT_GRAPH) -> List[int]:
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            "SELECT id FROM chatrecord_tombstone WHERE graph_id = ? AND rev > ?", (graph_id, rev)
+        )
+        return [row[0] for row in await cursor.fetchall()]
+
+@timed_query
+async def get_embeddings(model: str, graph_id: str = DEFAULT_GRAPH) -> List[Tuple[int, bytes]]:
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            """
+            SELECT e.id, e.vector FROM chatrecord c JOIN chatrecord_embedding e ON e.id = c.id
+            WHERE c.graph_id = ? AND e.model = ?
+            """,
+            (graph_id, model),
+        )
+        return list(await cursor.fetchall())
+
+@timed_query
+async def get_unembedded_records(model: str, limit: int, graph_id: str = DEFAULT_GRAPH) -> List[Tuple[int, str, str]]:
+    """Records of a graph with no vector from ``model`` yet, oldest first."""
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            """
+            SELECT c.id, c.prompt, c.response FROM chatrecord c
+            WHERE c.graph_id = ?
+              AND NOT EXISTS (SELECT 1 FROM chatrecord_embedding e WHERE e.id = c.id AND e.model = ?)
+            ORDER BY c.id LIMIT ?
+            """,
+            (graph_id, model, limit),
+        )
+        return list(await cursor.fetchall())
+
+@timed_query
+async def put_embeddings(model: str, vectors: Sequence[Tuple[int, bytes]]) -> None:
+    async with pool.writer() as db:
+        # Skip ids deleted while their vectors were being computed
+        await db.executemany(
+            """
+            INSERT OR REPLACE INTO chatrecord_embedding (id, model, vector)
+            SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM chatrecord WHERE id = ?)
+            """,
+            [(node_id, model, vector, node_id) for node_id, vector in vectors],
+        )
+        await db.commit()
+
+@timed_query
+async def get_subtree_summaries(hashes: Sequence[str]) -> Dict[str, str]:
+    if not hashes:
+        return {}
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            "SELECT hash, summary FROM subtree_summary WHERE hash IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(hashes)),),
+        )
+        return dict(await cursor.fetchall())
+
+@timed_query
+async def put_subtree_summary(hash_: str, summary: str, created_at: float) -> None:
+    async with pool.writer() as db:
+        await db.execute(
+            "INSERT OR REPLACE INTO subtree_summary (hash, summary, created_at) VALUES (?, ?, ?)",
+            (hash_, summary, created_at),
+        )
+        await db.commit()
+
+JOB_FIELDS = ("id", "kind", "status", "priority", "payload", "result", "error", "progress", "message", "created_at", "updated_at")
+
+def _job_row(row) -> Dict[str, Any]:
+    job = dict(zip(JOB_FIELDS, row))
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+@timed_query
+async def create_job(kind: str, payload: dict, priority: int, now: float) -> Dict[str, Any]:
+    async with pool.writer() as db:
+        cursor = await db.execute(
+            f"""
+            INSERT INTO jobs (kind, status, priority, payload, created_at, updated_at)
+            VALUES (?, 'queued', ?, ?, ?, ?) RETURNING {", ".join(JOB_FIELDS)}
+            """,
+            (kind, priority, json.dumps(payload), now, now),
+        )
+        row = await cursor.fetchone()
+        await db.commit()
+    return _job_row(row)
+
+@timed_query
+async def update_job(job_id: int, now: float, **fields: Any) -> None:
+    """Set any of status/result/error/progress/message on a job."""
+    if "result" in fields:
+        fields["result"] = json.dumps(fields["result"])
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    async with pool.writer() as db:
+        await db.execute(
+            f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ?",
+            (*fields.values(), now, job_id),
+        )
+        await db.commit()
+
+@timed_query
+async def get_job(job_id: int) -> Optional[Dict[str, Any]]:
+    async with pool.reader() as db:
+        cursor = await db.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,))
+        row = await cursor.fetchone()
+    return _job_row(row) if row else None
+
+@timed_query
+async def list_jobs(status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    """Most recent jobs first, optionally only those in ``status``."""
+    query = f"SELECT {', '.join(JOB_FIELDS)} FROM jobs"
+    params: List[Any] = []
+    if status is not None:
+        query += " WHERE status = ?"
+        params.append(status)
+    query += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+    async with pool.reader() as db:
+        cursor = await db.execute(query, params)
+        rows = await cursor.fetchall()
+    return [_job_row(row) for row in rows]
+
+@timed_query
+async def requeue_unfinished_jobs(now: float) -> List[Dict[str, Any]]:
+    """Return jobs interrupted by a shutdown or crash to the queue; list all queued jobs."""
+    async with pool.writer() as db:
+        await db.execute("UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running'", (now,))
+        cursor = await db.execute(
+            f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE status = 'queued' ORDER BY priority DESC, id"
+        )
+        rows = await cursor.fetchall()
+        await db.commit()
+    return [_job_row(row) for row in rows]
@@ -0,0 +1,204 @@
+import os
+import re
+import math
+import zlib
+import asyncio
+import numpy as np
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from server.logger import logger
+from server.dao.sqlite import (
+    DEFAULT_GRAPH,
+    get_deleted_ids_since,
+    get_embeddings,
+    get_sync_revision,
+    get_unembedded_records,
+    put_embeddings,
+)
+
+# Records embedded per batch while catching the index up with the graph
+EMBED_BATCH = 64
+# Graphs whose index is held in memory at once; the least recently searched
+# one is dropped (its vectors stay in SQLite)
+LOADED_GRAPHS = int(os.getenv("VIZTHINK_EMBED_GRAPHS", "8"))
+
+_WORD = re.compile(r"\w+")
+
+class Embedder:
+    """Turns texts into L2-normalised float32 vectors of a fixed size."""
+
+    name: str = ""
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        raise NotImplementedError
+
+class HashingEmbedder(Embedder):
+    """Local, dependency-free embedder: hashed word unigrams and bigrams.
+
+    Captures lexical overlap only, but needs no model download and runs in
+    microseconds per text on the CPU.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hash-{dim}"
+
+    def _vector(self, text: str) -> np.ndarray:
+        words = _WORD.findall(text.lower())
+        counts: Dict[int, float] = {}
+        for feature in words + [a + " " + b for a, b in zip(words, words[1:])]:
+            h = zlib.crc32(feature.encode("utf-8"))
+            index = h % self.dim
+            counts[index] = counts.get(index, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for index, count in counts.items():
+            # Sub-linear term frequency keeps long responses from dominating
+            vector[index] = math.copysign(1 + math.log(abs(count)), count) if count else 0.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return np.stack([self._vector(text) for text in texts]) if texts else np.zeros((0, self.dim), np.float32)
+
+class OllamaEmbedder(Embedder):
+    """Embeddings from a local Ollama model, e.g. ``nomic-embed-text``."""
+
+    def __init__(self, model: str = "nomic-embed-text"):
+        self.model = model
+        self.name = f"ollama:{model}"
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        from server.providers import get_provider
+        response = await get_provider("ollama").client().embed(model=self.model, input=list(texts))
+        vectors = np.asarray(response["embeddings"], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+# Selected with VIZTHINK_EMBEDDER; VIZTHINK_EMBED_MODEL picks the Ollama model
+EMBEDDERS: Dict[str, Callable[[], Embedder]] = {
+    "hash": lambda: HashingEmbedder(int(os.getenv("VIZTHINK_EMBED_DIM", "512"))),
+    "ollama": lambda: OllamaEmbedder(os.getenv("VIZTHINK_EMBED_MODEL", "nomic-embed-text")),
+}
+
+def record_text(prompt: Optional[str], response: Optional[str]) -> str:
+    return f"{prompt or ''}\n{response or ''}"
+
+class EmbeddingIndex:
+    """In-memory matrix of one graph's node embeddings, mirrored in ``chatrecord_embedding``.
+
+    The index catches up with the graph lazily: before a search it embeds
+    records written since the last sync and drops deleted ones, so every
+    write path is covered without hooks. Search is a single matrix-vector
+    product plus ``argpartition``.
+    """
+
+    def __init__(self, embedder: Embedder, graph_id: str = DEFAULT_GRAPH):
+        self.embedder = embedder
+        self.graph_id = graph_id
+        self._ids: List[int] = []
+        self._rows: Dict[int, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._rev: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _append(self, ids: Sequence[int], vectors: np.ndarray) -> None:
+        if not len(ids):
+            return
+        if self._matrix is None:
+            self._matrix = np.zeros((max(len(ids), 64), vectors.shape[1]), dtype=np.float32)
+        needed = len(self._ids) + len(ids)
+        if needed > self._matrix.shape[0]:
+            grown = np.zeros((max(needed, 2 * self._matrix.shape[0]), self._matrix.shape[1]), dtype=np.float32)
+            grown[: len(self._ids)] = self._matrix[: len(self._ids)]
+            self._matrix = grown
+        for node_id, vector in zip(ids, vectors):
+            row = self._rows.get(node_id)
+            if row is None:
+                row = self._rows[node_id] = len(self._ids)
+                self._ids.append(node_id)
+            self._matrix[row] = vector
+
+    def _remove(self, node_ids: Iterable[int]) -> None:
+        for node_id in node_ids:
+            row = self._rows.pop(node_id, None)
+            if row is None:
+                continue
+            # Move the last row into the hole
+            last_id = self._ids.pop()
+            if last_id != node_id:
+                self._ids[row] = last_id
+                self._rows[last_id] = row
+                self._matrix[row] = self._matrix[len(self._ids)]
+
+    def _clear(self) -> None:
+        self._ids, self._rows, self._matrix = [], {}, None
+
+    async def sync(self) -> None:
+        """Bring the index up to date with the graph."""
+        rev, cleared_rev = await get_sync_revision(self.graph_id)
+        if rev == self._rev:
+            return
+        async with self._lock:
+            if rev == self._rev:
+                return
+            if self._rev is None or cleared_rev > self._rev:
+                self._clear()
+                stored = await get_embeddings(self.embedder.name, self.graph_id)
+                if stored:
+                    ids = [node_id for node_id, _ in stored]
+                    self._append(ids, np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in stored]))
+            else:
+                self._remove(await get_deleted_ids_since(self._rev, self.graph_id))
+            embedded = 0
+            while True:
+                records = await get_unembedded_records(self.embedder.name, EMBED_BATCH, self.graph_id)
+                if not records:
+                    break
+                ids = [node_id for node_id, _, _ in records]
+                vectors = await self.embedder.embed([record_text(p, r) for _, p, r in records])
+                await put_embeddings(self.embedder.name, [(i, v.tobytes()) for i, v in zip(ids, vectors)])
+                self._append(ids, vectors)
+                embedded += len(ids)
+            if embedded:
+                logger.info(f"Embedded {embedded} records of graph {self.graph_id} with {self.embedder.name} ({len(self)} indexed)")
+            self._rev = rev
+
+    async def search(self, text: str, k: int = 5, exclude: Iterable[int] = (), min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """The ``k`` most similar nodes to ``text`` as ``(id, cosine similarity)``, best first."""
+        await self.sync()
+        count = len(self._ids)
+        if not count or k <= 0:
+            return []
+        (query,) = await self.embedder.embed([text])
+        scores = self._matrix[:count] @ query
+        for node_id in exclude:
+            row = self._rows.get(node_id)
+            if row is not None:
+                scores[row] = -np.inf
+        k = min(k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._ids[row], float(scores[row])) for row in top if scores[row] > min_score]
+
+def _make_embedder() -> Embedder:
+    name = os.getenv("VIZTHINK_EMBEDDER", "hash")
+    factory = EMBEDDERS.get(name)
+    if factory is None:
+        raise RuntimeError(f"Unsupported embedder: {name}")
+    return factory()
+
+embedder = _make_embedder()
+_indexes: "OrderedDict[str, EmbeddingIndex]" = OrderedDict()
+
+def embedding_index(graph_id: str = DEFAULT_GRAPH) -> EmbeddingIndex:
+    """The index of one graph, loaded on first use."""
+    index = _indexes.get(graph_id)
+    if index is None:
+        index = _indexes[graph_id] = EmbeddingIndex(embedder, graph_id)
+        while len(_indexes) > LOADED_GRAPHS:
+            _indexes.popitem(last=False)
+    _indexes.move_to_end(graph_id)
+    return index
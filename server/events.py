@@ -0,0 +1,157 @@
+import os
+import asyncio
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional, Set
+from server.metrics import counter_lines, registry
+
+# Live graph updates for the ``/ws`` channel. The DAO's write paths (and the
+# streaming chat route, for tokens) publish compact change events per graph;
+# every connected client of that graph gets them and patches its copy.
+#
+# Events (all JSON objects with a ``type``):
+#   nodes_added    {rev, records: [{id, prompt, response, positions, parent_id, isBranch}]}
+#   nodes_deleted  {rev, ids}           a deleted node together with its subtree
+#   graph_cleared  {rev}
+#   positions      {rev, positions: {id: {x, y}}}
+#   tokens         {stream_id, text, prompt?, parent_id?, isBranch?}  the first carries the metadata
+#   stream_end     {stream_id, record_id}   record_id is None if the stream failed
+#   resync         the client fell behind and events were dropped: reload
+
+# The browser tab behind the current request (``X-Client-Id``). Changes it
+# makes are not echoed back to it: it has applied them already.
+client_id: ContextVar[Optional[str]] = ContextVar("vizthink_client_id", default=None)
+
+class Subscriber:
+    """One connection's queue of a graph's events.
+
+    Backpressure: while the client is slow, position updates merge into one
+    pending event (last position per node wins) and consecutive token events
+    of a stream are concatenated. A client that still falls ``max_events``
+    behind has its queue dropped and gets a single ``resync`` instead.
+    """
+
+    def __init__(self, graph_id: str, client_id: Optional[str], max_events: int):
+        self.graph_id = graph_id
+        self.client_id = client_id
+        self.max_events = max_events
+        self._events: Deque[Dict[str, Any]] = deque()
+        self._positions: Dict[int, dict] = {}
+        self._positions_rev = 0
+        self._overflowed = False
+        self._closed = False
+        self._wake = asyncio.Event()
+
+    def put(self, event: Dict[str, Any]) -> str:
+        """Queue an event: ``queued``, ``overflowed`` (this event filled the queue) or ``dropped``."""
+        if self._overflowed:
+            return "dropped"  # the pending resync reloads everything
+        if event["type"] == "positions":
+            self._positions.update(event["positions"])
+            self._positions_rev = max(self._positions_rev, event["rev"])
+        elif (
+            event["type"] == "tokens" and self._events and self._events[-1]["type"] == "tokens"
+            and self._events[-1]["stream_id"] == event["stream_id"]
+        ):
+            # Events are shared between subscribers: merge into a copy
+            self._events[-1] = {**self._events[-1], "text": self._events[-1]["text"] + event["text"]}
+        elif len(self._events) >= self.max_events:
+            self._overflowed = True
+            self._events.clear()
+            self._positions.clear()
+            self._wake.set()
+            return "overflowed"
+        else:
+            self._events.append(event)
+        self._wake.set()
+        return "queued"
+
+    async def get(self) -> Optional[List[Dict[str, Any]]]:
+        """Wait for and take everything queued; None once closed."""
+        await self._wake.wait()
+        self._wake.clear()
+        if self._closed:
+            return None
+        if self._overflowed:
+            self._overflowed = False
+            return [{"type": "resync"}]
+        events = list(self._events)
+        self._events.clear()
+        if self._positions:
+            events.append({"type": "positions", "rev": self._positions_rev, "positions": self._positions})
+            self._positions = {}
+        return events
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake.set()
+
+class EventHub:
+    """In-process pub/sub of change events, one topic per graph."""
+
+    def __init__(self, max_events: int = 256):
+        self.max_events = max_events
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        self.counters = {"published": 0, "delivered": 0, "resyncs": 0}
+
+    def subscribe(self, graph_id: str, client: Optional[str] = None) -> Subscriber:
+        subscriber = Subscriber(graph_id, client, self.max_events)
+        self._subscribers.setdefault(graph_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        subscriber.close()
+        subscribers = self._subscribers.get(subscriber.graph_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.graph_id]
+
+    def active(self, graph_id: Optional[str] = None) -> bool:
+        """Whether anyone listens (to ``graph_id``, or to any graph)."""
+        return bool(self._subscribers.get(graph_id) if graph_id is not None else self._subscribers)
+
+    def publish(self, graph_id: str, event: Dict[str, Any], echo: bool = False) -> None:
+        """Send ``event`` to the graph's subscribers, except the client that caused it unless ``echo``."""
+        subscribers = self._subscribers.get(graph_id)
+        if not subscribers:
+            return
+        self.counters["published"] += 1
+        origin = None if echo else client_id.get()
+        for subscriber in subscribers:
+            if origin is not None and subscriber.client_id == origin:
+                continue
+            outcome = subscriber.put(event)
+            if outcome == "queued":
+                self.counters["delivered"] += 1
+            elif outcome == "overflowed":
+                self.counters["resyncs"] += 1
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+class ClientIdMiddleware:
+    """ASGI middleware exposing the ``X-Client-Id`` request header as ``client_id``."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        value = dict(scope.get("headers") or ()).get(b"x-client-id")
+        token = client_id.set(value.decode("latin-1")[:64] if value else None)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            client_id.reset(token)
+
+event_hub = EventHub(max_events=int(os.getenv("VIZTHINK_WS_QUEUE", "256")))
+registry.collector(lambda: counter_lines(
+    "vizthink_live_events_total", "Live update events published, delivered to subscribers, and resyncs forced by slow clients.",
+    "outcome", event_hub.counters,
+) + [
+    "# HELP vizthink_live_subscribers Connected /ws clients.",
+    "# TYPE vizthink_live_subscribers gauge",
+    f"vizthink_live_subscribers {event_hub.subscriber_count()}",
+])
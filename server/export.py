@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import zlib
+from html import escape
+from typing import Any, AsyncIterator, Dict, List, Optional
+from server.dao.sqlite import iter_chatrecords, store_imported_chatrecords
+
+# Streaming export and import of whole graphs (or subtrees). Exports are
+# read batch by batch from one database snapshot and imports are written in
+# batched transactions, so neither holds a graph in memory.
+
+EXPORT_VERSION = 1
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "json": ("application/json", "json"),
+    "html": ("text/html; charset=utf-8", "html"),
+}
+
+IMPORT_BATCH_SIZE = int(os.getenv("VIZTHINK_IMPORT_BATCH_SIZE", "1000"))
+
+# Longest accepted NDJSON line (one record), in bytes
+MAX_IMPORT_LINE = 16 * 1024 * 1024
+
+def _header(graph_id: str, root_id: Optional[int]) -> Dict[str, Any]:
+    return {"vizthink_export": EXPORT_VERSION, "graph_id": graph_id, "root_id": root_id, "exported_at": time.time()}
+
+async def export_chunks(format: str, graph_id: str, root_id: Optional[int] = None) -> AsyncIterator[str]:
+    """The export of a graph in ``format``, one chunk per batch of records.
+
+    NDJSON is a header line followed by one record per line, and is what
+    ``import_chatrecords`` reads back. JSON is the header object with the
+    records in a ``records`` array; HTML is a standalone page for reading.
+    """
+    header = _header(graph_id, root_id)
+    records = iter_chatrecords(graph_id, root_id)
+    if format == "ndjson":
+        yield json.dumps(header) + "\n"
+        async for batch in records:
+            yield "".join(json.dumps(record) + "\n" for record in batch)
+    elif format == "json":
+        yield json.dumps(header)[:-1] + ', "records": ['
+        separator = ""
+        async for batch in records:
+            yield separator + ", ".join(json.dumps(record) for record in batch)
+            separator = ", "
+        yield "]}\n"
+    elif format == "html":
+        yield _HTML_HEAD.format(title=escape(f"VizThinker export of {graph_id}"), exported=time.strftime("%Y-%m-%d %H:%M"))
+        count = 0
+        async for batch in records:
+            count += len(batch)
+            yield "".join(_html_record(record) for record in batch)
+        yield _HTML_TAIL.format(count=count)
+    else:
+        raise ValueError(f"Unknown export format: {format}")
+
+async def gzip_chunks(chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """Compress a text stream into a gzip file as it is produced."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+_HTML_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>{title}</title>
+<style>
+body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', 'Roboto', sans-serif; line-height: 1.6; color: #333; max-width: 960px; margin: 0 auto; padding: 20px; background: #f7fafc; }}
+h1 {{ color: #2d3748; }}
+.meta {{ color: #718096; }}
+article {{ background: white; border: 1px solid #e2e8f0; border-radius: 12px; padding: 16px 20px; margin: 16px 0; }}
+article header {{ font-size: 0.9em; color: #718096; margin-bottom: 8px; }}
+.branch {{ background: #ebf8ff; color: #2b6cb0; border-radius: 6px; padding: 0 6px; margin-left: 6px; }}
+.prompt {{ font-weight: 600; color: #2d3748; white-space: pre-wrap; }}
+.response {{ white-space: pre-wrap; margin-top: 8px; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+<p class="meta">Exported {exported}</p>
+"""
+
+_HTML_TAIL = """<p class="meta">{count} turns</p>
+</body>
+</html>
+"""
+
+def _html_record(record: Dict[str, Any]) -> str:
+    parent = record["parent_id"]
+    reply = f' &middot; reply to <a href="#n{parent}">#{parent}</a>' if parent is not None else ""
+    branch = '<span class="branch">branch</span>' if record["isBranch"] else ""
+    return (
+        f'<article id="n{record["id"]}"><header>#{record["id"]}{reply}{branch}</header>'
+        f'<div class="prompt">{escape(record["prompt"] or "")}</div>'
+        f'<div class="response">{escape(record["response"] or "")}</div></article>\n'
+    )
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a byte stream into lines, gunzipping it first if it is gzip."""
+    decompressor = None
+    head = b""
+    buffer = b""
+    async for chunk in chunks:
+        if decompressor is None:
+            # Sniff the gzip magic number before deciding
+            head += chunk
+            if len(head) < 2:
+                continue
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if head[:2] == b"\x1f\x8b" else False
+            chunk, head = head, b""
+        buffer += decompressor.decompress(chunk) if decompressor else chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+        if len(buffer) > MAX_IMPORT_LINE:
+            raise ValueError(f"Line longer than {MAX_IMPORT_LINE} bytes")
+    if decompressor:
+        buffer += decompressor.flush()
+        if not decompressor.eof:
+            raise ValueError("Truncated gzip stream")
+    for line in (head + buffer).split(b"\n"):
+        yield line
+
+def _import_record(item: Any, line: int) -> Dict[str, Any]:
+    """Validate one exported record."""
+    def fail(problem: str) -> ValueError:
+        return ValueError(f"Line {line}: {problem}")
+
+    if not isinstance(item, dict):
+        raise fail("expected a JSON object")
+    for name in ("id", "parent_id"):
+        value = item.get(name)
+        if (value is None and name == "parent_id") or (isinstance(value, int) and not isinstance(value, bool)):
+            continue
+        raise fail(f"{name} must be an integer")
+    for name in ("prompt", "response"):
+        if not isinstance(item.get(name), (str, type(None))):
+            raise fail(f"{name} must be a string")
+    positions = item.get("positions")
+    if positions is not None and not (
+        isinstance(positions, dict)
+        and all(isinstance(positions.get(axis), (int, float)) for axis in ("x", "y"))
+    ):
+        raise fail("positions must be {x, y} numbers")
+    for name in ("created_at", "updated_at"):
+        if not isinstance(item.get(name), (int, float, type(None))):
+            raise fail(f"{name} must be a number")
+    return item
+
+async def import_chatrecords(
+    chunks: AsyncIterator[bytes], graph_id: str, parent_id: Optional[int] = None, batch_size: int = IMPORT_BATCH_SIZE
+) -> Dict[str, Any]:
+    """Read an NDJSON export (plain or gzip) into ``graph_id``, ``batch_size`` records per transaction.
+
+    Records get new ids and keep their tree shape; roots of the export are
+    attached under ``parent_id`` if given. Batches are committed as they
+    fill, so a malformed line stops the import with the earlier batches kept
+    (the error says how many).
+    """
+    id_map: Dict[int, int] = {}  # exported id -> new id, to link later children
+    batch: List[Dict[str, Any]] = []
+    batch_ids = set()
+    imported = 0
+    number = 0
+    try:
+        async for line in _lines(chunks):
+            number += 1
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                raise ValueError(f"Line {number}: not valid JSON")
+            if isinstance(item, dict) and "vizthink_export" in item:
+                if item["vizthink_export"] != EXPORT_VERSION:
+                    raise ValueError(f"Unsupported export version {item['vizthink_export']}")
+                continue
+            record = _import_record(item, number)
+            if record["id"] in id_map or record["id"] in batch_ids:
+                raise ValueError(f"Line {number}: duplicate id {record['id']}")
+            batch.append(record)
+            batch_ids.add(record["id"])
+            if len(batch) >= batch_size:
+                imported += await store_imported_chatrecords(batch, graph_id, id_map, parent_id)
+                batch, batch_ids = [], set()
+        if batch:
+            imported += await store_imported_chatrecords(batch, graph_id, id_map, parent_id)
+    except ValueError as e:
+        raise ValueError(f"{e} ({imported} records imported before the error)") from e
+    return {"graph_id": graph_id, "imported": imported}
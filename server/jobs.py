@@ -0,0 +1,221 @@
+import os
+import time
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+from server.logger import logger
+from server.dao.sqlite import create_job, get_job, requeue_unfinished_jobs, update_job
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+# Progress-only updates reach subscribers immediately but are written to
+# SQLite at most this often per job.
+PROGRESS_PERSIST_INTERVAL = 1.0
+
+class JobContext:
+    """What a job handler sees: its id, payload and a progress reporter."""
+
+    def __init__(self, queue: "JobQueue", job: Dict[str, Any]):
+        self._queue = queue
+        self.id: int = job["id"]
+        self.kind: str = job["kind"]
+        self.payload: Dict[str, Any] = job["payload"]
+
+    async def progress(self, fraction: float, message: Optional[str] = None) -> None:
+        await self._queue._update(self.id, progress=max(0.0, min(1.0, fraction)), message=message)
+
+Handler = Callable[[JobContext], Awaitable[Any]]
+
+class JobQueue:
+    """In-process priority job queue persisted in the ``jobs`` table.
+
+    ``workers`` tasks run jobs highest priority first (FIFO within a
+    priority), so long LLM work outlives the HTTP request that started it.
+    Jobs left queued or running by a shutdown or crash are picked up again
+    by ``start``. Handlers are plain coroutines registered per job kind;
+    their return value (JSON-serializable) becomes the job result.
+    """
+
+    def __init__(self, workers: int = 2):
+        self.workers = workers
+        self._handlers: Dict[str, Handler] = {}
+        self._queue: "asyncio.PriorityQueue[tuple]" = asyncio.PriorityQueue()
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[int, asyncio.Task] = {}
+        self._cancelled: Set[int] = set()
+        self._live: Dict[int, Dict[str, Any]] = {}  # snapshots of unfinished jobs
+        self._persisted_at: Dict[int, float] = {}
+        self._watchers: Dict[int, Set[asyncio.Queue]] = {}
+        self._stopping = False
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    async def start(self) -> None:
+        self._stopping = False
+        self._queue = asyncio.PriorityQueue()
+        self._live.clear()
+        resumed = await requeue_unfinished_jobs(time.time())
+        for job in resumed:
+            self._live[job["id"]] = job
+            self._queue.put_nowait((-job["priority"], job["id"]))
+        if resumed:
+            logger.info(f"Resuming {len(resumed)} unfinished jobs")
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stop the workers; interrupted jobs go back to ``queued`` for the next start."""
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, kind: str, payload: Dict[str, Any], priority: int = 0) -> Dict[str, Any]:
+        if kind not in self._handlers:
+            raise RuntimeError(f"Unknown job kind: {kind}")
+        job = await create_job(kind, payload, priority, time.time())
+        self._live[job["id"]] = job
+        self._queue.put_nowait((-priority, job["id"]))
+        logger.info(f"Queued {kind} job {job['id']} (priority {priority})")
+        return dict(job)
+
+    async def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        job = self._live.get(job_id)
+        return dict(job) if job is not None else await get_job(job_id)
+
+    async def cancel(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job; finished jobs are returned unchanged."""
+        job = await self.get(job_id)
+        if job is None or job["status"] in TERMINAL_STATUSES:
+            return job
+        self._cancelled.add(job_id)
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()  # the worker records the cancellation
+        else:
+            await self._update(job_id, status="cancelled")
+        return await self.get(job_id)
+
+    async def watch(self, job_id: int) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the job's current state, then every change until it finishes."""
+        updates: asyncio.Queue = asyncio.Queue()
+        self._watchers.setdefault(job_id, set()).add(updates)
+        try:
+            job = await self.get(job_id)
+            if job is None:
+                return
+            yield job
+            while job["status"] not in TERMINAL_STATUSES:
+                job = await updates.get()
+                yield job
+        finally:
+            watchers = self._watchers.get(job_id)
+            if watchers is not None:
+                watchers.discard(updates)
+                if not watchers:
+                    del self._watchers[job_id]
+
+    async def wait(self, job_id: int, timeout: float) -> Optional[Dict[str, Any]]:
+        """Long-poll: the job once finished, or its latest state after ``timeout`` seconds."""
+        latest = None
+
+        async def follow():
+            nonlocal latest
+            async for job in self.watch(job_id):
+                latest = job
+
+        try:
+            await asyncio.wait_for(follow(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return latest
+
+    async def _update(self, job_id: int, **fields: Any) -> None:
+        now = time.time()
+        job = self._live.get(job_id)
+        if job is None:
+            job = await get_job(job_id)
+            if job is None:
+                return
+        job.update(fields, updated_at=now)
+        finished = job["status"] in TERMINAL_STATUSES
+        progress_only = set(fields) <= {"progress", "message"}
+        if not progress_only or now - self._persisted_at.get(job_id, 0) >= PROGRESS_PERSIST_INTERVAL:
+            await update_job(job_id, now, **fields)
+            self._persisted_at[job_id] = now
+        if finished:
+            self._live.pop(job_id, None)
+            self._persisted_at.pop(job_id, None)
+            self._cancelled.discard(job_id)
+        else:
+            self._live[job_id] = job
+        for watcher in self._watchers.get(job_id, ()):
+            watcher.put_nowait(dict(job))
+
+    async def _work(self) -> None:
+        while True:
+            _, job_id = await self._queue.get()
+            job = await self.get(job_id)
+            if job is None or job["status"] != "queued":
+                continue  # cancelled while waiting
+            await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        job_id = job["id"]
+        handler = self._handlers.get(job["kind"])
+        if handler is None:
+            await self._update(job_id, status="failed", error=f"Unknown job kind: {job['kind']}")
+            return
+        await self._update(job_id, status="running", progress=0.0, error=None)
+        task = asyncio.create_task(handler(JobContext(self, job)))
+        self._running[job_id] = task
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if job_id in self._cancelled:
+                logger.info(f"Cancelled job {job_id}")
+                await self._update(job_id, status="cancelled")
+                return
+            if self._stopping:
+                task.cancel()
+                await self._update(job_id, status="queued", message="Interrupted by shutdown")
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} ({job['kind']}) failed: {e}", exc_info=True)
+            await self._update(job_id, status="failed", error=str(e))
+        else:
+            await self._update(job_id, status="succeeded", result=result, progress=1.0)
+        finally:
+            self._running.pop(job_id, None)
+
+async def chat_job(job: JobContext) -> Dict[str, Any]:
+    """Generate and store one chat answer, like ``POST /chat`` but detached from the request."""
+    from server.llm import stream_llm
+    from server.providers import GENERATION_PARAMS
+    from server.dao.sqlite import DEFAULT_GRAPH, store_one_chatrecord
+
+    payload = job.payload
+    prompt = payload.get("prompt")
+    if not prompt:
+        raise RuntimeError("Prompt is required")
+    parent_id = payload.get("parent_id")
+    graph_id = payload.get("graph_id") or DEFAULT_GRAPH
+    chunks: List[str] = []
+    async for chunk in stream_llm(prompt, payload.get("provider", "google"), parent_id, payload.get("model"), use_cache=not payload.get("no_cache", False), retrieve=payload.get("retrieve"), graph_id=graph_id):
+        chunks.append(chunk)
+        generated = sum(len(c) for c in chunks) // 4
+        await job.progress(min(generated / GENERATION_PARAMS["max_tokens"], 0.95), f"{generated} tokens generated")
+    response = "".join(chunks)
+    record_id = await store_one_chatrecord(prompt, response, parent_id, payload.get("isBranch", False), graph_id)
+    return {"response": response, "record_id": record_id}
+
+async def consolidate_job(job: JobContext) -> Dict[str, Any]:
+    """Holistic report over one graph (see ``server.consolidate``)."""
+    from server.consolidate import consolidate_graph
+    from server.dao.sqlite import DEFAULT_GRAPH
+    payload = job.payload
+    return await consolidate_graph(payload.get("provider", "google"), payload.get("model"), job.progress, payload.get("graph_id") or DEFAULT_GRAPH)
+
+job_queue = JobQueue(workers=int(os.getenv("VIZTHINK_JOB_WORKERS", "2")))
+job_queue.register("chat", chat_job)
+job_queue.register("consolidate", consolidate_job)
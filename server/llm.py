@@ -1,198 +1,146 @@
 import os
-import google.generativeai as genai
-import ollama
-from dotenv import load_dotenv
+import asyncio
 from server.logger import logger
-from server.dao.sqlite import get_all_chatrecord
-from typing import Optional
-from server.dao.sqlite import get_path_history
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from server.context import build_context
+from server.dao.sqlite import DEFAULT_GRAPH
+from server.metrics import STAGE_SECONDS, span
+from server.cache import response_cache
+from server.providers import GENERATION_PARAMS, get_provider
+from server.providers.errors import ProviderUnavailable, RateLimitError
 
-load_dotenv()
-api_key_map={
-    "google": os.getenv("GEMINI_API_KEY"),
-    "openai": os.getenv("OPENAI_API_KEY"),
-    "x": os.getenv("GROK_API_KEY"),
-    "anthropic": os.getenv("CLAUDE_API_KEY"),
-    "ollama": None,  # Ollama doesn't need API key for local models
-}
+def fallback_for(provider: str) -> Optional[Tuple[str, Optional[str]]]:
+    """The ``(provider, model)`` to try when ``provider`` is rate limited or down.
 
-async def call_llm(user_prompt: str, provider: str, parent_id: Optional[int] = None, model: Optional[str] = None):
+    Configured with ``VIZTHINK_FALLBACK_<PROVIDER>`` or, for every provider,
+    ``VIZTHINK_FALLBACK`` as ``provider`` or ``provider:model``, e.g.
+    ``ollama:gemma3n:latest``.
+    """
+    spec = os.getenv(f"VIZTHINK_FALLBACK_{provider.upper()}") or os.getenv("VIZTHINK_FALLBACK")
+    if not spec:
+        return None
+    fallback, _, model = spec.partition(":")
+    if fallback == provider:
+        return None
+    return fallback, model or None
 
+async def call_llm(user_prompt: str, provider: str, parent_id: Optional[int] = None, model: Optional[str] = None, use_cache: bool = True, fallback: bool = True, retrieve: Optional[int] = None, graph_id: str = DEFAULT_GRAPH):
+
+    adapter = get_provider(provider)
     # Get Api Key (except for ollama which runs locally)
-    if provider != "ollama":
-        api_key = api_key_map[provider]
-        if not api_key:
-            raise RuntimeError(provider+" API key not set.")
-    
-    if parent_id is not None:
-        chat_history = await get_path_history(parent_id)
-    else:
-        chat_history = []
-    system_prompt = "You are a LLM chat box. Give response within 300 tokens.\n\nChat history: " + str(chat_history)
-    
-    # For each Provider
-    if provider == "google":
-        try:
-            genai.configure(api_key=api_key_map["google"])
-            # Use provided model or default
-            model_name = model or 'gemini-1.5-flash-latest'
-            gemini_model = genai.GenerativeModel(
-                model_name=model_name,
-                system_instruction=system_prompt
-            )
-            logger.info(f"Calling LLM with user_prompt: {user_prompt}, provider: {provider}, model: {model_name}")
+    adapter.check_api_key()
+    with span("context.build", STAGE_SECONDS, stage="context", provider=provider):
+        context = await build_context(parent_id, provider, user_prompt, retrieve, graph_id)
+    model = model or adapter.default_model
 
-            response = await gemini_model.generate_content_async(
-                user_prompt,
-                request_options={'timeout': 30}  # Set a 30-second timeout
-            )
+    key = response_cache.make_key(provider, model, context, user_prompt, GENERATION_PARAMS) if use_cache else None
+    if key is not None:
+        with span("cache.lookup", STAGE_SECONDS, stage="cache", provider=provider):
+            cached = await response_cache.get(key)
+        if cached is not None:
+            logger.info(f"Response cache hit for provider: {provider}, model: {model}")
+            return cached
 
-            logger.info(f"Received response from LLM: {len(response.text)} tokens")
+    try:
+        response_text = await adapter.complete(context, user_prompt, model)
+    except (RateLimitError, ProviderUnavailable) as e:
+        target = fallback_for(provider) if fallback else None
+        if target is None:
+            raise
+        logger.warning(f"{provider} unavailable ({e}); falling back to {target[0]}")
+        return await call_llm(user_prompt, target[0], parent_id, target[1], use_cache=use_cache, fallback=False, retrieve=retrieve, graph_id=graph_id)
+    if key is not None:
+        await response_cache.put(key, response_text)
+    return response_text
 
-            return response.text
-            
-        except ValueError as ve:
-            logger.error(f"Value error in LLM call: {str(ve)}")
-            raise RuntimeError(f"Invalid input: {str(ve)}")
-            
-        except Exception as e:
-            if "quota" in str(e).lower():
-                logger.error(f"API usage limit hit for Google: {e}", exc_info=True)
-                raise RuntimeError(f"API usage limit hit for {provider}. Please check your plan and billing details.")
-            logger.error(f"An unexpected error occurred when calling Google Gemini API: {e}", exc_info=True)
-            raise RuntimeError(f"Failed to generate content: {e}")
+# Per-target timeout for fan-out requests when the caller gives none
+FAN_OUT_TIMEOUT = 60.0
 
-    elif provider == "ollama":
-        try:
-            # Use provided model or default
-            model_name = model or 'gemma3n:latest'
-            logger.info(f"Calling Ollama with user_prompt: {user_prompt}, provider: {provider}, model: {model_name}")
-            
-            # Use ollama.chat for better control over the conversation
-            response = ollama.chat(
-                model=model_name,
-                messages=[
-                    {
-                        'role': 'system',
-                        'content': system_prompt
-                    },
-                    {
-                        'role': 'user', 
-                        'content': user_prompt
-                    }
-                ]
-            )
-            
-            response_text = response['message']['content']
-            logger.info(f"Received response from Ollama: {len(response_text)} tokens")
+async def fan_out_llm(
+    user_prompt: str,
+    targets: List[Dict[str, Any]],
+    parent_id: Optional[int] = None,
+    first_wins: bool = False,
+    use_cache: bool = True,
+    graph_id: str = DEFAULT_GRAPH,
+) -> List[Dict[str, Any]]:
+    """Ask several provider/model pairs the same prompt concurrently.
 
-            return response_text
-            
-        except Exception as e:
-            logger.error(f"An unexpected error occurred when calling Ollama: {e}", exc_info=True)
-            raise RuntimeError(f"Failed to generate content from Ollama: {e}")
-    
-    elif provider == "openai":
-        try:
-            import openai
-            openai.api_key = api_key_map["openai"]
-            
-            # Use provided model or default
-            model_name = model or 'gpt-4o'
-            logger.info(f"Calling OpenAI with user_prompt: {user_prompt}, provider: {provider}, model: {model_name}")
-            
-            # Create OpenAI client
-            client = openai.OpenAI(api_key=api_key_map["openai"])
-            
-            # Prepare messages for OpenAI
-            messages = [{"role": "system", "content": system_prompt}]
-            messages.append({"role": "user", "content": user_prompt})
-            
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=messages,
-                max_tokens=300,
-                temperature=0.7
-            )
-            
-            response_text = response.choices[0].message.content
-            logger.info(f"Received response from OpenAI: {len(response_text)} tokens")
-            
-            return response_text
-            
-        except openai.RateLimitError as e:
-            logger.error(f"OpenAI API rate limit exceeded: {e}", exc_info=True)
-            raise RuntimeError(f"API usage limit hit for {provider}. Please check your plan and billing details.")
-        except Exception as e:
-            logger.error(f"An unexpected error occurred when calling OpenAI API: {e}", exc_info=True)
-            raise RuntimeError(f"Failed to generate content from OpenAI: {e}")
-    
-    elif provider == "anthropic":
+    Each target is ``{"provider", "model"?, "timeout"?}``. Returns one result
+    per target, in target order, holding either ``response`` or ``error``.
+    With ``first_wins`` the first successful answer is returned alone and
+    the remaining calls are cancelled.
+    """
+    async def run(target: Dict[str, Any]) -> Dict[str, Any]:
+        provider = target.get("provider", "google")
+        result = {"provider": provider, "model": target.get("model")}
         try:
-            import anthropic
-            
-            # Use provided model or default
-            model_name = model or 'claude-3-5-sonnet-20240620'
-            logger.info(f"Calling Anthropic with user_prompt: {user_prompt}, provider: {provider}, model: {model_name}")
-            
-            # Create Anthropic client
-            client = anthropic.Anthropic(api_key=api_key_map["anthropic"])
-            
-            response = client.messages.create(
-                model=model_name,
-                max_tokens=300,
-                system=system_prompt,
-                messages=[{"role": "user", "content": user_prompt}]
+            result["model"] = result["model"] or get_provider(provider).default_model
+            result["response"] = await asyncio.wait_for(
+                call_llm(user_prompt, provider, parent_id, result["model"], use_cache=use_cache, graph_id=graph_id),
+                timeout=float(target.get("timeout") or FAN_OUT_TIMEOUT),
             )
-            
-            response_text = response.content[0].text
-            logger.info(f"Received response from Anthropic: {len(response_text)} tokens")
-            
-            return response_text
-            
-        except anthropic.RateLimitError as e:
-            logger.error(f"Anthropic API rate limit exceeded: {e}", exc_info=True)
-            raise RuntimeError(f"API usage limit hit for {provider}. Please check your plan and billing details.")
+        except asyncio.TimeoutError:
+            result["error"] = f"Timed out after {target.get('timeout') or FAN_OUT_TIMEOUT}s"
         except Exception as e:
-            logger.error(f"An unexpected error occurred when calling Anthropic API: {e}", exc_info=True)
-            raise RuntimeError(f"Failed to generate content from Anthropic: {e}")
-    
-    elif provider == "x":
-        try:
-            import openai
-            
-            # Use provided model or default  
-            model_name = model or 'grok-1'
-            logger.info(f"Calling X (Grok) with user_prompt: {user_prompt}, provider: {provider}, model: {model_name}")
-            
-            # Create OpenAI-compatible client for X/Grok
-            client = openai.OpenAI(
-                api_key=api_key_map["x"],
-                base_url="https://api.x.ai/v1"
-            )
-            
-            # Prepare messages
-            messages = [{"role": "system", "content": system_prompt}]
-            messages.append({"role": "user", "content": user_prompt})
-            
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=messages,
-                max_tokens=300,
-                temperature=0.7
-            )
-            
-            response_text = response.choices[0].message.content
-            logger.info(f"Received response from X (Grok): {len(response_text)} tokens")
-            
-            return response_text
-            
-        except openai.RateLimitError as e:
-            logger.error(f"X/Grok API rate limit exceeded: {e}", exc_info=True)
-            raise RuntimeError(f"API usage limit hit for {provider}. Please check your plan and billing details.")
-        except Exception as e:
-            logger.error(f"An unexpected error occurred when calling X (Grok) API: {e}", exc_info=True)
-            raise RuntimeError(f"Failed to generate content from X (Grok): {e}")
-    
-    else:
-        raise RuntimeError(f"Unsupported provider: {provider}")
\ No newline at end of file
+            result["error"] = str(e)
+        return result
+
+    if not first_wins:
+        return list(await asyncio.gather(*(run(target) for target in targets)))
+
+    pending = {asyncio.create_task(run(target)) for target in targets}
+    failures = []
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if "response" in result:
+                    logger.info(f"Fan-out won by provider: {result['provider']}, model: {result['model']}")
+                    return [result]
+                failures.append(result)
+        return failures
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def stream_llm(user_prompt: str, provider: str, parent_id: Optional[int] = None, model: Optional[str] = None, use_cache: bool = True, fallback: bool = True, retrieve: Optional[int] = None, graph_id: str = DEFAULT_GRAPH) -> AsyncIterator[str]:
+    """Yield response text chunks from the provider as they are generated.
+
+    Same arguments and error semantics as ``call_llm`` (the fallback provider
+    is only tried if nothing has been streamed yet); the caller is
+    responsible for joining the chunks and persisting the final response.
+    A cache hit is yielded as a single chunk.
+    """
+    adapter = get_provider(provider)
+    adapter.check_api_key()
+    with span("context.build", STAGE_SECONDS, stage="context", provider=provider):
+        context = await build_context(parent_id, provider, user_prompt, retrieve, graph_id)
+    model = model or adapter.default_model
+
+    key = response_cache.make_key(provider, model, context, user_prompt, GENERATION_PARAMS) if use_cache else None
+    if key is not None:
+        with span("cache.lookup", STAGE_SECONDS, stage="cache", provider=provider):
+            cached = await response_cache.get(key)
+        if cached is not None:
+            logger.info(f"Response cache hit for provider: {provider}, model: {model}")
+            yield cached
+            return
+
+    chunks = []
+    try:
+        async for chunk in adapter.stream(context, user_prompt, model):
+            chunks.append(chunk)
+            yield chunk
+    except (RateLimitError, ProviderUnavailable) as e:
+        target = fallback_for(provider) if fallback and not chunks else None
+        if target is None:
+            raise
+        logger.warning(f"{provider} unavailable ({e}); falling back to {target[0]}")
+        async for chunk in stream_llm(user_prompt, target[0], parent_id, target[1], use_cache=use_cache, fallback=False, retrieve=retrieve, graph_id=graph_id):
+            yield chunk
+        return
+    if key is not None:
+        await response_cache.put(key, "".join(chunks))
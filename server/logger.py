@@ -1,3 +1,4 @@
+import os
 import logging
 import sys
 
@@ -25,3 +26,17 @@ def setup_logger():
 
 # Create a logger instance to be imported by other modules
 logger = setup_logger()
+
+def setup_trace_logger():
+    """Logger for request traces: one bare JSON object per line, to stdout or VIZTHINK_TRACE_FILE."""
+    trace_logger = logging.getLogger("VizThinker.trace")
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False
+    if not trace_logger.handlers:
+        path = os.getenv("VIZTHINK_TRACE_FILE")
+        handler = logging.FileHandler(path) if path else logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        trace_logger.addHandler(handler)
+    return trace_logger
+
+trace_logger = setup_trace_logger()
@@ -1,18 +1,36 @@
+import os
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List
 from contextlib import asynccontextmanager
-from server.dao.sqlite import init_db
+from server.dao.sqlite import init_db, pool as db_pool, position_buffer
+from server.providers import close_clients, prewarm
+from server.jobs import job_queue
+from server.metrics import MetricsMiddleware
+from server.events import ClientIdMiddleware
 from server.logger import logger
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting up...")
+    await db_pool.open()   # shared SQLite connections for all DAO calls
     await init_db()        # runs at startup
+    await job_queue.start()  # also resumes jobs interrupted by the last shutdown
+    # Import provider SDKs in the background so startup doesn't wait on them
+    prewarm_task = None
+    if os.getenv("VIZTHINK_PREWARM", "1") != "0":
+        prewarm_task = asyncio.create_task(prewarm())
     yield                  # application runs between here …
     logger.info("Shutting down...") # (optional) cleanup   # … and here on shutdown
+    if prewarm_task is not None:
+        prewarm_task.cancel()
+    await job_queue.stop()
+    await close_clients()  # release pooled provider connections
+    await position_buffer.close()  # persist any debounced position updates
+    await db_pool.close()
 
 app = FastAPI(title="VizThinker AI Backend", lifespan=lifespan)
 
@@ -24,6 +42,12 @@ ALLOWED_ORIGINS = [
     "http://127.0.0.1:5173",
 ]
 
+# Request latency histograms and optional JSON traces (server/metrics.py)
+app.add_middleware(MetricsMiddleware)
+
+# Which browser tab a request comes from, so live updates skip it (server/events.py)
+app.add_middleware(ClientIdMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
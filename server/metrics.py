@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import uuid
+import functools
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from server.logger import trace_logger
+
+# Prometheus text exposition (format 0.0.4) without a client library: the
+# app runs in one event loop, so plain dicts are enough.
+
+# Seconds; from a cached SQLite read to a slow LLM answer
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket
+                le = 'le="%s"' % (bound if bound == "+Inf" else _number(bound))
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Registry:
+    """Metrics plus collectors that report counters kept elsewhere at scrape time."""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, collect: Callable[[], List[str]]) -> None:
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for collect in self._collectors:
+            lines += collect()
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+def counter_lines(name: str, help: str, label: str, values: Dict[str, float]) -> List[str]:
+    """Render a dict of running totals as one labelled counter family."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} counter"]
+    lines += [f"{name}{_labels((label,), (key,))} {_number(value)}" for key, value in sorted(values.items())]
+    return lines
+
+HTTP_SECONDS = registry.register(Histogram(
+    "vizthink_http_request_duration_seconds", "HTTP request latency, including streamed bodies.",
+    ("method", "route", "status"),
+))
+STAGE_SECONDS = registry.register(Histogram(
+    "vizthink_stage_duration_seconds", "Time spent per chat stage (context building, cache lookup).",
+    ("stage", "provider"),
+))
+LLM_SECONDS = registry.register(Histogram(
+    "vizthink_llm_duration_seconds", "Total provider call time, retries included.",
+    ("provider", "model", "mode"),
+))
+LLM_TTFT_SECONDS = registry.register(Histogram(
+    "vizthink_llm_time_to_first_token_seconds", "Time until a streamed response yields its first chunk.",
+    ("provider", "model"),
+))
+LLM_TOKENS = registry.register(Counter(
+    "vizthink_llm_tokens_total", "Estimated tokens sent to (input) and received from (output) providers.",
+    ("provider", "model", "direction"),
+))
+LLM_ERRORS = registry.register(Counter(
+    "vizthink_llm_errors_total", "Failed provider calls by error class.",
+    ("provider", "model", "error"),
+))
+DB_SECONDS = registry.register(Histogram(
+    "vizthink_db_query_duration_seconds", "Time per DAO call, waiting for a pooled connection included.",
+    ("function",),
+))
+
+# Tracing: every request with VIZTHINK_TRACE=1, otherwise only requests
+# sending ``X-Trace: 1``. A finished request logs one JSON line with its spans.
+TRACE_ALL = os.getenv("VIZTHINK_TRACE", "0") == "1"
+
+class Trace:
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:16]
+        self.start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+
+    def add(self, name: str, start: float, duration: float, attrs: Dict[str, Any]) -> None:
+        self.spans.append({
+            "name": name,
+            "start_ms": round((start - self.start) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+            **attrs,
+        })
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("vizthink_trace", default=None)
+
+@contextmanager
+def span(name: str, histogram: Optional[Histogram] = None, **labels: Any) -> Iterator[None]:
+    """Time a block: observe ``histogram`` with ``labels`` and add a span to the current trace."""
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        if histogram is not None:
+            histogram.observe(duration, **labels)
+        trace = _trace.get()
+        if trace is not None:
+            trace.add(name, start, duration, {**labels, "error": error} if error else labels)
+
+def timed_query(fn):
+    """Record a DAO coroutine in ``vizthink_db_query_duration_seconds`` and the trace."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with span(f"db.{fn.__name__}", DB_SECONDS, function=fn.__name__):
+            return await fn(*args, **kwargs)
+    return wrapper
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request, streamed bodies included."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or ())
+        trace = Trace() if TRACE_ALL or headers.get(b"x-trace") == b"1" else None
+        token = _trace.set(trace)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace is not None:
+                    message.setdefault("headers", []).append((b"x-trace-id", trace.id.encode()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            # The route template (not the raw path) keeps label values bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_SECONDS.observe(duration, method=scope["method"], route=route, status=status)
+            _trace.reset(token)
+            if trace is not None:
+                trace_logger.info(json.dumps({
+                    "trace_id": trace.id,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": route,
+                    "status": status,
+                    "duration_ms": round(duration * 1000, 3),
+                    "spans": trace.spans,
+                }, default=str))
@@ -0,0 +1,100 @@
+"""LLM provider adapters, registered by name and imported lazily.
+
+Importing an SDK such as ``google.generativeai`` costs hundreds of
+milliseconds, so adapters are referenced as ``"module:Class"`` strings and
+only imported the first time they are used (or by ``prewarm`` in the
+background after startup).
+"""
+import os
+import asyncio
+import importlib
+from typing import Dict, Iterable, Optional, Type, Union
+from dotenv import load_dotenv
+from server.logger import logger
+from server.providers.base import GENERATION_PARAMS, Provider
+
+load_dotenv()
+api_key_map={
+    "google": os.getenv("GEMINI_API_KEY"),
+    "openai": os.getenv("OPENAI_API_KEY"),
+    "x": os.getenv("GROK_API_KEY"),
+    "anthropic": os.getenv("CLAUDE_API_KEY"),
+    "ollama": None,  # Ollama doesn't need API key for local models
+}
+
+_registry: Dict[str, Union[str, Type[Provider]]] = {
+    "google": "server.providers.gemini:GeminiProvider",
+    "openai": "server.providers.openai:OpenAIProvider",
+    "x": "server.providers.openai:GrokProvider",
+    "anthropic": "server.providers.anthropic:AnthropicProvider",
+    "ollama": "server.providers.ollama:OllamaProvider",
+}
+_instances: Dict[str, Provider] = {}
+
+def register_provider(name: str, adapter: Union[str, Type[Provider]]) -> None:
+    """Register an adapter class, or a lazy ``"module:Class"`` reference."""
+    _registry[name] = adapter
+    _instances.pop(name, None)
+
+def provider_names() -> Iterable[str]:
+    return _registry.keys()
+
+def _resolve(name: str) -> Type[Provider]:
+    adapter = _registry[name]
+    if isinstance(adapter, str):
+        module_name, class_name = adapter.split(":")
+        adapter = getattr(importlib.import_module(module_name), class_name)
+        _registry[name] = adapter
+    return adapter
+
+def get_provider(name: str) -> Provider:
+    """Return the adapter for ``name``, importing its SDK on first use."""
+    provider = _instances.get(name)
+    if provider is None:
+        if name not in _registry:
+            raise RuntimeError(f"Unsupported provider: {name}")
+        provider = _resolve(name)(api_key_map)
+        _instances[name] = provider
+    return provider
+
+async def prewarm(names: Optional[Iterable[str]] = None) -> None:
+    """Import adapters in a worker thread so the first request doesn't pay for it.
+
+    By default warms Ollama plus every provider with a configured key.
+    """
+    if names is None:
+        names = [name for name in _registry if name == "ollama" or api_key_map.get(name)]
+    for name in names:
+        try:
+            await asyncio.to_thread(get_provider, name)
+            logger.info(f"Pre-warmed {name} provider")
+        except Exception as e:
+            logger.warning(f"Could not pre-warm {name} provider: {e}")
+
+async def reset_clients(names: Optional[Iterable[str]] = None) -> None:
+    """Close pooled clients so they are rebuilt with the current keys."""
+    for name in list(names if names is not None else _instances):
+        provider = _instances.get(name)
+        if provider is not None:
+            await provider.close()
+
+async def close_clients() -> None:
+    """Close every pooled client; called on application shutdown."""
+    await reset_clients()
+
+def scheduler_stats() -> Dict[str, dict]:
+    """Circuit state of every provider that has been used."""
+    return {name: provider.scheduler.stats() for name, provider in _instances.items()}
+
+__all__ = [
+    "GENERATION_PARAMS",
+    "Provider",
+    "api_key_map",
+    "close_clients",
+    "get_provider",
+    "prewarm",
+    "provider_names",
+    "register_provider",
+    "reset_clients",
+    "scheduler_stats",
+]
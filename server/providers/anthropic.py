@@ -0,0 +1,39 @@
+import anthropic
+from typing import AsyncIterator, Optional
+from server.context import LLMContext
+from server.providers.base import GENERATION_PARAMS, POOL_LIMITS, Provider, http2_available
+
+class AnthropicProvider(Provider):
+    name = "anthropic"
+    label = "Anthropic"
+    default_model = "claude-3-5-sonnet-20240620"
+
+    def _build_client(self, api_key: Optional[str]):
+        http_client = anthropic.DefaultAsyncHttpxClient(http2=http2_available(), limits=POOL_LIMITS)
+        return anthropic.AsyncAnthropic(api_key=api_key, http_client=http_client)
+
+    def is_rate_limit(self, error: Exception) -> bool:
+        return isinstance(error, anthropic.RateLimitError)
+
+    def is_transient(self, error: Exception) -> bool:
+        # InternalServerError includes 529 "overloaded"
+        return isinstance(error, (anthropic.APIConnectionError, anthropic.InternalServerError)) or super().is_transient(error)
+
+    async def _complete(self, context: LLMContext, user_prompt: str, model: str) -> str:
+        response = await self.client().messages.create(
+            model=model,
+            max_tokens=GENERATION_PARAMS["max_tokens"],
+            system=context.system,
+            messages=[*context.history, {"role": "user", "content": user_prompt}]
+        )
+        return response.content[0].text
+
+    async def _stream(self, context: LLMContext, user_prompt: str, model: str) -> AsyncIterator[str]:
+        async with self.client().messages.stream(
+            model=model,
+            max_tokens=GENERATION_PARAMS["max_tokens"],
+            system=context.system,
+            messages=[*context.history, {"role": "user", "content": user_prompt}]
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
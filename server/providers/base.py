@@ -0,0 +1,176 @@
+import time
+import asyncio
+import importlib.util
+import httpx
+from typing import Any, AsyncIterator, Optional
+from server.logger import logger
+from server.context import LLMContext, estimate_tokens
+from server.providers.errors import ProviderError, RateLimitError, TransientProviderError
+from server.providers.scheduler import ProviderScheduler
+from server.metrics import LLM_ERRORS, LLM_SECONDS, LLM_TOKENS, LLM_TTFT_SECONDS, span
+
+# Generation parameters sent to every provider (also part of the cache key)
+GENERATION_PARAMS = {"max_tokens": 300, "temperature": 0.7}
+
+# Keep-alive pool shared by every provider's async HTTP client
+POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60)
+
+def http2_available() -> bool:
+    """HTTP/2 multiplexing needs ``h2`` (the ``httpx[http2]`` extra); without it clients use HTTP/1.1."""
+    return importlib.util.find_spec("h2") is not None
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read ``Retry-After`` (or ``retry-after-ms``) from an SDK error's HTTP response."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass  # HTTP-date form; fall back to our own backoff
+    return None
+
+class Provider:
+    """Adapter for one LLM backend.
+
+    Subclasses implement ``_complete``/``_stream`` against their SDK and
+    ``_build_client`` to create the async client. The client (and so its
+    keep-alive connection pool) is created once and rebuilt only when the
+    provider's API key changes. Every call goes through the provider's
+    ``ProviderScheduler`` (rate limits, concurrency cap, retries, circuit
+    breaker) and SDK errors are translated into ``ProviderError`` types.
+    """
+
+    name: str = ""
+    label: str = ""
+    default_model: str = ""
+    requires_key: bool = True
+
+    def __init__(self, api_keys: dict):
+        self._api_keys = api_keys
+        self._client: Any = None
+        self._client_key: Optional[str] = None
+        self.scheduler = ProviderScheduler(self.name)
+
+    @property
+    def api_key(self) -> Optional[str]:
+        return self._api_keys.get(self.name)
+
+    def check_api_key(self) -> None:
+        if self.requires_key and not self.api_key:
+            raise RuntimeError(self.name+" API key not set.")
+
+    def client(self):
+        """Return the shared async client, rebuilding it if the key changed."""
+        if self._client is None or self._client_key != self.api_key:
+            self._client = self._build_client(self.api_key)
+            self._client_key = self.api_key
+            logger.info(f"Created {self.name} client")
+        return self._client
+
+    async def close(self) -> None:
+        """Close the pooled client; the next call builds a fresh one."""
+        client, self._client = self._client, None
+        if client is not None:
+            try:
+                await self._close_client(client)
+            except Exception as e:
+                logger.warning(f"Error closing {self.name} client: {e}")
+
+    def _input_tokens(self, context: LLMContext, user_prompt: str) -> int:
+        history = sum(estimate_tokens(turn["content"]) for turn in context.history)
+        return estimate_tokens(context.system) + history + estimate_tokens(user_prompt)
+
+    def _cost(self, context: LLMContext, user_prompt: str) -> int:
+        """Estimated tokens for the token-per-minute budget: input plus max output."""
+        return self._input_tokens(context, user_prompt) + GENERATION_PARAMS["max_tokens"]
+
+    async def complete(self, context: LLMContext, user_prompt: str, model: str) -> str:
+        logger.info(f"Calling {self.label} with user_prompt: {user_prompt}, provider: {self.name}, model: {model}")
+        input_tokens = self._input_tokens(context, user_prompt)
+        LLM_TOKENS.inc(input_tokens, provider=self.name, model=model, direction="input")
+        try:
+            with span("llm.complete", LLM_SECONDS, provider=self.name, model=model, mode="complete"):
+                response_text = await self.scheduler.run(
+                    lambda: self._attempt(context, user_prompt, model), cost=input_tokens + GENERATION_PARAMS["max_tokens"]
+                )
+        except Exception as e:
+            LLM_ERRORS.inc(provider=self.name, model=model, error=type(e).__name__)
+            raise
+        LLM_TOKENS.inc(estimate_tokens(response_text), provider=self.name, model=model, direction="output")
+        logger.info(f"Received response from {self.label}: {len(response_text)} tokens")
+        return response_text
+
+    async def stream(self, context: LLMContext, user_prompt: str, model: str) -> AsyncIterator[str]:
+        logger.info(f"Streaming {self.label} with user_prompt: {user_prompt}, provider: {self.name}, model: {model}")
+        input_tokens = self._input_tokens(context, user_prompt)
+        LLM_TOKENS.inc(input_tokens, provider=self.name, model=model, direction="input")
+        start = time.perf_counter()
+        first, chars = True, 0
+        try:
+            with span("llm.stream", LLM_SECONDS, provider=self.name, model=model, mode="stream"):
+                async for chunk in self.scheduler.stream(
+                    lambda: self._attempt_stream(context, user_prompt, model), cost=input_tokens + GENERATION_PARAMS["max_tokens"]
+                ):
+                    if first:
+                        LLM_TTFT_SECONDS.observe(time.perf_counter() - start, provider=self.name, model=model)
+                        first = False
+                    chars += len(chunk)
+                    yield chunk
+        except Exception as e:
+            LLM_ERRORS.inc(provider=self.name, model=model, error=type(e).__name__)
+            raise
+        finally:
+            # Same ~4 characters per token as estimate_tokens, over the whole response
+            LLM_TOKENS.inc((chars + 3) // 4, provider=self.name, model=model, direction="output")
+
+    async def _attempt(self, context: LLMContext, user_prompt: str, model: str) -> str:
+        try:
+            return await self._complete(context, user_prompt, model)
+        except Exception as e:
+            raise self._translate_error(e) from e
+
+    async def _attempt_stream(self, context: LLMContext, user_prompt: str, model: str) -> AsyncIterator[str]:
+        try:
+            async for chunk in self._stream(context, user_prompt, model):
+                yield chunk
+        except Exception as e:
+            raise self._translate_error(e) from e
+
+    def is_rate_limit(self, error: Exception) -> bool:
+        return False
+
+    def is_transient(self, error: Exception) -> bool:
+        return isinstance(error, (httpx.TimeoutException, httpx.NetworkError, asyncio.TimeoutError))
+
+    def _translate_error(self, error: Exception) -> Exception:
+        if isinstance(error, ProviderError):
+            return error
+        if self.is_rate_limit(error):
+            logger.error(f"{self.label} API rate limit exceeded: {error}")
+            return RateLimitError(
+                f"API usage limit hit for {self.name}. Please check your plan and billing details.",
+                retry_after=retry_after_seconds(error),
+            )
+        if self.is_transient(error):
+            logger.error(f"Transient error from {self.label}: {error}")
+            return TransientProviderError(f"Failed to generate content from {self.label}: {error}", retry_after_seconds(error))
+        logger.error(f"An unexpected error occurred when calling {self.label}: {error}", exc_info=True)
+        return ProviderError(f"Failed to generate content from {self.label}: {error}")
+
+    # -- implemented by adapters --
+
+    def _build_client(self, api_key: Optional[str]):
+        raise NotImplementedError
+
+    async def _close_client(self, client) -> None:
+        await client.close()
+
+    async def _complete(self, context: LLMContext, user_prompt: str, model: str) -> str:
+        raise NotImplementedError
+
+    def _stream(self, context: LLMContext, user_prompt: str, model: str) -> AsyncIterator[str]:
+        raise NotImplementedError
@@ -0,0 +1,17 @@
+from typing import Optional
+
+class ProviderError(RuntimeError):
+    """An LLM provider call failed. ``retry_after`` is in seconds, if known."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class RateLimitError(ProviderError):
+    """The provider rejected the call for quota or rate reasons (retryable)."""
+
+class TransientProviderError(ProviderError):
+    """Network failure, timeout or 5xx from the provider (retryable)."""
+
+class ProviderUnavailable(ProviderError):
+    """The provider's circuit breaker is open; the call was not attempted."""
@@ -0,0 +1,68 @@
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from typing import Any, AsyncIterator, Dict, List, Optional
+from server.logger import logger
+from server.context import LLMContext
+from server.providers.base import Provider
+
+def _gemini_contents(context: LLMContext, user_prompt: str) -> List[Dict[str, Any]]:
+    """Gemini takes the history as contents with "user"/"model" roles."""
+    contents = [
+        {"role": "model" if turn["role"] == "assistant" else "user", "parts": [turn["content"]]}
+        for turn in context.history
+    ]
+    contents.append({"role": "user", "parts": [user_prompt]})
+    return contents
+
+class GeminiProvider(Provider):
+    """Google Gemini. The SDK keeps one global configured transport, so the
+    "client" here is just the key it was last configured with."""
+    name = "google"
+    label = "Google Gemini"
+    default_model = "gemini-1.5-flash-latest"
+
+    def _build_client(self, api_key: Optional[str]):
+        genai.configure(api_key=api_key)
+        return api_key
+
+    async def _close_client(self, client) -> None:
+        pass
+
+    def _model(self, context: LLMContext, model: str):
+        self.client()  # (re)configure only when the key changed
+        return genai.GenerativeModel(
+            model_name=model,
+            system_instruction=context.system
+        )
+
+    def is_rate_limit(self, error: Exception) -> bool:
+        return isinstance(error, google_exceptions.ResourceExhausted) or "quota" in str(error).lower()
+
+    def is_transient(self, error: Exception) -> bool:
+        return isinstance(
+            error,
+            (google_exceptions.ServiceUnavailable, google_exceptions.DeadlineExceeded, google_exceptions.InternalServerError),
+        ) or super().is_transient(error)
+
+    def _translate_error(self, error: Exception) -> Exception:
+        if isinstance(error, ValueError):
+            logger.error(f"Value error in LLM call: {str(error)}")
+            return RuntimeError(f"Invalid input: {str(error)}")
+        return super()._translate_error(error)
+
+    async def _complete(self, context: LLMContext, user_prompt: str, model: str) -> str:
+        response = await self._model(context, model).generate_content_async(
+            _gemini_contents(context, user_prompt),
+            request_options={'timeout': 30}  # Set a 30-second timeout
+        )
+        return response.text
+
+    async def _stream(self, context: LLMContext, user_prompt: str, model: str) -> AsyncIterator[str]:
+        response = await self._model(context, model).generate_content_async(
+            _gemini_contents(context, user_prompt),
+            stream=True,
+            request_options={'timeout': 30}
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
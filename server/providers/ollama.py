@@ -0,0 +1,40 @@
+import ollama
+from typing import AsyncIterator, Optional
+from server.context import LLMContext
+from server.providers.base import POOL_LIMITS, Provider, http2_available
+
+class OllamaProvider(Provider):
+    """Local models served by Ollama; no API key needed."""
+    name = "ollama"
+    label = "Ollama"
+    default_model = "gemma3n:latest"
+    requires_key = False
+
+    def _build_client(self, api_key: Optional[str]):
+        return ollama.AsyncClient(http2=http2_available(), limits=POOL_LIMITS)
+
+    def is_transient(self, error: Exception) -> bool:
+        # A 5xx from the local server, e.g. while a model is still loading
+        status = getattr(error, "status_code", None)
+        return (isinstance(status, int) and status >= 500) or super().is_transient(error)
+
+    async def _close_client(self, client) -> None:
+        await client._client.aclose()
+
+    async def _complete(self, context: LLMContext, user_prompt: str, model: str) -> str:
+        response = await self.client().chat(
+            model=model,
+            messages=context.messages(user_prompt)
+        )
+        return response['message']['content']
+
+    async def _stream(self, context: LLMContext, user_prompt: str, model: str) -> AsyncIterator[str]:
+        stream = await self.client().chat(
+            model=model,
+            messages=context.messages(user_prompt),
+            stream=True
+        )
+        async for chunk in stream:
+            text = chunk['message']['content']
+            if text:
+                yield text
@@ -0,0 +1,50 @@
+import openai
+from typing import AsyncIterator, Optional
+from server.context import LLMContext
+from server.providers.base import GENERATION_PARAMS, POOL_LIMITS, Provider, http2_available
+
+class OpenAIProvider(Provider):
+    name = "openai"
+    label = "OpenAI"
+    default_model = "gpt-4o"
+    base_url: Optional[str] = None
+
+    def _build_client(self, api_key: Optional[str]):
+        # The SDK ships its own httpx subclass; hand it the pool settings
+        http_client = openai.DefaultAsyncHttpxClient(http2=http2_available(), limits=POOL_LIMITS)
+        return openai.AsyncOpenAI(api_key=api_key, base_url=self.base_url, http_client=http_client)
+
+    def is_rate_limit(self, error: Exception) -> bool:
+        return isinstance(error, openai.RateLimitError)
+
+    def is_transient(self, error: Exception) -> bool:
+        # APIConnectionError covers timeouts; InternalServerError is any 5xx
+        return isinstance(error, (openai.APIConnectionError, openai.InternalServerError)) or super().is_transient(error)
+
+    async def _complete(self, context: LLMContext, user_prompt: str, model: str) -> str:
+        response = await self.client().chat.completions.create(
+            model=model,
+            messages=context.messages(user_prompt),
+            max_tokens=GENERATION_PARAMS["max_tokens"],
+            temperature=GENERATION_PARAMS["temperature"]
+        )
+        return response.choices[0].message.content
+
+    async def _stream(self, context: LLMContext, user_prompt: str, model: str) -> AsyncIterator[str]:
+        stream = await self.client().chat.completions.create(
+            model=model,
+            messages=context.messages(user_prompt),
+            max_tokens=GENERATION_PARAMS["max_tokens"],
+            temperature=GENERATION_PARAMS["temperature"],
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+class GrokProvider(OpenAIProvider):
+    """X/Grok speaks the OpenAI chat completions API."""
+    name = "x"
+    label = "X (Grok)"
+    default_model = "grok-1"
+    base_url = "https://api.x.ai/v1"
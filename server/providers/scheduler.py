@@ -0,0 +1,212 @@
+import os
+import time
+import random
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+from server.logger import logger
+from server.providers.errors import ProviderUnavailable, RateLimitError, TransientProviderError
+
+T = TypeVar("T")
+
+# Per-provider defaults; override with VIZTHINK_<PROVIDER>_<SETTING>, e.g.
+# VIZTHINK_OPENAI_RPM=500. Ollama runs on local hardware, so it gets few
+# concurrent slots and no rate limits.
+SCHEDULER_DEFAULTS = {
+    "rpm": 60,              # requests per minute (0 = unlimited)
+    "tpm": 200_000,         # estimated tokens per minute (0 = unlimited)
+    "concurrency": 8,       # in-flight calls
+    "max_retries": 3,
+    "failure_threshold": 5, # consecutive failures that open the circuit
+    "reset_timeout": 30,    # seconds the circuit stays open
+}
+PROVIDER_OVERRIDES = {
+    "ollama": {"rpm": 0, "tpm": 0, "concurrency": 2},
+}
+
+BASE_DELAY = 0.5
+MAX_DELAY = 30.0
+
+class TokenBucket:
+    """Refills ``rate`` units per minute up to ``rate``; ``acquire`` waits for capacity."""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.fill_rate = rate_per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1) -> None:
+        if self.capacity <= 0:
+            return
+        amount = min(amount, self.capacity)  # an oversized request waits for a full bucket
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.fill_rate)
+
+class CircuitBreaker:
+    """Fails fast after ``failure_threshold`` consecutive failures.
+
+    After ``reset_timeout`` seconds one trial call is let through (half-open);
+    its success closes the circuit, its failure re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """Admit a call or raise ``ProviderUnavailable``; True if it is the half-open trial."""
+        state = self.state
+        if state == "open" or (state == "half-open" and self._trial_in_flight):
+            retry_in = self.reset_timeout - (time.monotonic() - self.opened_at)
+            raise ProviderUnavailable(
+                f"{self.name} is temporarily unavailable after repeated failures. Retry in {max(retry_in, 0):.0f}s.",
+                retry_after=max(retry_in, 0),
+            )
+        if state == "half-open":
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def release_trial(self) -> None:
+        """Forget an in-flight half-open trial that was cancelled."""
+        self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Circuit opened for {self.name} after {self.failures} failures")
+            self.opened_at = time.monotonic()
+
+def _setting(provider: str, key: str) -> float:
+    env = os.getenv(f"VIZTHINK_{provider.upper()}_{key.upper()}")
+    if env is not None:
+        return float(env)
+    return PROVIDER_OVERRIDES.get(provider, {}).get(key, SCHEDULER_DEFAULTS[key])
+
+def _backoff(attempt: int, retry_after: Optional[float]) -> float:
+    """Full-jitter exponential backoff, never shorter than ``Retry-After``."""
+    delay = random.uniform(0, min(MAX_DELAY, BASE_DELAY * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, MAX_DELAY))
+    return delay
+
+class ProviderScheduler:
+    """Rate limits, bounds concurrency, retries and circuit-breaks calls to one provider.
+
+    Only rate-limit and transient (network, timeout, 5xx) errors are retried
+    and counted by the breaker; other errors propagate immediately.
+    """
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.requests = TokenBucket(_setting(provider, "rpm"))
+        self.tokens = TokenBucket(_setting(provider, "tpm"))
+        self.semaphore = asyncio.Semaphore(int(_setting(provider, "concurrency")))
+        self.max_retries = int(_setting(provider, "max_retries"))
+        self.breaker = CircuitBreaker(provider, int(_setting(provider, "failure_threshold")), _setting(provider, "reset_timeout"))
+
+    async def _admit(self, cost: int) -> bool:
+        """Wait for rate-limit capacity; True if the call is the breaker's half-open trial."""
+        trial = self.breaker.before_call()
+        try:
+            await self.requests.acquire(1)
+            await self.tokens.acquire(cost)
+        except BaseException:
+            # Cancelled while waiting (fan-out timeout, first_wins, disconnect)
+            if trial:
+                self.breaker.release_trial()
+            raise
+        return trial
+
+    async def _retry_or_raise(self, error: Exception, attempt: int) -> None:
+        self.breaker.record_failure()
+        if attempt >= self.max_retries or self.breaker.state == "open":
+            raise error
+        delay = _backoff(attempt, getattr(error, "retry_after", None))
+        logger.warning(f"{self.provider} call failed ({error}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    async def run(self, call: Callable[[], Awaitable[T]], cost: int = 0) -> T:
+        attempt = 0
+        while True:
+            trial = await self._admit(cost)
+            try:
+                async with self.semaphore:
+                    result = await call()
+            except (RateLimitError, TransientProviderError) as e:
+                await self._retry_or_raise(e, attempt)
+                attempt += 1
+                continue
+            except Exception:
+                # The provider answered (bad request, auth, ...): it is up
+                self.breaker.record_success()
+                raise
+            except BaseException:
+                if trial:
+                    self.breaker.release_trial()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def stream(self, call: Callable[[], AsyncIterator[str]], cost: int = 0) -> AsyncIterator[str]:
+        """Like ``run`` for streams; retries happen only before the first chunk."""
+        attempt = 0
+        while True:
+            trial = await self._admit(cost)
+            started = False
+            error = None
+            try:
+                async with self.semaphore:
+                    try:
+                        async for chunk in call():
+                            started = True
+                            yield chunk
+                    except (RateLimitError, TransientProviderError) as e:
+                        if started:
+                            self.breaker.record_failure()
+                            raise
+                        error = e
+            except (RateLimitError, TransientProviderError):
+                raise
+            except Exception:
+                self.breaker.record_success()
+                raise
+            except BaseException:
+                if trial:
+                    self.breaker.release_trial()
+                raise
+            if error is None:
+                self.breaker.record_success()
+                return
+            await self._retry_or_raise(error, attempt)
+            attempt += 1
+
+    def stats(self) -> dict:
+        return {"circuit": self.breaker.state, "consecutive_failures": self.breaker.failures}
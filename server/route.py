@@ -1,13 +1,25 @@
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, WebSocket
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from pathlib import Path
 from pydantic import BaseModel
-from typing import Dict
-from server.llm import call_llm
+from typing import Dict, Optional
+import re
+import json
+import math
+import uuid
+import asyncio
+from server.llm import call_llm, fan_out_llm, stream_llm
+from server.cache import response_cache
+from server.coalesce import chat_flights, flight_key
+from server.jobs import job_queue
+from server.events import event_hub
+from server.export import EXPORT_FORMATS, export_chunks, gzip_chunks, import_chatrecords
+from server.providers import get_provider
+from server.providers.errors import ProviderUnavailable, RateLimitError
 from server.logger import logger
-from server.dao.sqlite import delete_all_chatrecord, get_all_chatrecord, store_one_chatrecord, store_all_positions, delete_single_chatrecord
+from server.dao.sqlite import DEFAULT_GRAPH, create_graph, delete_graph, list_graphs, delete_all_chatrecord, get_all_chatrecord, list_jobs, get_chatrecord_page, get_one_chatrecord, get_node_neighbourhood, get_turns, search_chatrecords, store_one_chatrecord, position_buffer, delete_single_chatrecord, get_sync_revision
 
 # Define the directory for static files (the 'dist' folder)
 static_files_dir = Path(__file__).resolve().parent.parent / "dist"
@@ -19,6 +31,115 @@ class ApiKeyUpdate(BaseModel):
 class ApiKeysUpdate(BaseModel):
     api_keys: Dict[str, str]
 
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Upper bound on provider/model pairs in one fan-out request
+MAX_FAN_OUT_TARGETS = 8
+
+# Graph ids are chosen by the client (e.g. a UUID); short and URL-safe
+GRAPH_ID = re.compile(r"[\w.:-]{1,128}")
+
+def _graph_id(request: Request, body: Optional[dict] = None) -> str:
+    """The graph a request is scoped to.
+
+    Read from ``graph_id`` in the JSON body or the query string, or from the
+    ``X-Graph-Id`` header; requests that name none use the default graph.
+    """
+    graph_id = (
+        (body or {}).get("graph_id")
+        or request.query_params.get("graph_id")
+        or request.headers.get("X-Graph-Id")
+        or DEFAULT_GRAPH
+    )
+    if not isinstance(graph_id, str) or not GRAPH_ID.fullmatch(graph_id):
+        raise HTTPException(status_code=400, detail="graph_id must be 1-128 letters, digits or . _ : -")
+    return graph_id
+
+def _position_diff(positions) -> Dict[int, dict]:
+    """Validate a ``{node_id: {x, y}}`` diff (or the old list form) into float coordinates.
+
+    Raises a 400 on anything malformed, so the position buffer only ever
+    holds entries that ``store_positions`` can write.
+    """
+    if isinstance(positions, list):
+        positions = {idx: pos for idx, pos in enumerate(positions, start=1)}
+    if not isinstance(positions, dict):
+        raise HTTPException(status_code=400, detail="positions must be an object of {node_id: {x, y}}")
+    diff = {}
+    for node_id, pos in positions.items():
+        if not str(node_id).isdigit():
+            raise HTTPException(status_code=400, detail=f"Invalid node id: {node_id!r}")
+        coordinates = [pos.get(axis) for axis in ("x", "y")] if isinstance(pos, dict) else [None]
+        if not all(
+            isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+            for value in coordinates
+        ):
+            raise HTTPException(status_code=400, detail=f"Position of node {node_id} must be finite numbers x and y")
+        diff[int(node_id)] = {"x": float(coordinates[0]), "y": float(coordinates[1])}
+    return diff
+
+async def _check_parent(parent_id, graph_id: str) -> None:
+    """Reject a parent from another graph (a parent that does not exist just makes a root)."""
+    if parent_id is None or not str(parent_id).isdigit():
+        return
+    if await get_one_chatrecord(int(parent_id), graph_id) is None and await get_one_chatrecord(int(parent_id)) is not None:
+        raise HTTPException(status_code=400, detail=f"Parent {parent_id} is not in graph {graph_id}")
+
+def _llm_http_error(error: Exception, provider: str) -> HTTPException:
+    """Map an LLM call failure to the HTTP error the frontend expects."""
+    error_message = str(error)
+    if "API key not set" in error_message:
+        return HTTPException(status_code=400, detail=f"API key not configured for {provider}. Please set it in the settings.")
+    if isinstance(error, (RateLimitError, ProviderUnavailable)):
+        status = 429 if isinstance(error, RateLimitError) else 503
+        headers = {"Retry-After": str(max(1, round(error.retry_after)))} if error.retry_after else None
+        return HTTPException(status_code=status, detail=error_message, headers=headers)
+    return HTTPException(status_code=500, detail=f"Internal server error: {error_message}")
+
+def _flight_key(request: Request, body: dict, graph_id: str):
+    """Coalescing key for a chat request: its idempotency key, else its content."""
+    parent_id = body.get("parent_id")
+    return flight_key(
+        request.headers.get("Idempotency-Key") or body.get("idempotency_key"),
+        graph_id=graph_id,
+        prompt=body.get("prompt", ""),
+        provider=body.get("provider", "google"),
+        model=body.get("model"),
+        parent_id=None if parent_id is None else str(parent_id),
+        isBranch=bool(body.get("isBranch", False)),
+        targets=body.get("targets"),
+        first_wins=bool(body.get("first_wins", False)),
+        retrieve=body.get("retrieve"),
+    )
+
+async def _fan_out(body: dict, prompt: str, targets: list, parent_id, isBranch: bool, use_cache: bool, graph_id: str) -> dict:
+    """Run a fan-out chat and store each answer as a sibling under ``parent_id``.
+
+    The first stored answer keeps the request's ``isBranch``; the others are
+    stored as branches so they lay out side by side.
+    """
+    if not isinstance(targets, list) or not all(isinstance(t, dict) and t.get("provider") for t in targets):
+        raise HTTPException(status_code=400, detail="targets must be a list of {provider, model?, timeout?}")
+    if len(targets) > MAX_FAN_OUT_TARGETS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_FAN_OUT_TARGETS} targets are allowed")
+
+    logger.info(f"Fan-out chat request over {len(targets)} targets, first_wins={bool(body.get('first_wins'))}")
+    results = await fan_out_llm(prompt, targets, parent_id, first_wins=bool(body.get("first_wins")), use_cache=use_cache, graph_id=graph_id)
+
+    first = None
+    for result in results:
+        if "response" not in result:
+            continue
+        result["record_id"] = await store_one_chatrecord(
+            prompt, result["response"], parent_id, isBranch if first is None else True, graph_id
+        )
+        first = first or result
+    if first is None:
+        raise HTTPException(status_code=502, detail={"message": "All providers failed", "results": results})
+    return {"response": first["response"], "record_id": first["record_id"], "results": results}
+
 def setup_routes(app: FastAPI):
     """Set up all routes for the application"""
     # Mount the 'assets' directory from 'dist' at the '/assets' path
@@ -43,72 +164,468 @@ def setup_routes(app: FastAPI):
             model = body.get("model")  # Optional model specification
             parent_id = body.get("parent_id")
             isBranch = body.get("isBranch", False)
+            use_cache = not body.get("no_cache", False)
+            graph_id = _graph_id(request, body)
             
             logger.info(f"Received chat request: prompt='{prompt}', provider='{provider}', model='{model}', parent_id={parent_id}, isBranch={isBranch}")
             
             if not prompt:
                 raise HTTPException(status_code=400, detail="Prompt is required")
+            await _check_parent(parent_id, graph_id)
+
+            targets = body.get("targets")
+
+            async def answer():
+                if targets:
+                    return await _fan_out(body, prompt, targets, parent_id, isBranch, use_cache, graph_id)
+
+                # Call LLM
+                response = await call_llm(prompt, provider, parent_id, model, use_cache=use_cache, retrieve=body.get("retrieve"), graph_id=graph_id)
+
+                # Store the conversation
+                record_id = await store_one_chatrecord(prompt, response, parent_id, isBranch, graph_id)
+
+                return {
+                    "response": response,
+                    "record_id": record_id
+                }
+
+            # Duplicate submissions (double clicks, client retries) share one answer
+            key, remember = _flight_key(request, body, graph_id)
+            return await chat_flights.run(key, answer, remember)
             
-            # Call LLM
-            response = await call_llm(prompt, provider, parent_id, model)
-            
-            # Store the conversation
-            record_id = await store_one_chatrecord(prompt, response, parent_id, isBranch)
-            
-            return {
-                "response": response,
-                "record_id": record_id
-            }
-            
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error in chat endpoint: {e}", exc_info=True)
-            error_message = str(e)
-            if "API key not set" in error_message:
-                raise HTTPException(status_code=400, detail=f"API key not configured for {provider}. Please set it in the settings.")
-            raise HTTPException(status_code=500, detail=f"Internal server error: {error_message}")
+            raise _llm_http_error(e, provider)
+
+    @app.post("/chat/stream")
+    async def chat_stream_endpoint(request: Request):
+        """Stream the LLM response as Server-Sent Events.
+
+        Emits ``token`` events while the provider generates, then a single
+        ``done`` event carrying the stored ``record_id`` (or ``error`` if the
+        provider fails mid-stream). The record is persisted only once the
+        stream completes, whether or not the client is still listening.
+        """
+        body = await request.json()
+        prompt = body.get("prompt", "")
+        provider = body.get("provider", "google")
+        model = body.get("model")
+        parent_id = body.get("parent_id")
+        isBranch = body.get("isBranch", False)
+        use_cache = not body.get("no_cache", False)
+        graph_id = _graph_id(request, body)
+
+        logger.info(f"Received chat stream request: prompt='{prompt}', provider='{provider}', model='{model}', parent_id={parent_id}, isBranch={isBranch}")
+
+        if not prompt:
+            raise HTTPException(status_code=400, detail="Prompt is required")
+        await _check_parent(parent_id, graph_id)
+
+        # A duplicate of a request that is streaming (or, with an idempotency
+        # key, has finished) waits for that answer and replays it whole.
+        key, remember = _flight_key(request, body, graph_id)
+        while (flight := chat_flights.join(key)) is not None:
+            try:
+                result = await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+                continue  # the original client went away before finishing
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise _llm_http_error(e, provider)
+
+            async def replay():
+                yield _sse("token", {"token": result["response"]})
+                yield _sse("done", result)
+
+            return StreamingResponse(
+                replay(),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+        flight = chat_flights.lead(key, remember)
+
+        # Pull the first chunk before committing to a 200 so that missing keys
+        # and provider errors still surface as regular HTTP errors.
+        tokens = stream_llm(prompt, provider, parent_id, model, use_cache=use_cache, retrieve=body.get("retrieve"), graph_id=graph_id)
+        try:
+            first_chunk = await tokens.__anext__()
+        except StopAsyncIteration:
+            first_chunk = ""
+        except BaseException as e:
+            await tokens.aclose()
+            if not isinstance(e, Exception):
+                flight.cancel()  # client disconnected before the first token
+                raise
+            flight.set_exception(e)
+            logger.error(f"Error in chat stream endpoint: {e}", exc_info=True)
+            raise _llm_http_error(e, provider)
+
+        # The rest is generated in its own task, which settles the flight: a
+        # client that disconnects (even before the body starts) does not
+        # abandon the answer, and its retry replays it.
+        stream_id = uuid.uuid4().hex
+        events: asyncio.Queue = asyncio.Queue()
+
+        async def generate():
+            chunks = [first_chunk]
+            record_id = None
+            try:
+                async for chunk in tokens:
+                    chunks.append(chunk)
+                    event_hub.publish(graph_id, {"type": "tokens", "stream_id": stream_id, "text": chunk})
+                    events.put_nowait(("token", {"token": chunk}))
+                response = "".join(chunks)
+                record_id = await store_one_chatrecord(prompt, response, parent_id, isBranch, graph_id)
+                result = {"response": response, "record_id": record_id}
+                flight.set_result(result)
+                events.put_nowait(("done", result))
+            except Exception as e:
+                logger.error(f"Error while streaming chat response: {e}", exc_info=True)
+                flight.set_exception(e)
+                events.put_nowait(("error", {"detail": str(e)}))
+            finally:
+                if not flight.done():
+                    flight.cancel()  # shutting down
+                    events.put_nowait(("error", {"detail": "Stream cancelled"}))
+                await tokens.aclose()
+                event_hub.publish(graph_id, {"type": "stream_end", "stream_id": stream_id, "record_id": record_id})
+
+        # Other clients of the graph watch the answer being written (see /ws)
+        event_hub.publish(graph_id, {
+            "type": "tokens", "stream_id": stream_id, "text": first_chunk,
+            "prompt": prompt, "parent_id": parent_id, "isBranch": bool(isBranch),
+        })
+        asyncio.create_task(generate())
+
+        async def event_stream():
+            if first_chunk:
+                yield _sse("token", {"token": first_chunk})
+            while True:
+                event, data = await events.get()
+                yield _sse(event, data)
+                if event != "token":
+                    return
+
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
     @app.post("/chat/positions")
     async def save_positions_endpoint(request: Request):
-        """Save node positions."""
+        """Save node positions.
+
+        ``positions`` is a sparse ``{node_id: {x, y}}`` diff of the nodes that
+        moved; nodes outside the request's graph are ignored. Updates are
+        coalesced server-side and written in one batch per graph after a
+        short debounce window. A plain list is still accepted and
+        mapped to ids 1..n in order, as older clients sent it.
+        """
         try:
             body = await request.json()
-            positions = body.get("positions", [])
-            await store_all_positions(positions)
-            return {"status": "success"}
+            if not isinstance(body, dict):
+                raise HTTPException(status_code=400, detail="Expected a JSON object")
+            pending = position_buffer.submit(_position_diff(body.get("positions", {})), _graph_id(request, body))
+            return {"status": "success", "pending": pending}
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error saving positions: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail=str(e))
 
     @app.get("/chat/records")
-    async def get_chat_records():
-        """Get all chat records."""
+    async def get_chat_records(
+        request: Request,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        since: Optional[int] = None,
+        fields: Optional[str] = None,
+    ):
+        """Get the chat records of one graph.
+
+        Without query parameters every record is returned as a list of
+        tuples. With any of ``after_id``/``limit`` (keyset pagination by id),
+        ``since`` (only changes after that revision, plus deleted ids) or
+        ``fields`` (comma-separated column projection), one page of record
+        dicts is returned together with the cursors for the next request.
+        """
+        graph_id = _graph_id(request)
         try:
-            records = await get_all_chatrecord()
-            return {"records": records}
+            if after_id is None and limit is None and since is None and fields is None:
+                records = await get_all_chatrecord(graph_id)
+                return {"records": records}
+            return await get_chatrecord_page(
+                after_id=after_id,
+                limit=min(max(limit or 500, 1), 5000),
+                since_rev=since,
+                fields=fields.split(",") if fields else None,
+                graph_id=graph_id,
+            )
         except Exception as e:
             logger.error(f"Error getting chat records: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail=str(e))
 
+    @app.get("/chat/search")
+    async def search_records(request: Request, q: str, limit: int = 20, offset: int = 0, root_id: Optional[int] = None):
+        """Full-text search in one graph; ``root_id`` restricts results to one subtree."""
+        graph_id = _graph_id(request)
+        try:
+            return await search_chatrecords(q, max(1, min(limit, 100)), max(offset, 0), root_id, graph_id)
+        except Exception as e:
+            logger.error(f"Error searching chat records: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @app.get("/chat/related")
+    async def related_records(request: Request, q: str, k: int = 5):
+        """Nodes of the graph most similar in meaning to ``q``, best first, with their similarity."""
+        from server.embeddings import embedding_index
+        graph_id = _graph_id(request)
+        try:
+            matches = await embedding_index(graph_id).search(q, max(1, min(k, 50)))
+            turns = await get_turns([node_id for node_id, _ in matches])
+        except Exception as e:
+            logger.error(f"Error finding related records: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=str(e))
+        return [
+            {"id": node_id, "score": score, "prompt": turns[node_id][0], "response": turns[node_id][1]}
+            for node_id, score in matches if node_id in turns
+        ]
+
+    @app.get("/chat/records/{record_id}")
+    async def get_chat_record(request: Request, record_id: int):
+        """Get a single chat record, e.g. to load a node body lazily."""
+        record = await get_one_chatrecord(record_id, _graph_id(request))
+        if record is None:
+            raise HTTPException(status_code=404, detail=f"Record {record_id} not found")
+        return record
+
+    @app.get("/chat/records/{record_id}/tree")
+    async def get_chat_record_tree(request: Request, record_id: int):
+        """Where a record sits in its tree: depth, path from the root, siblings, children and subtree size."""
+        neighbourhood = await get_node_neighbourhood(record_id, _graph_id(request))
+        if neighbourhood is None:
+            raise HTTPException(status_code=404, detail=f"Record {record_id} not found")
+        return neighbourhood
+
     @app.delete("/chat/records")
-    async def delete_all_records():
-        """Delete all chat records."""
+    async def delete_all_records(request: Request):
+        """Delete all chat records of one graph."""
+        graph_id = _graph_id(request)
         try:
-            await delete_all_chatrecord()
+            await delete_all_chatrecord(graph_id)
             return {"status": "success", "message": "All chat records deleted"}
         except Exception as e:
             logger.error(f"Error deleting all records: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail=str(e))
 
     @app.delete("/chat/records/{record_id}")
-    async def delete_record(record_id: int):
+    async def delete_record(request: Request, record_id: int):
         """Delete a specific chat record and its children."""
+        graph_id = _graph_id(request)
         try:
-            await delete_single_chatrecord(record_id)
+            await delete_single_chatrecord(record_id, graph_id)
             return {"status": "success", "message": f"Record {record_id} and its children deleted"}
         except Exception as e:
             logger.error(f"Error deleting record {record_id}: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail=str(e))
 
+    @app.get("/export")
+    async def export_graph(request: Request, format: str = "ndjson", root_id: Optional[int] = None, gzip: bool = False):
+        """Download a graph, or the subtree under ``root_id``, as NDJSON, JSON or an HTML page.
+
+        The file is streamed from the database as it is read, optionally
+        gzipped, so large graphs export in constant memory.
+        """
+        graph_id = _graph_id(request)
+        if format not in EXPORT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+        if root_id is not None and await get_one_chatrecord(root_id, graph_id) is None:
+            raise HTTPException(status_code=404, detail=f"Record {root_id} not found")
+        media_type, extension = EXPORT_FORMATS[format]
+        filename = f"vizthink-{graph_id}" + (f"-{root_id}" if root_id is not None else "") + f".{extension}"
+        chunks = export_chunks(format, graph_id, root_id)
+        if gzip:
+            chunks, media_type, filename = gzip_chunks(chunks), "application/gzip", filename + ".gz"
+        return StreamingResponse(chunks, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+    @app.post("/import")
+    async def import_graph(request: Request, parent_id: Optional[int] = None):
+        """Restore an NDJSON export (plain or gzip) into a graph, streamed from the request body.
+
+        Records are inserted in batched transactions with new ids; with
+        ``parent_id`` the export's roots are attached under that record.
+        """
+        graph_id = _graph_id(request)
+        if parent_id is not None and await get_one_chatrecord(parent_id, graph_id) is None:
+            raise HTTPException(status_code=404, detail=f"Record {parent_id} not found")
+        try:
+            return await import_chatrecords(request.stream(), graph_id, parent_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @app.websocket("/ws")
+    async def live_updates(websocket: WebSocket):
+        """Push one graph's changes to the client as they happen.
+
+        Connect with ``?graph_id=...&client_id=...``; the same ``client_id``
+        sent as ``X-Client-Id`` on HTTP requests keeps the tab's own changes
+        from being echoed back. After a ``hello`` carrying the current
+        revision, the events described in ``server.events`` follow as JSON
+        messages. Anything the client sends is ignored.
+        """
+        graph_id = websocket.query_params.get("graph_id") or DEFAULT_GRAPH
+        if not GRAPH_ID.fullmatch(graph_id):
+            await websocket.close(code=1008)
+            return
+        await websocket.accept()
+        subscriber = event_hub.subscribe(graph_id, websocket.query_params.get("client_id"))
+
+        async def receive():
+            # Only needed to notice the disconnect while no events flow
+            try:
+                while (await websocket.receive())["type"] != "websocket.disconnect":
+                    pass
+            finally:
+                subscriber.close()
+
+        receiver = asyncio.create_task(receive())
+        try:
+            rev, _ = await get_sync_revision(graph_id)
+            await websocket.send_json({"type": "hello", "graph_id": graph_id, "rev": rev})
+            while (events := await subscriber.get()) is not None:
+                for event in events:
+                    await websocket.send_json(event)
+        except Exception as e:
+            logger.info(f"Live update connection for graph {graph_id} closed: {e!r}")
+        finally:
+            event_hub.unsubscribe(subscriber)
+            receiver.cancel()
+
+    @app.get("/graphs")
+    async def get_graphs():
+        """Every saved graph (session) with its record count."""
+        return await list_graphs()
+
+    @app.post("/graphs", status_code=201)
+    async def new_graph(request: Request):
+        """Create a graph: ``{id?, name?}``; a random id is assigned if none is given."""
+        body = await request.json()
+        graph_id = _graph_id(request, {"graph_id": body.get("id") or uuid.uuid4().hex})
+        created = await create_graph(graph_id, body.get("name"))
+        return {"id": graph_id, "name": body.get("name"), "created": created}
+
+    @app.delete("/graphs/{graph_id}")
+    async def remove_graph(request: Request, graph_id: str):
+        """Delete a graph and all of its records."""
+        graph_id = _graph_id(request, {"graph_id": graph_id})
+        if not await delete_graph(graph_id):
+            raise HTTPException(status_code=404, detail=f"Graph {graph_id} not found")
+        return {"status": "success", "message": f"Graph {graph_id} deleted"}
+
+    @app.post("/jobs", status_code=202)
+    async def submit_job(request: Request):
+        """Queue a background job: ``{kind: "chat" | "consolidate", payload, priority?}``.
+
+        Poll ``GET /jobs/{id}`` or subscribe to ``GET /jobs/{id}/events`` for
+        progress and the result.
+        """
+        body = await request.json()
+        payload = body.get("payload") or {}
+        payload["graph_id"] = _graph_id(request, payload)
+        try:
+            return await job_queue.submit(body.get("kind", ""), payload, int(body.get("priority", 0)))
+        except (RuntimeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @app.post("/consolidate", status_code=202)
+    async def consolidate(request: Request):
+        """Start a holistic report over one whole graph as a background job.
+
+        Body: ``{provider?, model?, priority?, graph_id?}``. The job result is
+        ``{report, branches, computed}``; unchanged subtrees reuse their
+        cached summaries.
+        """
+        body = await request.json()
+        provider = body.get("provider", "google")
+        try:
+            get_provider(provider).check_api_key()
+        except RuntimeError as e:
+            raise _llm_http_error(e, provider)
+        payload = {"provider": provider, "model": body.get("model"), "graph_id": _graph_id(request, body)}
+        return await job_queue.submit("consolidate", payload, int(body.get("priority", 0)))
+
+    @app.get("/jobs")
+    async def get_jobs(status: Optional[str] = None, limit: int = 100):
+        return await list_jobs(status, max(1, min(limit, 1000)))
+
+    @app.get("/jobs/{job_id}")
+    async def get_job_status(job_id: int, wait: float = 0):
+        """Job state; with ``wait`` (seconds, up to 60) long-poll until it finishes."""
+        if wait > 0:
+            job = await job_queue.wait(job_id, min(wait, 60.0))
+        else:
+            job = await job_queue.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        return job
+
+    @app.get("/jobs/{job_id}/events")
+    async def job_events(job_id: int):
+        """Server-Sent ``job`` events for every state change until the job finishes."""
+        if await job_queue.get(job_id) is None:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+        async def event_stream():
+            async for job in job_queue.watch(job_id):
+                yield _sse("job", job)
+
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.delete("/jobs/{job_id}")
+    async def cancel_job(job_id: int):
+        job = await job_queue.cancel(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        return job
+
+    @app.get("/cache/stats")
+    async def cache_stats():
+        """Hit/miss counters of the LLM response cache."""
+        return response_cache.stats()
+
+    @app.delete("/cache")
+    async def clear_cache():
+        """Drop every cached LLM response."""
+        try:
+            await response_cache.clear()
+            return {"status": "success", "message": "Response cache cleared"}
+        except Exception as e:
+            logger.error(f"Error clearing response cache: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @app.get("/metrics")
+    async def metrics():
+        """Prometheus text exposition of latency histograms and counters."""
+        from server.metrics import registry
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    @app.get("/providers/status")
+    async def providers_status():
+        """Circuit breaker state per provider."""
+        from server.providers import scheduler_stats
+        return scheduler_stats()
+
     @app.post("/settings/api-keys")
     async def update_api_keys(api_keys_update: ApiKeysUpdate):
         """Update API keys configuration."""
@@ -147,11 +664,16 @@ def setup_routes(app: FastAPI):
                             del os.environ[env_var]
                         logger.info(f"Removed API key for {provider}")
             
-            # Update the global api_key_map in llm.py
-            from server.llm import api_key_map
+            # Update the global api_key_map in llm.py and rebuild only the
+            # pooled clients whose key actually changed
+            from server.providers import api_key_map, reset_clients
+            changed_providers = []
             for provider in env_var_mapping:
                 env_var = env_var_mapping[provider]
+                if api_key_map.get(provider) != os.getenv(env_var):
+                    changed_providers.append(provider)
                 api_key_map[provider] = os.getenv(env_var)
+            await reset_clients(changed_providers)
             
             return {
                 "status": "success", 
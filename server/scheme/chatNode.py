@@ -1,5 +1,76 @@
+from typing import Iterator, List, Optional, Tuple
+
 class ChatNode:
-    def __init__(self, id, prompt, response, type, position, parent_id):
+    """One prompt/response turn of a loaded graph (see ``server.scheme.graph``).
+
+    ``__slots__`` keeps a node to a few pointers: no per-instance dict, so
+    a graph of 100k nodes costs little beyond the text itself. ``parent``
+    and ``children`` link the nodes directly, so tree walks never look
+    anything up by id.
+    """
+
+    __slots__ = ("id", "prompt", "response", "isBranch", "x", "y", "parent", "children")
+
+    def __init__(
+        self,
+        id: int,
+        prompt: str,
+        response: str,
+        isBranch: bool = False,
+        x: Optional[float] = None,
+        y: Optional[float] = None,
+        parent: Optional["ChatNode"] = None,
+    ):
         self.id = id
         self.prompt = prompt
         self.response = response
+        self.isBranch = isBranch
+        self.x = x
+        self.y = y
+        self.parent = parent
+        self.children: List["ChatNode"] = []
+        if parent is not None:
+            parent.children.append(self)
+
+    @property
+    def parent_id(self) -> Optional[int]:
+        return self.parent.id if self.parent is not None else None
+
+    @property
+    def positions(self) -> Optional[dict]:
+        return {"x": self.x, "y": self.y} if self.x is not None else None
+
+    def path(self) -> List["ChatNode"]:
+        """Ancestors from the root down to this node, inclusive."""
+        path = []
+        node: Optional[ChatNode] = self
+        while node is not None:
+            path.append(node)
+            node = node.parent
+        path.reverse()
+        return path
+
+    def depth(self) -> int:
+        """0 for a root."""
+        depth, node = 0, self.parent
+        while node is not None:
+            depth, node = depth + 1, node.parent
+        return depth
+
+    def siblings(self) -> List["ChatNode"]:
+        """Other children of this node's parent (empty for a root)."""
+        if self.parent is None:
+            return []
+        return [node for node in self.parent.children if node is not self]
+
+    def subtree(self) -> Iterator["ChatNode"]:
+        """This node and all of its descendants, parents before children."""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def record(self) -> Tuple[int, str, str, Optional[dict], Optional[int], bool]:
+        """``(id, prompt, response, positions, parent_id, isBranch)`` as ``get_all_chatrecord`` returns it."""
+        return (self.id, self.prompt, self.response, self.positions, self.parent_id, self.isBranch)
@@ -0,0 +1,129 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from server.scheme.chatNode import ChatNode
+
+class Graph:
+    """The nodes of one graph, indexed by id; children lists are the adjacency index."""
+
+    __slots__ = ("id", "nodes", "roots", "used_at")
+
+    def __init__(self, graph_id: str):
+        self.id = graph_id
+        self.nodes: Dict[int, ChatNode] = {}  # insertion order is id order
+        self.roots: List[ChatNode] = []
+        self.used_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def add(self, node_id: int, prompt: str, response: str, parent_id: Optional[int], isBranch: bool,
+            x: Optional[float] = None, y: Optional[float] = None) -> ChatNode:
+        parent = self.nodes.get(parent_id) if parent_id is not None else None
+        node = ChatNode(node_id, prompt, response, bool(isBranch), x, y, parent)
+        self.nodes[node_id] = node
+        if parent is None:
+            self.roots.append(node)
+        return node
+
+    def remove_subtree(self, node_id: int) -> List[int]:
+        """Unlink a node and drop it and its descendants; returns their ids."""
+        node = self.nodes.get(node_id)
+        if node is None:
+            return []
+        if node.parent is not None:
+            node.parent.children.remove(node)
+        else:
+            self.roots.remove(node)
+        removed = [n.id for n in node.subtree()]
+        for removed_id in removed:
+            del self.nodes[removed_id]
+        return removed
+
+class GraphStore:
+    """Loaded graphs, kept in sync by the DAO's write paths.
+
+    A graph is loaded whole on first use and then answers path, subtree,
+    depth and sibling queries from memory in time proportional to the
+    answer. Graphs unused for ``idle_seconds``, and the least recently used
+    beyond ``max_graphs``, are dropped on the next access; they are simply
+    loaded again when needed.
+    """
+
+    def __init__(self, max_graphs: int = 8, idle_seconds: float = 600):
+        self.max_graphs = max_graphs
+        self.idle_seconds = idle_seconds
+        self._graphs: "OrderedDict[str, Graph]" = OrderedDict()
+        self._node_graph: Dict[int, Graph] = {}  # node id -> its loaded graph
+
+    def get(self, graph_id: str) -> Optional[Graph]:
+        graph = self._graphs.get(graph_id)
+        if graph is not None:
+            graph.used_at = time.monotonic()
+            self._graphs.move_to_end(graph_id)
+        self._sweep()
+        return graph
+
+    def find(self, node_id: int) -> Optional[Tuple[Graph, ChatNode]]:
+        """The node with ``node_id`` and its graph, if that graph is loaded."""
+        graph = self._node_graph.get(node_id)
+        if graph is None:
+            return None
+        self.get(graph.id)
+        return graph, graph.nodes[node_id]
+
+    def graph_of(self, node_id: int) -> Optional[str]:
+        """Id of the loaded graph holding ``node_id``, if any."""
+        graph = self._node_graph.get(node_id)
+        return graph.id if graph is not None else None
+
+    def load(self, graph_id: str, rows: Iterable[Sequence]) -> Graph:
+        """Install a graph from ``(id, parent_id, prompt, response, isBranch, x, y)`` rows in id order."""
+        self.evict(graph_id)
+        graph = Graph(graph_id)
+        for node_id, parent_id, prompt, response, isBranch, x, y in rows:
+            graph.add(node_id, prompt, response, parent_id, isBranch, x, y)
+        self._graphs[graph_id] = graph
+        for node_id in graph.nodes:
+            self._node_graph[node_id] = graph
+        self._sweep()
+        return graph
+
+    def add(self, graph_id: str, node_id: int, prompt: str, response: str, parent_id: Optional[int], isBranch: bool) -> None:
+        graph = self._graphs.get(graph_id)
+        if graph is not None:
+            graph.add(node_id, prompt, response, parent_id, isBranch)
+            self._node_graph[node_id] = graph
+
+    def move(self, positions: Dict[int, Tuple[float, float]]) -> None:
+        for node_id, (x, y) in positions.items():
+            graph = self._node_graph.get(node_id)
+            if graph is not None:
+                node = graph.nodes[node_id]
+                node.x, node.y = x, y
+
+    def remove_subtree(self, node_id: int) -> None:
+        graph = self._node_graph.get(node_id)
+        if graph is not None:
+            for removed_id in graph.remove_subtree(node_id):
+                del self._node_graph[removed_id]
+
+    def evict(self, graph_id: str) -> None:
+        graph = self._graphs.pop(graph_id, None)
+        if graph is not None:
+            for node_id in graph.nodes:
+                self._node_graph.pop(node_id, None)
+
+    def clear(self) -> None:
+        self._graphs.clear()
+        self._node_graph.clear()
+
+    def _sweep(self) -> None:
+        cutoff = time.monotonic() - self.idle_seconds
+        for graph_id in [g.id for g in self._graphs.values() if g.used_at < cutoff]:
+            self.evict(graph_id)
+        while len(self._graphs) > self.max_graphs:
+            self.evict(next(iter(self._graphs)))
+
+    def stats(self) -> dict:
+        return {"graphs": len(self._graphs), "nodes": len(self._node_graph)}
@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useRef, useState } from 'react';
 import {
   Modal,
   ModalOverlay,
@@ -20,7 +20,9 @@ import {
 import { 
   FaFileImage, 
   FaDownload,
-  FaGlobe
+  FaGlobe,
+  FaDatabase,
+  FaUpload
 } from 'react-icons/fa';
 import useStore from '../typejs/store';
 import { useSettings } from './SettingsContext';
@@ -34,11 +36,42 @@ const ExportModal: React.FC<ExportModalProps> = ({ isOpen, onClose }) => {
   const { 
     exportAsImage, 
     exportAsHTML,
+    exportFromServer,
+    importGraph,
     nodes 
   } = useStore();
   const { fontColor } = useSettings();
   const [isExporting, setIsExporting] = useState<string | null>(null);
   const toast = useToast();
+  const importInput = useRef<HTMLInputElement>(null);
+
+  const handleImport = async (event: React.ChangeEvent<HTMLInputElement>) => {
+    const file = event.target.files?.[0];
+    event.target.value = '';
+    if (!file) return;
+    setIsExporting('import');
+    try {
+      const imported = await importGraph(file);
+      toast({
+        title: "Import Successful",
+        description: `Imported ${imported} ${imported === 1 ? 'node' : 'nodes'}.`,
+        status: "success",
+        duration: 3000,
+        isClosable: true,
+      });
+      onClose();
+    } catch (error) {
+      toast({
+        title: "Import Failed",
+        description: error instanceof Error ? error.message : "Failed to import. Please try again.",
+        status: "error",
+        duration: 5000,
+        isClosable: true,
+      });
+    } finally {
+      setIsExporting(null);
+    }
+  };
 
   const handleExport = async (type: string, exportFunction: () => void | Promise<void>) => {
     setIsExporting(type);
@@ -85,6 +118,24 @@ const ExportModal: React.FC<ExportModalProps> = ({ isOpen, onClose }) => {
       action: () => handleExport('image', exportAsImage),
       disabled: nodes.length === 0,
     },
+    {
+      id: 'ndjson',
+      title: 'Download Data File',
+      description: 'Compressed NDJSON of every node, streamed by the server - use it for backups, large graphs and importing',
+      icon: FaDatabase,
+      color: 'purple',
+      action: () => handleExport('ndjson', () => exportFromServer('ndjson')),
+      disabled: nodes.length === 0,
+    },
+    {
+      id: 'import',
+      title: 'Import Data File',
+      description: 'Add the nodes of a downloaded data file (.ndjson or .ndjson.gz) to this graph',
+      icon: FaUpload,
+      color: 'green',
+      action: () => importInput.current?.click(),
+      disabled: false,
+    },
   ];
 
   return (
@@ -125,6 +176,14 @@ const ExportModal: React.FC<ExportModalProps> = ({ isOpen, onClose }) => {
             
             <Divider />
 
+            <input
+              ref={importInput}
+              type="file"
+              accept=".ndjson,.gz,application/x-ndjson,application/gzip"
+              style={{ display: 'none' }}
+              onChange={handleImport}
+            />
+
             {exportOptions.map((option) => (
               <Box key={option.id}>
                 <Button
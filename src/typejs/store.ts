@@ -19,6 +19,21 @@ import {
 } from 'reactflow';
 import { estimateNodeHeight, calculateOptimalPosition } from './position';
 
+export interface ChatRecord {
+  id: number;
+  prompt: string;
+  response: string;
+  positions: { x: number; y: number } | null;
+  parent_id: number | null;
+  isBranch: boolean;
+}
+
+// A change pushed by the backend over /ws (see server/events.py)
+export interface LiveEvent {
+  type: 'hello' | 'nodes_added' | 'nodes_deleted' | 'graph_cleared' | 'positions' | 'tokens' | 'stream_end' | 'resync';
+  [key: string]: any;
+}
+
 export interface StoreState {
   nodes: Node[];
   edges: Edge[];
@@ -26,6 +41,7 @@ export interface StoreState {
   selectedNodeId: string | null;
   viewport?: Viewport; // Add this
   extendedNodeId: string | null;
+  graphId: string; // graph (session) every request is scoped to
   onNodesChange: OnNodesChange;
   onEdgesChange: OnEdgesChange;
   onConnect: OnConnect;
@@ -35,6 +51,7 @@ export interface StoreState {
   setSelectedNodeId: (nodeId: string | null) => void;
   setViewport: (viewport: Viewport) => void; // Add this
   setExtendedNodeId: (id: string | null) => void;
+  setGraphId: (graphId: string) => Promise<void>;
   Initailize: () => Promise<void>;
   sendMessage: (prompt: string, provider: string, parentId?: string, isBranch?: boolean, model?: string) => Promise<void>;
   savePositions: () => Promise<void>; // Add this
@@ -44,6 +61,49 @@ export interface StoreState {
   updateNodeStyle: (nodeId: string, style: React.CSSProperties) => void;
   exportAsImage: () => Promise<void>;
   exportAsHTML: () => void;
+  connectLive: (resume?: boolean) => void;
+  applyLiveEvent: (event: LiveEvent) => void;
+  exportFromServer: (format: 'ndjson' | 'json' | 'html') => void;
+  importGraph: (file: File) => Promise<number>;
+}
+
+// Ids of nodes dragged since the last savePositions call
+const dirtyPositionIds = new Set<string>();
+
+// The open graph is remembered across reloads
+const GRAPH_ID_KEY = 'vizthink.graphId';
+
+// Identifies this tab to the backend, which then doesn't echo our own
+// changes back over the live update channel
+const CLIENT_ID = crypto.randomUUID();
+axios.defaults.headers.common['X-Client-Id'] = CLIENT_ID;
+
+// The live update connection and the graph it listens to
+let liveSocket: WebSocket | null = null;
+let liveGraphId: string | null = null;
+let liveRetryDelay = 1000;
+
+// Parse a text/event-stream body into {event, data} messages
+async function* readServerSentEvents(body: ReadableStream<Uint8Array>) {
+  const reader = body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const event = /^event: (.*)$/m.exec(raw)?.[1] ?? 'message';
+      const data = /^data: (.*)$/m.exec(raw)?.[1];
+      if (data) {
+        yield { event, data: JSON.parse(data) };
+      }
+      boundary = buffer.indexOf('\n\n');
+    }
+  }
 }
 
 const useStore = create<StoreState>()(
@@ -54,11 +114,25 @@ const useStore = create<StoreState>()(
     selectedNodeId: null,
     viewport: undefined, // Add this
     extendedNodeId: null,
+    graphId: localStorage.getItem(GRAPH_ID_KEY) || 'default',
 
     setReactFlowInstance: (instance) => {
       set({ reactFlowInstance: instance });
     },
 
+    setGraphId: async (graphId) => {
+      localStorage.setItem(GRAPH_ID_KEY, graphId);
+      set((state) => {
+        state.graphId = graphId;
+        state.nodes = [];
+        state.edges = [];
+        state.selectedNodeId = null;
+        state.extendedNodeId = null;
+        state.viewport = undefined;
+      });
+      await get().Initailize();
+    },
+
     setSelectedNodeId: (nodeId) => {
       set({ selectedNodeId: nodeId });
     },
@@ -85,6 +159,9 @@ const useStore = create<StoreState>()(
         state.nodes = applyNodeChanges(changes, state.nodes);
       });
       // Add debounced save if position change
+      changes.forEach((c) => {
+        if (c.type === 'position' && c.position) dirtyPositionIds.add(c.id);
+      });
       if (changes.some(c => c.type === 'position')) {
         if ((get() as any).saveTimeout) clearTimeout((get() as any).saveTimeout);
         (get() as any).saveTimeout = setTimeout(() => get().savePositions(), 500);
@@ -113,10 +190,17 @@ const useStore = create<StoreState>()(
 
     savePositions: async () => {
       const { nodes } = get();
-      const sortedNodes = [...nodes].sort((a, b) => parseInt(a.id) - parseInt(b.id));
-      const positions = sortedNodes.map(n => n.position);
+      // Send only the nodes that moved since the last save, keyed by id
+      const positions: Record<string, { x: number; y: number }> = {};
+      nodes.forEach((n) => {
+        if (dirtyPositionIds.has(n.id) && !n.id.startsWith('temp_')) {
+          positions[n.id] = n.position;
+        }
+      });
+      dirtyPositionIds.clear();
+      if (Object.keys(positions).length === 0) return;
       try {
-        await axios.post('http://127.0.0.1:8000/chat/positions', { positions });
+        await axios.post('http://127.0.0.1:8000/chat/positions', { positions, graph_id: get().graphId });
       } catch (err) {
         console.error('Error saving positions:', err);
       }
@@ -170,7 +254,7 @@ const useStore = create<StoreState>()(
       const { reactFlowInstance } = get();
       try {
         // Clear backend data
-        await axios.delete('http://127.0.0.1:8000/chat/records');
+        await axios.delete('http://127.0.0.1:8000/chat/records', { headers: { 'X-Graph-Id': get().graphId } });
         
         // Clear frontend state
         set((state) => {
@@ -207,7 +291,7 @@ const useStore = create<StoreState>()(
     deleteNode: async (nodeId: string) => {
       try {
         // Call backend API to delete the node and its descendants
-        await axios.delete(`http://127.0.0.1:8000/chat/records/${nodeId}`);
+        await axios.delete(`http://127.0.0.1:8000/chat/records/${nodeId}`, { headers: { 'X-Graph-Id': get().graphId } });
         
         // Get all descendant node IDs recursively
         const getAllDescendants = (parentId: string, nodes: Node[], edges: Edge[]): string[] => {
@@ -257,16 +341,23 @@ const useStore = create<StoreState>()(
 
     Initailize: async () => {
       try {
-        // Fetch chat records from backend
-        const response = await axios.get('http://127.0.0.1:8000/chat/records');
-        const chatRecords = response.data.records; // Backend returns {records}
+        // Fetch chat records from backend page by page (keyset on id)
+        const chatRecords: ChatRecord[] = [];
+        let afterId: number | null = null;
+        do {
+          const params: Record<string, number | string> = { limit: 1000, graph_id: get().graphId };
+          if (afterId !== null) params.after_id = afterId;
+          const response = await axios.get('http://127.0.0.1:8000/chat/records', { params });
+          chatRecords.push(...response.data.records);
+          afterId = response.data.next_after_id;
+        } while (afterId !== null);
         
         if (chatRecords && chatRecords.length > 0) {
           // Convert backend data to React Flow nodes
           const restoredNodes: Node[] = [];
           const restoredEdges: Edge[] = [];
           
-          chatRecords.forEach(([id, prompt, response, positions, parent_id, isBranch]: [number, string, string, any, number | null, boolean]) => {
+          chatRecords.forEach(({ id, prompt, response, positions, parent_id, isBranch }) => {
             const nodeId = id.toString();
             
             // Create node with position from database or default
@@ -319,6 +410,136 @@ const useStore = create<StoreState>()(
         // Fallback to creating welcome node if backend fails
         await get().createWelcome(); // Use default provider (ollama)
       }
+      get().connectLive();
+    },
+
+    // Follow changes made to this graph by other tabs and windows
+    connectLive: (resume = false) => {
+      const graphId = get().graphId;
+      if (liveSocket && liveGraphId === graphId) return;
+      liveSocket?.close();
+      const params = new URLSearchParams({ graph_id: graphId, client_id: CLIENT_ID });
+      const socket = new WebSocket(`ws://127.0.0.1:8000/ws?${params}`);
+      liveSocket = socket;
+      liveGraphId = graphId;
+      socket.onopen = () => {
+        liveRetryDelay = 1000;
+        // Changes made while we were disconnected were missed
+        if (resume) get().Initailize();
+      };
+      socket.onmessage = (message) => get().applyLiveEvent(JSON.parse(message.data));
+      socket.onclose = () => {
+        if (liveSocket !== socket) return; // replaced by a connection to another graph
+        liveSocket = null;
+        setTimeout(() => get().connectLive(true), liveRetryDelay);
+        liveRetryDelay = Math.min(liveRetryDelay * 2, 30000);
+      };
+    },
+
+    applyLiveEvent: (event) => {
+      switch (event.type) {
+        case 'nodes_added':
+          set((state) => {
+            for (const record of event.records as ChatRecord[]) {
+              const nodeId = record.id.toString();
+              if (state.nodes.some((n) => n.id === nodeId)) continue;
+              const parentId = record.parent_id !== null ? record.parent_id.toString() : null;
+              const parent = parentId !== null ? state.nodes.find((n) => n.id === parentId) : undefined;
+              state.nodes.push({
+                id: nodeId,
+                type: 'chatNode',
+                position: record.positions || calculateOptimalPosition(state.nodes, state.edges, parent, record.isBranch, record),
+                data: { prompt: record.prompt, response: record.response },
+                style: { borderRadius: '1rem', padding: '1rem', width: '350px' },
+              });
+              if (parentId !== null) {
+                state.edges.push({
+                  id: `${parentId}-${nodeId}`,
+                  source: parentId,
+                  target: nodeId,
+                  sourceHandle: record.isBranch ? 'right' : 'bottom',
+                  type: record.isBranch ? 'branch' : undefined,
+                });
+              }
+            }
+          });
+          break;
+        case 'nodes_deleted': {
+          const deleted = new Set((event.ids as number[]).map(String));
+          set((state) => {
+            state.nodes = state.nodes.filter((n) => !deleted.has(n.id));
+            state.edges = state.edges.filter((e) => !deleted.has(e.source) && !deleted.has(e.target));
+            if (state.selectedNodeId && deleted.has(state.selectedNodeId)) state.selectedNodeId = null;
+            if (state.extendedNodeId && deleted.has(state.extendedNodeId)) state.extendedNodeId = null;
+          });
+          break;
+        }
+        case 'graph_cleared':
+          set((state) => {
+            state.nodes = [];
+            state.edges = [];
+            state.selectedNodeId = null;
+            state.extendedNodeId = null;
+          });
+          get().createWelcome();
+          break;
+        case 'positions':
+          set((state) => {
+            for (const [id, position] of Object.entries(event.positions as Record<string, { x: number; y: number }>)) {
+              const node = state.nodes.find((n) => n.id === id);
+              // Our own pending or in-progress drags win over the broadcast
+              if (node && !node.dragging && !dirtyPositionIds.has(id)) node.position = position;
+            }
+          });
+          break;
+        case 'tokens': {
+          // Another tab's answer being generated: shown in a placeholder
+          // until the stored record arrives
+          const liveId = `live_${event.stream_id}`;
+          set((state) => {
+            const node = state.nodes.find((n) => n.id === liveId);
+            if (node) {
+              node.data.response += event.text;
+              return;
+            }
+            if (event.prompt === undefined) return; // joined mid-stream
+            const parentId = event.parent_id !== null ? String(event.parent_id) : null;
+            const parent = parentId !== null ? state.nodes.find((n) => n.id === parentId) : undefined;
+            state.nodes.push({
+              id: liveId,
+              type: 'chatNode',
+              position: calculateOptimalPosition(state.nodes, state.edges, parent, event.isBranch, { prompt: event.prompt, response: event.text }),
+              data: { prompt: event.prompt, response: event.text, isLoading: false },
+              style: { borderRadius: '1rem', padding: '1rem', width: '350px' },
+              draggable: false,
+            });
+            if (parent) {
+              state.edges.push({
+                id: `${parent.id}-${liveId}`,
+                source: parent.id,
+                target: liveId,
+                sourceHandle: event.isBranch ? 'right' : 'bottom',
+                type: event.isBranch ? 'branch' : undefined,
+              });
+            }
+          });
+          break;
+        }
+        case 'stream_end': {
+          const liveId = `live_${event.stream_id}`;
+          set((state) => {
+            const placeholder = state.nodes.find((n) => n.id === liveId);
+            const stored = event.record_id !== null ? state.nodes.find((n) => n.id === String(event.record_id)) : undefined;
+            if (placeholder && stored) stored.position = placeholder.position; // no jump
+            state.nodes = state.nodes.filter((n) => n.id !== liveId);
+            state.edges = state.edges.filter((e) => e.target !== liveId);
+          });
+          break;
+        }
+        case 'resync':
+          get().Initailize();
+          break;
+      }
     },
 
     sendMessage: async (prompt: string, provider: string, parentId?: string, isBranch: boolean = false, model?: string) => {
@@ -381,7 +602,7 @@ const useStore = create<StoreState>()(
       }, 100);
 
       try {
-        const postData: any = { prompt, provider, isBranch };
+        const postData: any = { prompt, provider, isBranch, graph_id: get().graphId };
         if (lastNode) {
           postData.parent_id = lastNode.id;
         }else{
@@ -390,10 +611,43 @@ const useStore = create<StoreState>()(
         if (model) {
           postData.model = model;
         }
-        const response = await axios.post('http://127.0.0.1:8000/chat', postData);
+        // One key per message: a retry after a dropped connection joins the
+        // original request on the server instead of asking the LLM again.
+        const idempotencyKey = crypto.randomUUID();
+        const request = () => fetch('http://127.0.0.1:8000/chat/stream', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json', 'Idempotency-Key': idempotencyKey, 'X-Client-Id': CLIENT_ID },
+          body: JSON.stringify(postData),
+        });
+        const res = await request().catch(() => request());
+        if (!res.ok || !res.body) {
+          const data = await res.json().catch(() => ({}));
+          throw { response: { status: res.status, data } };
+        }
 
-        const aiResponse = response.data.response;
-        const actualNewId = response.data.record_id.toString();
+        // Render tokens into the placeholder node as they arrive
+        let aiResponse = '';
+        let actualNewId = '';
+        for await (const { event, data } of readServerSentEvents(res.body)) {
+          if (event === 'token') {
+            aiResponse += data.token;
+            set((state) => {
+              const node = state.nodes.find((n) => n.id === tempNewNodeId);
+              if (node) {
+                node.data.response = aiResponse;
+                node.data.isLoading = false;
+              }
+            });
+          } else if (event === 'done') {
+            aiResponse = data.response;
+            actualNewId = data.record_id.toString();
+          } else if (event === 'error') {
+            throw { response: { status: 500, data } };
+          }
+        }
+        if (!actualNewId) {
+          throw new Error('Chat stream ended before the response was stored');
+        }
 
         set((state) => {
           const node = state.nodes.find((n) => n.id === tempNewNodeId);
@@ -435,6 +689,34 @@ const useStore = create<StoreState>()(
     },
 
     // Export Functions
+    // Streamed by the backend straight to a download, so the graph never has
+    // to fit in the browser
+    exportFromServer: (format) => {
+      const params = new URLSearchParams({ format, graph_id: get().graphId, gzip: format === 'html' ? '0' : '1' });
+      const link = document.createElement('a');
+      link.href = `http://127.0.0.1:8000/export?${params}`;
+      link.download = '';
+      document.body.appendChild(link);
+      link.click();
+      document.body.removeChild(link);
+    },
+
+    // Restore an NDJSON export (plain or .gz) into the open graph
+    importGraph: async (file: File) => {
+      const params = new URLSearchParams({ graph_id: get().graphId });
+      const response = await fetch(`http://127.0.0.1:8000/import?${params}`, {
+        method: 'POST',
+        headers: { 'X-Client-Id': CLIENT_ID },
+        body: file,
+      });
+      const result = await response.json();
+      if (!response.ok) {
+        throw new Error(result.detail || `Import failed (${response.status})`);
+      }
+      await get().Initailize();
+      return result.imported;
+    },
+
     exportAsImage: async () => {
       const { nodes, edges, reactFlowInstance } = get();
       
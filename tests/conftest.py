@@ -0,0 +1,44 @@
+import os
+import asyncio
+import tempfile
+import uuid
+
+# Before the app is imported: a throwaway database and no SDK prewarming
+os.environ["VIZTHINK_DB"] = os.path.join(tempfile.mkdtemp(prefix="vizthink-test-"), "vizthink.db")
+os.environ["VIZTHINK_PREWARM"] = "0"
+
+import httpx
+import pytest
+
+@pytest.fixture(scope="session")
+def app_loop():
+    """One event loop running the app for the whole session.
+
+    The DAO's connection pool (and its locks) belong to the loop that opened
+    it, so every app test runs on this loop, each in its own graph.
+    """
+    from server.main import app
+    loop = asyncio.new_event_loop()
+    lifespan = app.router.lifespan_context(app)
+    loop.run_until_complete(lifespan.__aenter__())
+    yield loop
+    loop.run_until_complete(lifespan.__aexit__(None, None, None))
+    loop.close()
+
+@pytest.fixture
+def run(app_loop):
+    """Run ``test(client)`` on the app's loop, with an HTTP client for the app."""
+    from server.main import app
+
+    def run(test):
+        async def main():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await asyncio.wait_for(test(client), timeout=10)
+        return app_loop.run_until_complete(main())
+    return run
+
+@pytest.fixture
+def graph_id():
+    """A fresh graph, so tests sharing the session's database do not see each other."""
+    return f"test-{uuid.uuid4().hex[:12]}"
@@ -0,0 +1,102 @@
+import json
+import asyncio
+
+import server.route
+from server.events import event_hub
+from server.main import app
+
+def sse_events(text: str):
+    """``[(event, data)]`` of a Server-Sent Events body."""
+    events = []
+    for message in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+def fake_stream(calls, chunks=("Hello", " world")):
+    async def stream_llm(prompt, provider, parent_id=None, model=None, **kwargs):
+        calls.append(prompt)
+        for chunk in chunks:
+            await asyncio.sleep(0.01)
+            yield chunk
+    return stream_llm
+
+async def post_and_disconnect(path: str, body: dict, headers: dict) -> list:
+    """POST to the app and hang up before any of the response is read."""
+    messages = [{"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}]
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "server": ("test", 80), "client": ("127.0.0.1", 1234),
+        "headers": [(b"content-type", b"application/json")] + [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    }
+    await app(scope, receive, send)
+    return sent
+
+def test_stream_stores_the_answer(run, graph_id, monkeypatch):
+    calls = []
+    monkeypatch.setattr(server.route, "stream_llm", fake_stream(calls))
+
+    async def test(client):
+        response = await client.post("/chat/stream", json={"prompt": "hi", "provider": "ollama", "graph_id": graph_id})
+        assert response.status_code == 200
+        events = sse_events(response.text)
+        assert [data["token"] for event, data in events if event == "token"] == ["Hello", " world"]
+        event, done = events[-1]
+        assert event == "done" and done["response"] == "Hello world"
+        records = (await client.get("/chat/records", params={"graph_id": graph_id})).json()["records"]
+        assert [record[:3] for record in records] == [[done["record_id"], "hi", "Hello world"]]
+
+    run(test)
+
+def test_retry_after_disconnect_replays_the_answer(run, graph_id, monkeypatch):
+    calls = []
+    monkeypatch.setattr(server.route, "stream_llm", fake_stream(calls))
+    body = {"prompt": "hi", "provider": "ollama", "graph_id": graph_id}
+    headers = {"Idempotency-Key": f"retry-{graph_id}"}
+
+    async def test(client):
+        subscriber = event_hub.subscribe(graph_id)
+        try:
+            await post_and_disconnect("/chat/stream", body, headers)
+            retry = await client.post("/chat/stream", json=body, headers=headers)
+            live = []
+            while not any(event["type"] == "stream_end" for event in live):
+                live += await asyncio.wait_for(subscriber.get(), timeout=5)
+        finally:
+            event_hub.unsubscribe(subscriber)
+        event, done = sse_events(retry.text)[-1]
+        assert event == "done" and done["response"] == "Hello world"
+        assert calls == ["hi"]  # generated once, replayed to the retry
+        assert live[-1] == {"type": "stream_end", "stream_id": live[0]["stream_id"], "record_id": done["record_id"]}
+        records = (await client.get("/chat/records", params={"graph_id": graph_id})).json()["records"]
+        assert [record[0] for record in records] == [done["record_id"]]
+
+    run(test)
+
+def test_stream_error_before_first_token(run, graph_id, monkeypatch):
+    async def failing(prompt, provider, parent_id=None, model=None, **kwargs):
+        raise RuntimeError("provider down")
+        yield
+
+    monkeypatch.setattr(server.route, "stream_llm", failing)
+    body = {"prompt": "hi", "provider": "ollama", "graph_id": graph_id}
+    headers = {"Idempotency-Key": f"fail-{graph_id}"}
+
+    async def test(client):
+        assert (await client.post("/chat/stream", json=body, headers=headers)).status_code == 500
+        # Failures are not remembered: the retry runs again
+        monkeypatch.setattr(server.route, "stream_llm", fake_stream([]))
+        retry = await client.post("/chat/stream", json=body, headers=headers)
+        assert sse_events(retry.text)[-1][0] == "done"
+
+    run(test)
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from server.coalesce import SingleFlight, flight_key
+
+def test_concurrent_callers_share_one_flight():
+    async def test():
+        flights = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        results = await asyncio.gather(*(flights.run("k", work) for _ in range(5)))
+        assert results == ["answer"] * 5 and len(calls) == 1
+        assert flights.counters == {"leaders": 1, "joined": 4, "replayed": 0}
+        # Without ``remember`` a later call does the work again
+        assert await flights.run("k", work) == "answer" and len(calls) == 2
+
+    asyncio.run(test())
+
+def test_remembered_result_is_replayed_until_expiry():
+    async def test():
+        flights = SingleFlight(ttl=0.05)
+        calls = []
+
+        async def work():
+            calls.append(1)
+            return len(calls)
+
+        assert await flights.run("idem:a", work, remember=True) == 1
+        assert await flights.run("idem:a", work, remember=True) == 1
+        assert flights.counters["replayed"] == 1
+        await asyncio.sleep(0.06)
+        assert await flights.run("idem:a", work, remember=True) == 2
+
+    asyncio.run(test())
+
+def test_failures_are_shared_but_not_remembered():
+    async def test():
+        flights = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            if len(calls) == 1:
+                raise RuntimeError("provider down")
+            return "answer"
+
+        results = await asyncio.gather(*(flights.run("k", work, remember=True) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results) and len(calls) == 1
+        # A retry in the same tick as the failure must not join the failed flight
+        assert await flights.run("k", work, remember=True) == "answer"
+        assert flights.stats()["in_flight"] == 0
+
+    asyncio.run(test())
+
+def test_cancelled_caller_does_not_cancel_the_flight():
+    async def test():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "answer"
+
+        first = asyncio.create_task(flights.run("k", work))
+        second = asyncio.create_task(flights.run("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        assert await second == "answer"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(test())
+
+def test_abandoned_flight_is_retried_by_joiners():
+    async def test():
+        flights = SingleFlight()
+        leader = flights.lead("k")
+        joiner = asyncio.create_task(flights.run("k", lambda: asyncio.sleep(0, result="fresh")))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await joiner == "fresh"
+        assert flights.counters["leaders"] == 2
+
+    asyncio.run(test())
+
+def test_flight_key():
+    assert flight_key("abc", prompt="x") == ("idem:abc", True)
+    key, remember = flight_key(None, prompt="x", parent_id=1)
+    assert not remember and key == flight_key(None, parent_id=1, prompt="x")[0]
+    assert key != flight_key(None, prompt="x", parent_id=2)[0]
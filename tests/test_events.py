@@ -0,0 +1,70 @@
+import asyncio
+
+from server.events import EventHub, client_id
+
+def tokens(text: str, stream_id: str = "s") -> dict:
+    return {"type": "tokens", "stream_id": stream_id, "text": text}
+
+def test_slow_subscriber_gets_merged_tokens_and_positions():
+    async def test():
+        hub = EventHub(max_events=3)
+        subscriber = hub.subscribe("g")
+        for text in ("a", "b", "c", "d"):
+            hub.publish("g", tokens(text))
+        hub.publish("g", tokens("x", stream_id="other"))
+        hub.publish("g", {"type": "positions", "rev": 1, "positions": {1: {"x": 0, "y": 0}}})
+        hub.publish("g", {"type": "positions", "rev": 2, "positions": {1: {"x": 5, "y": 5}, 2: {"x": 1, "y": 1}}})
+        assert await subscriber.get() == [
+            tokens("abcd"),
+            tokens("x", stream_id="other"),
+            {"type": "positions", "rev": 2, "positions": {1: {"x": 5, "y": 5}, 2: {"x": 1, "y": 1}}},
+        ]
+        assert hub.counters == {"published": 7, "delivered": 7, "resyncs": 0}
+
+    asyncio.run(test())
+
+def test_overflowing_subscriber_is_resynced_without_slowing_others():
+    async def test():
+        hub = EventHub(max_events=3)
+        slow, fast = hub.subscribe("g"), hub.subscribe("g")
+        received = []
+        for rev in range(6):
+            hub.publish("g", {"type": "nodes_deleted", "rev": rev, "ids": [rev]})
+            hub.publish("g", {"type": "positions", "rev": rev, "positions": {rev: {"x": 0, "y": 0}}})
+            received += [event["type"] for event in await fast.get()]
+        assert received == ["nodes_deleted", "positions"] * 6
+
+        # The slow one lost events 3..5: one resync replaces its whole queue
+        assert await slow.get() == [{"type": "resync"}]
+        assert hub.counters["resyncs"] == 1
+        hub.publish("g", {"type": "graph_cleared", "rev": 9})
+        assert await slow.get() == [{"type": "graph_cleared", "rev": 9}]
+
+    asyncio.run(test())
+
+def test_own_changes_are_not_echoed_and_closed_subscribers_stop():
+    async def test():
+        hub = EventHub()
+        mine, theirs = hub.subscribe("g", "A"), hub.subscribe("g", "B")
+        other_graph = hub.subscribe("h", "B")
+        token = client_id.set("A")
+        try:
+            hub.publish("g", {"type": "graph_cleared", "rev": 1})
+            hub.publish("g", {"type": "positions", "rev": 2, "positions": {1: {"x": 1, "y": 2}}}, echo=True)
+        finally:
+            client_id.reset(token)
+        assert await theirs.get() == [{"type": "graph_cleared", "rev": 1}, {"type": "positions", "rev": 2, "positions": {1: {"x": 1, "y": 2}}}]
+        assert [event["type"] for event in await mine.get()] == ["positions"]
+        assert not other_graph._wake.is_set()
+
+        waiting = asyncio.create_task(mine.get())
+        await asyncio.sleep(0)
+        hub.unsubscribe(mine)
+        assert await waiting is None
+        hub.unsubscribe(theirs)
+        hub.unsubscribe(other_graph)
+        assert not hub.active() and hub.subscriber_count() == 0
+        hub.publish("g", {"type": "graph_cleared", "rev": 3})
+        assert hub.counters["published"] == 2
+
+    asyncio.run(test())
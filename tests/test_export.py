@@ -0,0 +1,89 @@
+import gzip
+import json
+
+from server.dao import sqlite as dao
+from server.export import import_chatrecords
+
+async def build_tree(graph_id: str) -> list:
+    root = await dao.store_one_chatrecord("root", "r0", graph_id=graph_id)
+    left = await dao.store_one_chatrecord("left", "r1 \"quoted\" ü", root, graph_id=graph_id)
+    branch = await dao.store_one_chatrecord("branch", "r2", root, isBranch=True, graph_id=graph_id)
+    leaf = await dao.store_one_chatrecord("leaf", "r3", left, graph_id=graph_id)
+    await dao.store_positions({root: {"x": 1.5, "y": -2.0}, leaf: {"x": 3.0, "y": 4.0}}, graph_id)
+    return [root, left, branch, leaf]
+
+def shape(records: list) -> list:
+    """Records without their ids: parents as indexes into the list, the rest as is."""
+    index = {record["id"]: i for i, record in enumerate(records)}
+    return [
+        (index.get(record["parent_id"]), record["prompt"], record["response"], bool(record["isBranch"]), record["positions"])
+        for record in records
+    ]
+
+def ndjson(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_export_import_round_trip(run, graph_id):
+    async def test(client):
+        await build_tree(graph_id)
+        exported = await client.get("/export", params={"graph_id": graph_id})
+        assert exported.status_code == 200
+        header, *records = ndjson(exported)
+        assert header["vizthink_export"] == 1 and header["graph_id"] == graph_id and len(records) == 4
+
+        copy = graph_id + "-copy"
+        response = await client.post("/import", params={"graph_id": copy}, content=exported.content)
+        assert response.json() == {"graph_id": copy, "imported": 4}
+        again = ndjson(await client.get("/export", params={"graph_id": copy}))[1:]
+        assert shape(again) == shape(records)
+        assert not {r["id"] for r in again} & {r["id"] for r in records}
+
+        # Gzipped, and grafted under an existing record of the copy
+        packed = await client.get("/export", params={"graph_id": graph_id, "gzip": "true"})
+        assert gzip.decompress(packed.content).splitlines()[1:] == exported.content.splitlines()[1:]
+        response = await client.post("/import", params={"graph_id": copy, "parent_id": again[3]["id"]}, content=packed.content)
+        assert response.json()["imported"] == 4
+        grafted = (await dao.get_node_neighbourhood(again[3]["id"], copy))["children"]
+        assert len(grafted) == 1
+        assert len((await dao.get_node_neighbourhood(grafted[0], copy))["path"]) == 4
+
+    run(test)
+
+def test_subtree_export_reimports_as_a_tree(run, graph_id):
+    async def test(client):
+        root, left, branch, leaf = await build_tree(graph_id)
+        exported = await client.get("/export", params={"graph_id": graph_id, "root_id": left})
+        records = ndjson(exported)[1:]
+        assert [r["id"] for r in records] == [left, leaf]
+        await client.post("/import", params={"graph_id": graph_id + "-sub"}, content=exported.content)
+        nodes = await dao.get_tree_nodes(graph_id + "-sub")
+        assert [(parent, prompt) for _, parent, prompt, _ in nodes] == [(None, "left"), (nodes[0][0], "leaf")]
+
+    run(test)
+
+def test_bad_line_is_rejected_after_committed_batches(run, graph_id):
+    async def test(client):
+        await build_tree(graph_id)
+        lines = (await client.get("/export", params={"graph_id": graph_id})).text.splitlines()
+        broken = "\n".join(lines[:4] + ['{"id": "x", "prompt": "p"}'] + lines[4:]) + "\n"
+
+        response = await client.post("/import", params={"graph_id": graph_id + "-bad"}, content=broken)
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Line 5: id must be an integer (0 records imported before the error)"
+        assert await dao.get_tree_nodes(graph_id + "-bad") == []
+
+        async def chunks():
+            yield broken.encode("utf-8")
+
+        try:
+            await import_chatrecords(chunks(), graph_id + "-partial", batch_size=2)
+        except ValueError as e:
+            assert "(2 records imported before the error)" in str(e)
+        else:
+            raise AssertionError("the malformed line was accepted")
+        assert [prompt for _, _, prompt, _ in await dao.get_tree_nodes(graph_id + "-partial")] == ["root", "left"]
+
+        missing = await client.post("/import", params={"graph_id": graph_id, "parent_id": 10 ** 9}, content=broken)
+        assert missing.status_code == 404
+
+    run(test)
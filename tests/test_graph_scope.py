@@ -0,0 +1,38 @@
+import pytest
+
+import server.route
+from server.dao import sqlite as dao
+
+def test_positions_only_move_nodes_of_the_request_graph(run, graph_id):
+    async def test(client):
+        mine = await dao.store_one_chatrecord("mine", "a", graph_id=graph_id)
+        theirs = await dao.store_one_chatrecord("theirs", "b", graph_id=f"{graph_id}-other")
+        positions = {str(mine): {"x": 1, "y": 2}, str(theirs): {"x": 3, "y": 4}}
+        response = await client.post("/chat/positions", json={"positions": positions}, headers={"X-Graph-Id": graph_id})
+        assert response.status_code == 200
+        await dao.position_buffer.flush()
+        assert (await dao.get_one_chatrecord(mine))["positions"] == {"x": 1.0, "y": 2.0}
+        assert (await dao.get_one_chatrecord(theirs))["positions"] is None
+
+    run(test)
+
+def test_child_of_another_graphs_node_is_refused(run, graph_id, monkeypatch):
+    async def call_llm(prompt, provider, parent_id=None, model=None, **kwargs):
+        return "answer"
+
+    monkeypatch.setattr(server.route, "call_llm", call_llm)
+
+    async def test(client):
+        other = await dao.store_one_chatrecord("other", "b", graph_id=f"{graph_id}-other")
+        with pytest.raises(ValueError):
+            await dao.store_one_chatrecord("child", "c", other, graph_id=graph_id)
+        body = {"prompt": "child", "provider": "ollama", "parent_id": other, "graph_id": graph_id}
+        assert (await client.post("/chat", json=body)).status_code == 400
+        assert (await client.post("/chat/stream", json=body)).status_code == 400
+        assert await dao.get_all_chatrecord(graph_id) == []
+        # A parent that does not exist (the unsaved welcome node) still makes a root
+        response = await client.post("/chat", json={**body, "parent_id": 0})
+        assert response.status_code == 200
+        assert [record[4] for record in await dao.get_all_chatrecord(graph_id)] == [None]
+
+    run(test)
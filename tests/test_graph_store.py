@@ -0,0 +1,80 @@
+import time
+
+from server.dao import sqlite as dao
+from server.scheme.graph import GraphStore
+
+# (id, parent_id, prompt, response, isBranch, x, y): 1 -> 2 -> 3, 1 -> 4
+ROWS = [(1, None, "p1", "r1", 0, None, None), (2, 1, "p2", "r2", 0, None, None),
+        (3, 2, "p3", "r3", 0, None, None), (4, 1, "p4", "r4", 1, 1.0, 2.0)]
+
+def rows(offset: int):
+    return [(i + offset, p and p + offset, *rest) for i, p, *rest in ROWS]
+
+def test_least_recently_used_graph_is_evicted_with_its_nodes():
+    store = GraphStore(max_graphs=2)
+    store.load("a", rows(0))
+    store.load("b", rows(10))
+    assert store.get("a") is not None  # "b" is now the least recently used
+    store.load("c", rows(20))
+    assert store.get("b") is None and store.find(11) is None and store.graph_of(12) is None
+    assert store.graph_of(2) == "a" and store.graph_of(22) == "c"
+    assert store.stats() == {"graphs": 2, "nodes": 8}
+
+def test_idle_graphs_are_swept_on_access():
+    store = GraphStore(idle_seconds=0.05)
+    store.load("a", rows(0))
+    time.sleep(0.06)
+    store.load("b", rows(10))
+    assert store.get("a") is None and store.find(1) is None
+    assert store.stats() == {"graphs": 1, "nodes": 4}
+
+def test_subtree_removal_unlinks_the_nodes():
+    store = GraphStore()
+    store.load("a", rows(0))
+    store.remove_subtree(2)
+    graph = store.get("a")
+    assert list(graph.nodes) == [1, 4] and [n.id for n in graph.nodes[1].children] == [4]
+    assert store.find(3) is None and store.stats()["nodes"] == 2
+    store.remove_subtree(3)  # already gone: a no-op
+    store.add("a", 5, "p5", "r5", 4, False)
+    assert [n.id for n in store.find(5)[1].path()] == [1, 4, 5]
+    store.add("unloaded", 6, "p6", "r6", None, False)
+    assert store.find(6) is None
+
+async def neighbourhoods(ids):
+    return {node_id: await dao.get_node_neighbourhood(node_id) for node_id in ids}
+
+def test_loaded_graph_matches_a_reload_after_deletes(run, graph_id):
+    async def test(client):
+        root = await dao.store_one_chatrecord("root", "r", graph_id=graph_id)
+        left = await dao.store_one_chatrecord("left", "r", root, graph_id=graph_id)
+        leaf = await dao.store_one_chatrecord("leaf", "r", left, graph_id=graph_id)
+        right = await dao.store_one_chatrecord("right", "r", root, graph_id=graph_id)
+        await dao.get_tree_nodes(graph_id)  # load it, so the writes below patch the store
+        child = await dao.store_one_chatrecord("child", "r", right, graph_id=graph_id)
+        assert await dao.delete_single_chatrecord(left, graph_id)
+
+        ids = [root, left, leaf, right, child]
+        patched = (await dao.get_tree_nodes(graph_id), await neighbourhoods(ids))
+        dao.graph_store.evict(graph_id)
+        reloaded = (await dao.get_tree_nodes(graph_id), await neighbourhoods(ids))
+        assert patched == reloaded
+        assert [node[0] for node in patched[0]] == [root, right, child]
+        assert patched[1][root]["children"] == [right] and patched[1][root]["descendants"] == 2
+        assert patched[1][left] is None and patched[1][leaf] is None
+        assert await dao.get_path_nodes(leaf) == []
+        assert [n[0] for n in await dao.get_path_nodes(child)] == [root, right, child]
+
+    run(test)
+
+def test_deleting_from_the_wrong_graph_leaves_the_store_intact(run, graph_id):
+    async def test(client):
+        root = await dao.store_one_chatrecord("root", "r", graph_id=graph_id)
+        child = await dao.store_one_chatrecord("child", "r", root, graph_id=graph_id)
+        await dao.get_tree_nodes(graph_id)
+        assert not await dao.delete_single_chatrecord(child, "some-other-graph")
+        assert dao.graph_store.graph_of(child) == graph_id
+        assert await dao.get_node_neighbourhood(child, "some-other-graph") is None
+        assert (await dao.get_node_neighbourhood(child, graph_id))["path"] == [root, child]
+
+    run(test)
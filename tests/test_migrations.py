@@ -0,0 +1,147 @@
+import asyncio
+import json
+import sqlite3
+
+import aiosqlite
+import pytest
+
+from server.dao.migrations import MIGRATIONS, SCHEMA_VERSION, migrate
+
+# Databases in the layouts older releases left behind, migrated to the
+# current schema.
+
+BASELINE_SCHEMA = """
+CREATE TABLE chatrecord (
+    id INTEGER PRIMARY KEY,
+    prompt TEXT,
+    response TEXT,
+    parent_id INTEGER,
+    positions TEXT,
+    isBranch BOOLEAN
+)
+"""
+
+def run_migrate(path) -> int:
+    async def main():
+        async with aiosqlite.connect(path) as db:
+            return await migrate(db)
+    return asyncio.run(main())
+
+def columns(db: sqlite3.Connection, table: str):
+    return {col[1]: col[2] for col in db.execute(f"PRAGMA table_info({table})")}
+
+def search(db: sqlite3.Connection, query: str):
+    return [row[0] for row in db.execute("SELECT rowid FROM chatrecord_fts WHERE chatrecord_fts MATCH ? ORDER BY rowid", (query,))]
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    """A database as the first release created it: no versioning, JSON positions."""
+    path = tmp_path / "baseline.db"
+    with sqlite3.connect(path) as db:
+        db.execute(BASELINE_SCHEMA)
+        db.executemany(
+            "INSERT INTO chatrecord (id, prompt, response, parent_id, positions, isBranch) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (1, "What is a graph?", "Nodes and edges.", 0, json.dumps({"x": 10, "y": 20.5}), False),
+                (2, "And a tree?", "A connected acyclic graph.", 1, None, True),
+                (3, "Broken positions", "kept anyway", 2, "not json", 0),
+            ],
+        )
+    return path
+
+@pytest.fixture
+def v1_db(tmp_path):
+    """A database at schema version 1: untyped columns, several graphs, embeddings."""
+    path = tmp_path / "v1.db"
+
+    async def build():
+        async with aiosqlite.connect(path) as db:
+            await MIGRATIONS[0](db)
+            await db.execute("INSERT INTO graphs (id, name, created_at) VALUES ('work', 'Work', 0)")
+            await db.executemany(
+                """
+                INSERT INTO chatrecord (id, prompt, response, parent_id, positions, isBranch, rev, summary, graph_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (1, "hello", "welcome", None, json.dumps({"x": 1, "y": 2}), "false", 3, None, "default"),
+                    (2, "branching question", "branching answer", 1, json.dumps({"x": -5.5, "y": 0}), "true", 4, "a summary", "default"),
+                    (3, "orphan", "its parent is gone", 99, None, 1, 5, None, "work"),
+                ],
+            )
+            # What the version 1 triggers kept up to date
+            await db.execute("INSERT INTO chatrecord_fts (chatrecord_fts) VALUES ('rebuild')")
+            await db.executemany(
+                "INSERT INTO chatrecord_embedding (id, model, vector) VALUES (?, ?, ?)",
+                [(1, "hash", b"\x00" * 8), (42, "hash", b"\x01" * 8)],
+            )
+            await db.execute("PRAGMA user_version = 1")
+            await db.commit()
+
+    asyncio.run(build())
+    return path
+
+def test_baseline_database_is_migrated(baseline_db):
+    assert run_migrate(baseline_db) == SCHEMA_VERSION
+    with sqlite3.connect(baseline_db) as db:
+        assert db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        cols = columns(db, "chatrecord")
+        assert "positions" not in cols
+        assert cols["pos_x"] == cols["pos_y"] == "REAL"
+        assert cols["isBranch"] == "INTEGER"
+        for name in ("graph_id", "rev", "summary", "created_at", "updated_at"):
+            assert name in cols
+        rows = db.execute(
+            "SELECT id, prompt, response, parent_id, pos_x, pos_y, isBranch, graph_id FROM chatrecord ORDER BY id"
+        ).fetchall()
+        assert rows == [
+            (1, "What is a graph?", "Nodes and edges.", None, 10.0, 20.5, 0, "default"),
+            (2, "And a tree?", "A connected acyclic graph.", 1, None, None, 1, "default"),
+            (3, "Broken positions", "kept anyway", 2, None, None, 0, "default"),
+        ]
+        assert db.execute("SELECT id FROM graphs").fetchall() == [("default",)]
+        assert search(db, "graph") == [1, 2]
+        assert db.execute("PRAGMA foreign_key_check").fetchall() == []
+
+def test_v1_database_is_migrated(v1_db):
+    assert run_migrate(v1_db) == SCHEMA_VERSION
+    with sqlite3.connect(v1_db) as db:
+        assert db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        rows = db.execute(
+            "SELECT id, parent_id, pos_x, pos_y, isBranch, rev, summary, graph_id FROM chatrecord ORDER BY id"
+        ).fetchall()
+        assert rows == [
+            (1, None, 1.0, 2.0, 0, 3, None, "default"),
+            (2, 1, -5.5, 0.0, 1, 4, "a summary", "default"),
+            (3, None, None, None, 1, 5, None, "work"),
+        ]
+        # Vectors of records that no longer exist are dropped
+        assert db.execute("SELECT id FROM chatrecord_embedding").fetchall() == [(1,)]
+        assert search(db, "branching") == [2]
+        assert search(db, "orphan") == [3]
+
+def test_triggers_keep_full_text_index_in_sync(v1_db):
+    run_migrate(v1_db)
+    with sqlite3.connect(v1_db) as db:
+        db.execute("UPDATE chatrecord SET prompt = 'renamed question' WHERE id = 2")
+        db.execute("INSERT INTO chatrecord (id, prompt, response) VALUES (4, 'fresh', 'row')")
+        db.execute("DELETE FROM chatrecord WHERE id = 3")
+        assert search(db, "branching") == [2]
+        assert search(db, "renamed") == [2]
+        assert search(db, "fresh") == [4]
+        assert search(db, "orphan") == []
+
+def test_current_database_is_left_alone(v1_db):
+    run_migrate(v1_db)
+    with sqlite3.connect(v1_db) as db:
+        before = db.execute("SELECT * FROM chatrecord ORDER BY id").fetchall()
+    assert run_migrate(v1_db) == SCHEMA_VERSION
+    with sqlite3.connect(v1_db) as db:
+        assert db.execute("SELECT * FROM chatrecord ORDER BY id").fetchall() == before
+
+def test_newer_database_is_refused(tmp_path):
+    path = tmp_path / "future.db"
+    with sqlite3.connect(path) as db:
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+    with pytest.raises(RuntimeError):
+        run_migrate(path)
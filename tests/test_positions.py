@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from server.dao import sqlite as dao
+from server.dao.sqlite import PositionBuffer
+from server.route import _position_diff
+
+def test_position_diff_coerces_numbers():
+    assert _position_diff({"3": {"x": 1, "y": 2.5}}) == {3: {"x": 1.0, "y": 2.5}}
+    # The old list form maps to ids 1..n
+    assert _position_diff([{"x": 0, "y": 0}, {"x": 5, "y": 6}]) == {1: {"x": 0.0, "y": 0.0}, 2: {"x": 5.0, "y": 6.0}}
+
+@pytest.mark.parametrize("positions", [
+    "nope",
+    {"abc": {"x": 1, "y": 2}},
+    {"1": {"x": "a", "y": 2}},
+    {"1": {"x": 1}},
+    {"1": {"x": True, "y": 2}},
+    {"1": {"x": float("inf"), "y": 2}},
+    {"1": [1, 2]},
+])
+def test_position_diff_rejects_malformed_input(positions):
+    with pytest.raises(HTTPException) as error:
+        _position_diff(positions)
+    assert error.value.status_code == 400
+
+def test_buffer_merges_diffs_into_one_write(monkeypatch):
+    writes = []
+
+    async def store_positions(positions, graph_id):
+        writes.append((graph_id, dict(positions)))
+
+    monkeypatch.setattr(dao, "store_positions", store_positions)
+
+    async def main():
+        buffer = PositionBuffer(delay=0.02)
+        assert buffer.submit({1: {"x": 0.0, "y": 0.0}}, "a") == 1
+        assert buffer.submit({1: {"x": 5.0, "y": 5.0}, 2: {"x": 1.0, "y": 1.0}}, "a") == 2
+        buffer.submit({3: {"x": 2.0, "y": 2.0}}, "b")
+        await asyncio.sleep(0.05)
+        assert sorted(writes) == [
+            ("a", {1: {"x": 5.0, "y": 5.0}, 2: {"x": 1.0, "y": 1.0}}),
+            ("b", {3: {"x": 2.0, "y": 2.0}}),
+        ]
+
+    asyncio.run(main())
+
+def test_buffer_keeps_other_graphs_when_one_write_fails(monkeypatch):
+    writes = []
+
+    async def store_positions(positions, graph_id):
+        if graph_id == "broken":
+            raise RuntimeError("disk full")
+        writes.append(graph_id)
+
+    monkeypatch.setattr(dao, "store_positions", store_positions)
+
+    async def main():
+        buffer = PositionBuffer(delay=10)
+        buffer.submit({1: {"x": 0.0, "y": 0.0}}, "broken")
+        buffer.submit({2: {"x": 0.0, "y": 0.0}}, "fine")
+        await buffer.close()  # writes at once instead of after the delay
+        assert writes == ["fine"]
+
+    asyncio.run(main())
+
+def test_saved_positions_are_read_back(run, graph_id):
+    async def test(client):
+        node = await dao.store_one_chatrecord("p", "r", graph_id=graph_id)
+        response = await client.post("/chat/positions", json={"graph_id": graph_id, "positions": {str(node): {"x": 10, "y": -4}}})
+        assert response.status_code == 200
+        assert (await client.post("/chat/positions", json={"graph_id": graph_id, "positions": {str(node): {"x": "a", "y": 0}}})).status_code == 400
+        await dao.position_buffer.flush()
+        records = (await client.get("/chat/records", params={"graph_id": graph_id})).json()["records"]
+        assert records[0][3] == {"x": 10.0, "y": -4.0}
+
+    run(test)
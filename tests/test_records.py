@@ -0,0 +1,57 @@
+from server.dao import sqlite as dao
+
+async def add_records(graph_id: str, count: int) -> list:
+    return [await dao.store_one_chatrecord(f"prompt {i}", f"response {i}", graph_id=graph_id) for i in range(count)]
+
+def test_pages_follow_the_keyset_cursor(run, graph_id):
+    async def test(client):
+        ids = await add_records(graph_id, 5)
+        seen, after_id = [], None
+        while True:
+            params = {"graph_id": graph_id, "limit": 2}
+            if after_id is not None:
+                params["after_id"] = after_id
+            page = (await client.get("/chat/records", params=params)).json()
+            seen += [record["id"] for record in page["records"]]
+            after_id = page["next_after_id"]
+            if after_id is None:
+                break
+        assert seen == ids
+        projected = (await client.get("/chat/records", params={"graph_id": graph_id, "fields": "prompt"})).json()
+        assert projected["records"][0] == {"id": ids[0], "prompt": "prompt 0"}
+
+    run(test)
+
+def test_delta_returns_changes_and_deletions(run, graph_id):
+    async def test(client):
+        ids = await add_records(graph_id, 3)
+        rev = (await client.get("/chat/records", params={"graph_id": graph_id, "limit": 10})).json()["rev"]
+        await dao.store_positions({ids[0]: {"x": 1, "y": 2}}, graph_id)
+        await dao.delete_single_chatrecord(ids[1], graph_id)
+        new = await dao.store_one_chatrecord("late", "answer", graph_id=graph_id)
+        delta = (await client.get("/chat/records", params={"graph_id": graph_id, "since": rev})).json()
+        assert {record["id"] for record in delta["records"]} == {ids[0], new}
+        assert delta["deleted"] == [ids[1]]
+        assert not delta["reset"]
+        # Nothing changed since the delta's own revision
+        again = (await client.get("/chat/records", params={"graph_id": graph_id, "since": delta["rev"]})).json()
+        assert again["records"] == [] and again["deleted"] == []
+
+    run(test)
+
+def test_delta_across_a_clear_resets(run, graph_id):
+    async def test(client):
+        await add_records(graph_id, 2)
+        rev = (await client.get("/chat/records", params={"graph_id": graph_id, "limit": 10})).json()["rev"]
+        assert (await client.delete("/chat/records", params={"graph_id": graph_id})).status_code == 200
+        delta = (await client.get("/chat/records", params={"graph_id": graph_id, "since": rev})).json()
+        assert delta["reset"] and delta["records"] == []
+
+    run(test)
+
+def test_bad_parameters_are_rejected(run, graph_id):
+    async def test(client):
+        assert (await client.get("/chat/records", params={"graph_id": graph_id, "after_id": "x"})).status_code == 422
+        assert (await client.get("/chat/records", params={"graph_id": "bad/id"})).status_code == 400
+
+    run(test)
@@ -0,0 +1,71 @@
+import time
+import uuid
+
+from server.cache import ResponseCache
+from server.context import LLMContext
+from server.dao import sqlite as dao
+
+PARAMS = {"max_tokens": 300, "temperature": 0.7}
+
+def key(prompt="What is a tree?", model="m", history=(), params=PARAMS):
+    context = LLMContext(system="You are  helpful.", history=[{"role": role, "content": text} for role, text in history])
+    return ResponseCache.make_key("openai", model, context, prompt, params)
+
+def test_key_ignores_whitespace_only():
+    assert key("What is  a tree?\n") == key()
+    assert key(history=[("user", "hi  there")]) == key(history=[("user", "hi there")])
+    assert len({
+        key(),
+        key(prompt="What is a graph?"),
+        key(model="other"),
+        key(history=[("user", "hi")]),
+        key(params={**PARAMS, "temperature": 0}),
+    }) == 5
+
+def make_cache(**settings) -> ResponseCache:
+    return ResponseCache(**{"enabled": True, "ttl": 60, "memory_entries": 2, "disk_entries": 1000, **settings})
+
+def test_memory_tier_evicts_least_recently_used_and_disk_serves_it(run):
+    async def test(client):
+        cache = make_cache()
+        keys = [uuid.uuid4().hex for _ in range(3)]
+        for index, entry in enumerate(keys):
+            await cache.put(entry, f"answer {index}")
+        assert len(cache._memory) == 2 and keys[0] not in cache._memory
+        assert cache.counters["evictions"] == 1
+        assert await cache.get(keys[2]) == "answer 2"
+        assert await cache.get(keys[0]) == "answer 0"  # from SQLite, and back in memory
+        assert cache.counters["memory_hits"] == 1 and cache.counters["disk_hits"] == 1
+        assert keys[0] in cache._memory
+
+    run(test)
+
+def test_disk_tier_is_pruned_to_its_bound(run):
+    async def test(client):
+        await dao.clear_cached_responses()
+        cache = make_cache(disk_entries=10)
+        for index in range(100):
+            await cache.put(uuid.uuid4().hex, f"answer {index}")
+        async with dao.pool.reader() as db:
+            cursor = await db.execute("SELECT COUNT(*) FROM llm_cache")
+            assert (await cursor.fetchone())[0] == 10
+        assert cache.counters["evictions"] >= 90
+
+    run(test)
+
+def test_expired_and_disabled_entries_miss(run):
+    async def test(client):
+        cache = make_cache(ttl=0.05)
+        entry = uuid.uuid4().hex
+        await cache.put(entry, "answer")
+        time.sleep(0.06)
+        assert await cache.get(entry) is None
+        assert cache.counters["misses"] == 1
+        disabled = make_cache(enabled=False)
+        await disabled.put(entry, "answer")
+        assert await disabled.get(entry) is None
+        # Empty answers are never cached
+        await cache.put(entry, "")
+        assert entry not in cache._memory
+
+    run(test)
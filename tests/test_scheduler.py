@@ -0,0 +1,159 @@
+import time
+import asyncio
+
+import pytest
+
+from server.providers import scheduler as scheduler_module
+from server.providers.errors import ProviderUnavailable, RateLimitError, TransientProviderError
+from server.providers.scheduler import CircuitBreaker, ProviderScheduler, TokenBucket, _backoff
+
+def make_scheduler(monkeypatch, **settings) -> ProviderScheduler:
+    """A scheduler for a made-up provider; ``settings`` override SCHEDULER_DEFAULTS."""
+    for key, value in {"rpm": 0, "tpm": 0, "max_retries": 2, "failure_threshold": 3, "reset_timeout": 0.05, **settings}.items():
+        monkeypatch.setenv(f"VIZTHINK_TESTPROVIDER_{key.upper()}", str(value))
+    monkeypatch.setattr(scheduler_module, "BASE_DELAY", 0.001)
+    return ProviderScheduler("testprovider")
+
+def failing_then(result, failures):
+    calls = []
+
+    async def call():
+        calls.append(None)
+        if len(calls) <= len(failures):
+            raise failures[len(calls) - 1]
+        return result
+    return call, calls
+
+def test_token_bucket_waits_for_refill():
+    async def main():
+        bucket = TokenBucket(600)  # 10 per second
+        start = time.monotonic()
+        await bucket.acquire(600)
+        assert time.monotonic() - start < 0.05
+        await bucket.acquire(1)
+        assert time.monotonic() - start >= 0.08
+
+    asyncio.run(main())
+
+def test_token_bucket_unlimited_and_cancelled():
+    async def main():
+        await asyncio.wait_for(TokenBucket(0).acquire(10**9), timeout=0.1)
+        bucket = TokenBucket(60)
+        await bucket.acquire(60)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(bucket.acquire(1), timeout=0.05)
+        # The cancelled waiter took nothing and released the lock
+        assert bucket.tokens < 1
+        assert not bucket._lock.locked()
+
+    asyncio.run(main())
+
+def test_circuit_opens_half_opens_and_closes():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05)
+    assert breaker.before_call() is False
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(ProviderUnavailable):
+        breaker.before_call()
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    assert breaker.before_call() is True
+    with pytest.raises(ProviderUnavailable):
+        breaker.before_call()  # one trial at a time
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+def test_failed_trial_reopens_the_circuit():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.before_call() is True
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+def test_cancelled_trial_is_released(monkeypatch):
+    async def main():
+        scheduler = make_scheduler(monkeypatch, rpm=60, failure_threshold=1)
+        scheduler.breaker.record_failure()
+        await asyncio.sleep(0.06)
+        await scheduler.requests.acquire(60)  # the trial will wait for the bucket
+        call, calls = failing_then("ok", [])
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.run(call), timeout=0.05)
+        assert calls == []
+        assert scheduler.breaker.state == "half-open"
+        assert scheduler.breaker.before_call() is True  # the next call may try
+
+    asyncio.run(main())
+
+def test_cancelled_trial_call_is_released(monkeypatch):
+    async def main():
+        scheduler = make_scheduler(monkeypatch, failure_threshold=1)
+        scheduler.breaker.record_failure()
+        await asyncio.sleep(0.06)
+
+        async def hang():
+            await asyncio.sleep(10)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.run(hang), timeout=0.05)
+        assert scheduler.breaker.before_call() is True
+
+    asyncio.run(main())
+
+def test_retries_transient_errors(monkeypatch):
+    async def main():
+        scheduler = make_scheduler(monkeypatch)
+        call, calls = failing_then("ok", [TransientProviderError("502"), RateLimitError("429")])
+        assert await scheduler.run(call) == "ok"
+        assert len(calls) == 3
+        assert scheduler.breaker.state == "closed" and scheduler.breaker.failures == 0
+
+    asyncio.run(main())
+
+def test_gives_up_after_max_retries(monkeypatch):
+    async def main():
+        scheduler = make_scheduler(monkeypatch, max_retries=2, failure_threshold=10)
+        call, calls = failing_then("ok", [TransientProviderError("down")] * 5)
+        with pytest.raises(TransientProviderError):
+            await scheduler.run(call)
+        assert len(calls) == 3
+        assert scheduler.breaker.failures == 3
+
+    asyncio.run(main())
+
+def test_other_errors_are_not_retried(monkeypatch):
+    async def main():
+        scheduler = make_scheduler(monkeypatch)
+        call, calls = failing_then("ok", [ValueError("bad request")])
+        with pytest.raises(ValueError):
+            await scheduler.run(call)
+        assert len(calls) == 1
+        assert scheduler.breaker.state == "closed"
+
+    asyncio.run(main())
+
+def test_stream_retries_before_the_first_chunk(monkeypatch):
+    async def main():
+        scheduler = make_scheduler(monkeypatch)
+        attempts = []
+
+        async def call():
+            attempts.append(None)
+            if len(attempts) == 1:
+                raise TransientProviderError("reset")
+            yield "a"
+            yield "b"
+
+        assert [chunk async for chunk in scheduler.stream(call)] == ["a", "b"]
+        assert len(attempts) == 2
+
+    asyncio.run(main())
+
+def test_backoff_honours_retry_after():
+    for attempt in range(10):
+        assert 0 <= _backoff(attempt, None) <= scheduler_module.MAX_DELAY
+    assert _backoff(0, 5) >= 5
+    assert _backoff(0, 1000) == scheduler_module.MAX_DELAY
@@ -0,0 +1,64 @@
+from server.dao import sqlite as dao
+
+async def insert_tree(graph_id: str, parents) -> list:
+    """Insert one record per entry of ``parents`` (an index into the ids so far, or None); returns the ids."""
+    await dao.create_graph(graph_id)
+    ids = []
+    async with dao.pool.writer() as db:
+        for index, parent in enumerate(parents):
+            cursor = await db.execute(
+                "INSERT INTO chatrecord (graph_id, parent_id, prompt, response) VALUES (?, ?, ?, ?)",
+                (graph_id, None if parent is None else ids[parent], f"prompt {index}", f"needle {index}"),
+            )
+            ids.append(cursor.lastrowid)
+        await db.commit()
+    dao.graph_store.evict(graph_id)
+    return ids
+
+async def count(sql: str, *params) -> int:
+    async with dao.pool.reader() as db:
+        cursor = await db.execute(sql, params)
+        return (await cursor.fetchone())[0]
+
+def test_deep_chain_is_deleted(run, graph_id):
+    async def test(client):
+        ids = await insert_tree(graph_id, [None] + list(range(2999)))
+        rev, _ = await dao.get_sync_revision(graph_id)
+        assert await dao.delete_single_chatrecord(ids[1000], graph_id)
+        assert await count("SELECT COUNT(*) FROM chatrecord WHERE graph_id = ?", graph_id) == 1000
+        assert await count("SELECT COUNT(*) FROM chatrecord_tombstone WHERE graph_id = ?", graph_id) == 2000
+        assert await count("SELECT COUNT(*) FROM chatrecord_fts WHERE chatrecord_fts MATCH 'needle' AND rowid >= ?", ids[1000]) == 0
+        page = await dao.get_chatrecord_page(since_rev=rev, graph_id=graph_id)
+        assert sorted(page["deleted"]) == ids[1000:]
+
+    run(test)
+
+def test_wide_subtree_is_deleted_from_the_loaded_graph(run, graph_id):
+    async def test(client):
+        # A root with two 3-ary branches, 3000 nodes in total
+        parents = [None, 0, 0] + [(index - 3) // 3 + 1 for index in range(3, 3000)]
+        ids = await insert_tree(graph_id, parents)
+        assert len(await dao.get_all_chatrecord(graph_id)) == 3000
+
+        def in_branch(index):
+            while index is not None and index != 1:
+                index = parents[index]
+            return index == 1
+
+        branch = {ids[index] for index in range(3000) if in_branch(index)}
+        assert await dao.delete_single_chatrecord(ids[1], graph_id)
+        remaining = {record[0] for record in await dao.get_all_chatrecord(graph_id)}
+        assert remaining == set(ids) - branch
+        assert await count("SELECT COUNT(*) FROM chatrecord WHERE graph_id = ?", graph_id) == len(remaining)
+        assert await count("SELECT COUNT(*) FROM chatrecord_tombstone WHERE graph_id = ?", graph_id) == len(branch)
+
+    run(test)
+
+def test_delete_in_another_graph_is_refused(run, graph_id):
+    async def test(client):
+        ids = await insert_tree(graph_id, [None, 0])
+        await dao.get_all_chatrecord(graph_id)
+        assert not await dao.delete_single_chatrecord(ids[1], "some-other-graph")
+        assert [record[0] for record in await dao.get_all_chatrecord(graph_id)] == ids
+
+    run(test)